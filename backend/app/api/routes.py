@@ -1,80 +1,243 @@
-from fastapi import APIRouter, File, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, BackgroundTasks, File, HTTPException, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import pandas as pd
 from pathlib import Path
 import os
-import io
+import codecs
+import csv
+import uuid
+import hashlib
+import threading
+import time
+import asyncio
 from pydantic import BaseModel
-from groq import Groq
-import json
 import re
-import numpy as np
-from typing import Dict, List, Optional
-from enum import Enum
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from app.services.aggregate_cube import (
+    build_cube,
+    choose_layout,
+    cube_path,
+    read_manifest,
+    remove_cube,
+    share_cube,
+)
+from app.services.blob_store import BlobStore
+from app.services.catalog import DatasetCatalog, file_sha256
+from app.services.chart_payload import ChartPayloadReducer
+from app.services.cleaning_plan import (
+    FILL_METHODS,
+    CleaningPlan,
+    CleaningStrategy,
+    is_measure,
+    standardized_names,
+)
+from app.services.dataframe_cache import DataFrameCache, enable_copy_on_write
+from app.services.code_analysis import CodeRejected, analyze_code
+from app.services.columnar import (
+    has_fresh_sidecar,
+    read_dataset,
+    remove_sidecar,
+    share_sidecar,
+    write_sidecar,
+    write_sidecar_from_csv,
+)
+from app.services.dtype_optimizer import (
+    apply_load_schema,
+    choose_load_schema,
+    frame_load_schema,
+    memory_optimization,
+)
+from app.services.history_store import HistoryStore
+from app.services.ingest import INGEST_CHUNK_ROWS, scan_csv
+from app.services.job_queue import Job, JobCancelled, JobQueue
+from app.services.json_encoding import (
+    FastJSONResponse,
+    RawJSON,
+    dumps,
+    records_json,
+    sse_event,
+)
+from app.services.llm_client import (
+    LLMClient,
+    LLMError,
+    StreamedStringField,
+    parse_json_content,
+)
+from app.services.profiler import ProfileCache, profile_dataframe
+from app.services.prompt_builder import PromptBuilder
+from app.services.response_cache import (
+    ResponseCache,
+    dataset_fingerprint,
+    normalize_question,
+    schema_fingerprint,
+)
+from app.services.sandbox import (
+    SandboxError,
+    SandboxMemoryError,
+    SandboxPool,
+    SandboxTimeout,
+    default_pool_size,
+)
+from app.services.single_flight import SingleFlight
+from app.services.sql_engine import SQLEngine, SQLError, sql_available
+from app.services.streaming_cleaner import StreamingCleaner
 
 router = APIRouter()
 
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-BASE_DIR = "storage/user_data"
+enable_copy_on_write()
 
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+MAX_FILE_SIZE = int(os.environ.get("MAX_UPLOAD_MB", "1024")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+MAX_HEADER_CHARS = 1024 * 1024
+BASE_DIR = "storage/user_data"
+BLOB_DIR = "storage/blobs"
+HISTORY_DIR = "storage/history"
+CATALOG_DB_PATH = "storage/cache/catalog.sqlite3"
+FILES_PAGE_MAX = 10_000
+HISTORY_DB_PATH = "storage/history/history.sqlite3"
+HISTORY_PAGE_MAX = 200
+RESPONSE_CACHE_PATH = "storage/cache/responses.sqlite3"
+PLAN_CACHE_PATH = "storage/cache/plans.sqlite3"
+# Token Jaccard similarity at which a cached question is reused as a plan
+# for a different question; unset disables fuzzy matching
+RESPONSE_CACHE_SIMILARITY = (
+    float(os.environ["RESPONSE_CACHE_SIMILARITY"])
+    if os.environ.get("RESPONSE_CACHE_SIMILARITY")
+    else None
+)
+DF_CACHE_MAX_BYTES = int(os.environ.get("DF_CACHE_MAX_MB", "512")) * 1024 * 1024
+# Files above this size are cleaned chunk by chunk instead of in memory
+STREAMING_CLEAN_BYTES = int(os.environ.get("STREAMING_CLEAN_MB", "512")) * 1024 * 1024
+SPILL_DIR = "storage/tmp"
+# Precomputed group-by aggregates per dataset, built in the background
+AGGREGATE_CUBE = os.environ.get("AGGREGATE_CUBE", "1") == "1"
+CUBE_MAX_CELLS = int(os.environ.get("AGGREGATE_CUBE_MAX_CELLS", "50000"))
+CUBE_MAX_DIMENSION_VALUES = int(
+    os.environ.get("AGGREGATE_CUBE_MAX_DIMENSION_VALUES", "1000")
+)
+# Engine that answers /ask unless the request picks one: "pandas" runs
+# generated pandas code in the sandbox, "sql" runs generated SQL on DuckDB
+ASK_ENGINE = os.environ.get("ASK_ENGINE", "pandas")
+
+llm_client = LLMClient(
+    api_key=os.environ.get("GROQ_API_KEY"),
+    model=os.environ.get("GROQ_MODEL", "llama-3.3-70b-versatile"),
+    base_url=os.environ.get("GROQ_BASE_URL"),
+    max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "8")),
+    timeout=float(os.environ.get("LLM_TIMEOUT_SECONDS", "60")),
+    max_retries=int(os.environ.get("LLM_MAX_RETRIES", "3")),
+)
+df_cache = DataFrameCache(max_bytes=DF_CACHE_MAX_BYTES)
+profile_cache = ProfileCache()
+history_store = HistoryStore(HISTORY_DB_PATH)
+catalog = DatasetCatalog(CATALOG_DB_PATH)
+blob_store = BlobStore(BLOB_DIR)
+chart_reducer = ChartPayloadReducer(
+    max_points=int(os.environ.get("CHART_MAX_POINTS", "2000")),
+    max_categories=int(os.environ.get("CHART_MAX_CATEGORIES", "25")),
+    max_bytes=int(os.environ.get("CHART_MAX_KB", "1024")) * 1024,
+    significant_digits=int(os.environ.get("CHART_SIGNIFICANT_DIGITS", "6")),
+)
+prompt_builder = PromptBuilder(
+    token_budget=int(os.environ.get("PROMPT_TOKEN_BUDGET", "6000")),
+    max_cell_chars=int(os.environ.get("PROMPT_MAX_CELL_CHARS", "40")),
+)
+response_cache = ResponseCache(
+    RESPONSE_CACHE_PATH,
+    max_entries=int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "10000")),
+    ttl_seconds=float(os.environ.get("RESPONSE_CACHE_TTL_HOURS", "168")) * 3600,
+    similarity_threshold=RESPONSE_CACHE_SIMILARITY,
+)
+# Validated chart code per schema + question, shared by files with the same layout
+plan_cache = ResponseCache(
+    PLAN_CACHE_PATH,
+    max_entries=int(os.environ.get("PLAN_CACHE_MAX_ENTRIES", "10000")),
+    ttl_seconds=float(os.environ.get("PLAN_CACHE_TTL_HOURS", "720")) * 3600,
+    similarity_threshold=RESPONSE_CACHE_SIMILARITY,
+)
+
+
+# Cleaning and /ask jobs submitted to run in the background
+job_queue = JobQueue(
+    max_workers=int(os.environ.get("JOB_WORKERS", "2")),
+    max_finished=int(os.environ.get("JOB_MAX_FINISHED", "1000")),
+    finished_ttl=float(os.environ.get("JOB_TTL_MINUTES", "60")) * 60,
+)
+# Concurrent identical /ask and preview requests share one computation
+single_flight = SingleFlight()
+sql_engine = SQLEngine(
+    timeout=float(os.environ.get("SQL_TIMEOUT_SECONDS", "30")),
+    threads=int(os.environ.get("SQL_THREADS", "0")) or None,
+    memory_limit=os.environ.get("SQL_MEMORY_LIMIT"),
+    spill_dir=SPILL_DIR,
+)
 
 
 # Data Cleaning Classes
-class CleaningStrategy(Enum):
-    DROP = "drop"
-    FILL_MEAN = "fill_mean"
-    FILL_MEDIAN = "fill_median"
-    FILL_MODE = "fill_mode"
-    FILL_FORWARD = "fill_forward"
-    FILL_BACKWARD = "fill_backward"
-    FILL_ZERO = "fill_zero"
-
-
 class DataCleaner:
-    def __init__(self, df: pd.DataFrame):
-        self.original_df = df.copy()
-        self.cleaned_df = df.copy()
+    def __init__(self, df: pd.DataFrame, profile: Optional[Dict] = None):
+        # Operations are recorded on a lazy plan and applied in one pass
+        # when cleaned_df is first read
+        self._plan = CleaningPlan(df)
+        self.original_rows, self.original_columns = df.shape
         self.cleaning_log = []
+        self._profile = profile
+
+    @property
+    def cleaned_df(self) -> pd.DataFrame:
+        return self._plan.materialize()
+
+    @property
+    def profile(self) -> Dict:
+        """Single-pass data-quality profile of the data as loaded"""
+        if self._profile is None:
+            self._profile = profile_dataframe(self.cleaned_df)
+        return self._profile
 
     def get_data_summary(self) -> Dict:
         """Analyze data quality issues"""
+        columns = self.profile["columns"]
         summary = {
-            "total_rows": len(self.cleaned_df),
-            "total_columns": len(self.cleaned_df.columns),
-            "missing_values": self.cleaned_df.isnull().sum().to_dict(),
-            "duplicates": self.cleaned_df.duplicated().sum(),
-            "data_types": self.cleaned_df.dtypes.astype(str).to_dict(),
-            "memory_usage": self.cleaned_df.memory_usage(deep=True).sum(),
+            "total_rows": self.profile["rows"],
+            "total_columns": len(columns),
+            "missing_values": {col: stats["nulls"] for col, stats in columns.items()},
+            "duplicates": self.profile["duplicates"],
+            "data_types": {col: stats["dtype"] for col, stats in columns.items()},
+            "memory_usage": self.profile["memory_usage"],
+            "column_stats": columns,
+            "approximate": self.profile["approximate"],
         }
         return summary
 
     def suggest_cleaning_operations(self) -> List[Dict]:
         """Suggest cleaning operations based on data analysis"""
         suggestions = []
+        total_rows = self.profile["rows"]
 
         # Missing values suggestions
-        missing = self.cleaned_df.isnull().sum()
-        for col, count in missing.items():
+        for col, stats in self.profile["columns"].items():
+            count = stats["nulls"]
             if count > 0:
                 suggestions.append(
                     {
                         "type": "missing_values",
                         "column": col,
                         "issue_count": int(count),
-                        "percentage": round((count / len(self.cleaned_df)) * 100, 2),
+                        "percentage": round((count / total_rows) * 100, 2),
                         "suggested_strategy": self._suggest_missing_strategy(col),
                     }
                 )
 
         # Duplicates suggestion
-        dup_count = self.cleaned_df.duplicated().sum()
+        dup_count = self.profile["duplicates"]
         if dup_count > 0:
             suggestions.append(
                 {
                     "type": "duplicates",
                     "issue_count": int(dup_count),
-                    "percentage": round((dup_count / len(self.cleaned_df)) * 100, 2),
+                    "percentage": round((dup_count / total_rows) * 100, 2),
                 }
             )
 
@@ -85,36 +248,16 @@ class DataCleaner:
     ) -> "DataCleaner":
         """Handle missing values with specified strategy"""
         if columns is None:
-            columns = self.cleaned_df.columns.tolist()
+            columns = self._plan.columns
 
-        original_nulls = self.cleaned_df[columns].isnull().sum().sum()
+        original_nulls = self._plan.count_nulls(columns)
 
-        for col in columns:
-            if col not in self.cleaned_df.columns:
-                continue
+        if strategy == CleaningStrategy.DROP:
+            self._plan.drop_missing(columns)
+        else:
+            self._plan.fill_missing(columns, FILL_METHODS[strategy])
 
-            if strategy == CleaningStrategy.DROP:
-                self.cleaned_df = self.cleaned_df.dropna(subset=[col])
-            elif strategy == CleaningStrategy.FILL_MEAN and self.cleaned_df[
-                col
-            ].dtype in ["int64", "float64"]:
-                self.cleaned_df[col].fillna(self.cleaned_df[col].mean(), inplace=True)
-            elif strategy == CleaningStrategy.FILL_MEDIAN and self.cleaned_df[
-                col
-            ].dtype in ["int64", "float64"]:
-                self.cleaned_df[col].fillna(self.cleaned_df[col].median(), inplace=True)
-            elif strategy == CleaningStrategy.FILL_MODE:
-                mode_val = self.cleaned_df[col].mode()
-                fill_val = mode_val.iloc[0] if not mode_val.empty else "Unknown"
-                self.cleaned_df[col].fillna(fill_val, inplace=True)
-            elif strategy == CleaningStrategy.FILL_FORWARD:
-                self.cleaned_df[col].fillna(method="ffill", inplace=True)
-            elif strategy == CleaningStrategy.FILL_BACKWARD:
-                self.cleaned_df[col].fillna(method="bfill", inplace=True)
-            elif strategy == CleaningStrategy.FILL_ZERO:
-                self.cleaned_df[col].fillna(0, inplace=True)
-
-        final_nulls = self.cleaned_df[columns].isnull().sum().sum()
+        final_nulls = self._plan.count_nulls(columns)
 
         self.cleaning_log.append(
             {
@@ -132,9 +275,9 @@ class DataCleaner:
         self, subset: Optional[List[str]] = None, keep: str = "first"
     ) -> "DataCleaner":
         """Remove duplicate rows"""
-        original_count = len(self.cleaned_df)
-        self.cleaned_df = self.cleaned_df.drop_duplicates(subset=subset, keep=keep)
-        final_count = len(self.cleaned_df)
+        original_count = self._plan.row_count
+        self._plan.drop_duplicates(subset=subset, keep=keep)
+        final_count = self._plan.row_count
 
         self.cleaning_log.append(
             {
@@ -149,16 +292,11 @@ class DataCleaner:
 
     def standardize_columns(self) -> "DataCleaner":
         """Standardize column names"""
-        original_columns = self.cleaned_df.columns.tolist()
+        original_columns = self._plan.columns
 
         # Convert to lowercase, replace spaces with underscores, remove special chars
-        new_columns = []
-        for col in self.cleaned_df.columns:
-            new_col = col.lower().replace(" ", "_").replace("-", "_")
-            new_col = "".join(c for c in new_col if c.isalnum() or c == "_")
-            new_columns.append(new_col)
-
-        self.cleaned_df.columns = new_columns
+        new_columns = standardized_names(original_columns)
+        self._plan.rename(new_columns)
 
         self.cleaning_log.append(
             {
@@ -174,9 +312,11 @@ class DataCleaner:
         """Suggest best strategy for handling missing values in a column"""
         col_data = self.cleaned_df[column]
 
-        if col_data.dtype in ["int64", "float64"]:
+        if is_measure(col_data):
             return CleaningStrategy.FILL_MEDIAN.value
-        elif col_data.dtype == "object":
+        elif pd.api.types.is_string_dtype(col_data.dtype) or isinstance(
+            col_data.dtype, pd.CategoricalDtype
+        ):
             return CleaningStrategy.FILL_MODE.value
         else:
             return CleaningStrategy.DROP.value
@@ -186,6 +326,7 @@ class DataCleaner:
 class askRequest(BaseModel):
     filename: str
     question: str
+    engine: Optional[str] = None  # "pandas" or "sql"; defaults to ASK_ENGINE
 
 
 class AnalysisResponse(BaseModel):
@@ -223,42 +364,372 @@ def get_file_path(filename: str) -> str:
     return os.path.join(BASE_DIR, clean_filename)
 
 
+def request_key(path: str, *payload) -> Tuple:
+    """Identifies identical work: same file contents and the same request"""
+    return (path, df_cache.file_signature(path), dumps(payload))
+
+
+def load_dataframe(path: str) -> pd.DataFrame:
+    """Load a stored dataset through the shared DataFrame cache.
+
+    Reads the columnar sidecar when one exists, otherwise the CSV, with the
+    dataset's load schema applied. The returned frame is shared between
+    requests and must not be mutated.
+    """
+    return df_cache.get(path, read_stored_dataset)
+
+
+def dataset_shape(
+    path: str, entry: Optional[Dict], signature: Tuple[int, int]
+) -> Tuple[List[str], int]:
+    """Column names and row count of a stored dataset, from its catalog entry.
+
+    The dataset is only loaded when the entry is missing or older than the
+    file; the sandbox reads the columns it needs itself.
+    """
+    if entry and (entry["modified_ns"], entry["size_bytes"]) == signature:
+        return list(entry["dtypes"]), entry["rows"]
+    df = load_dataframe(path)
+    return list(df.columns), len(df)
+
+
+def stored_load_schema(path: str) -> Optional[Dict[str, str]]:
+    entry = catalog.get(os.path.basename(path))
+    return entry["load_schema"] if entry else None
+
+
+def read_stored_dataset(path: str) -> pd.DataFrame:
+    """Read a dataset with its catalogued load schema.
+
+    Datasets catalogued before load schemas existed get one chosen from
+    this read; it is saved, and the sidecar rewritten with the optimized
+    dtypes, so the choice is made only once.
+    """
+    name = os.path.basename(path)
+    entry = catalog.get(name)
+    if entry is None or entry["load_schema"] is not None:
+        return read_dataset(path, load_schema=entry and entry["load_schema"])
+
+    df = read_dataset(path)
+    load_schema = choose_load_schema(df)
+    catalog.set_load_schema(name, load_schema)
+    df = apply_load_schema(df, load_schema)
+    if load_schema and has_fresh_sidecar(path):
+        store_sidecar(path, df)
+    return df
+
+
+# Number of sidecar writes running per stored CSV
+sidecar_builds: Dict[str, int] = {}
+sidecar_builds_lock = threading.Lock()
+
+
+@contextmanager
+def sidecar_build(csv_path: str, exclusive: bool = False) -> Iterator[bool]:
+    """Mark csv_path's sidecar as being written for the duration of the block.
+
+    Yields whether the write may go ahead: with ``exclusive``, False (and
+    nothing is marked) when another write of the same sidecar is running.
+    """
+    with sidecar_builds_lock:
+        claimed = not (exclusive and sidecar_builds.get(csv_path))
+        if claimed:
+            sidecar_builds[csv_path] = sidecar_builds.get(csv_path, 0) + 1
+    try:
+        yield claimed
+    finally:
+        if claimed:
+            with sidecar_builds_lock:
+                sidecar_builds[csv_path] -= 1
+                if not sidecar_builds[csv_path]:
+                    del sidecar_builds[csv_path]
+
+
+def store_sidecar(csv_path: str, df: pd.DataFrame, if_missing: bool = False) -> None:
+    """Write the columnar sidecar for a stored CSV without failing the request.
+
+    With ``if_missing``, nothing is written when a fresh sidecar exists or
+    another write of it is already running.
+    """
+    with sidecar_build(csv_path, exclusive=if_missing) as claimed:
+        if not claimed or (if_missing and has_fresh_sidecar(csv_path)):
+            return
+        try:
+            write_sidecar(csv_path, df)
+        except Exception as e:
+            print(f"Sidecar write failed for {csv_path}: {e}")
+
+
+sandbox_pool = SandboxPool(
+    size=int(os.environ.get("SANDBOX_WORKERS", default_pool_size())),
+    timeout=float(os.environ.get("SANDBOX_TIMEOUT_SECONDS", "30")),
+    load_timeout=float(os.environ.get("SANDBOX_LOAD_TIMEOUT_SECONDS", "120")),
+    memory_limit=int(os.environ.get("SANDBOX_MEMORY_LIMIT_MB", "2048")) * 1024 * 1024,
+    max_datasets=int(os.environ.get("SANDBOX_MAX_DATASETS", "1")),
+    loader=load_dataframe,
+)
+
+
+async def startup() -> None:
+    """Warm up long-lived resources when the app starts"""
+    # Spawn sandbox workers now so the first /ask does not pay for it
+    sandbox_pool.start()
+    history_store.start()
+    await run_in_threadpool(import_legacy_history)
+    # Catch up with files changed while the app was down, without delaying startup
+    threading.Thread(
+        target=reconcile_catalog, name="catalog-reconcile", daemon=True
+    ).start()
+
+
+async def shutdown() -> None:
+    job_queue.shutdown()
+    sandbox_pool.shutdown()
+    sql_engine.close()
+    history_store.close()
+
+
+def cleaned_parent(filename: str) -> Optional[str]:
+    """The file a cleaned_<name> output was produced from"""
+    if filename.startswith("cleaned_"):
+        return filename[len("cleaned_") :]
+    return None
+
+
+def describe_csv(path: str):
+    info = scan_csv(path, INGEST_CHUNK_ROWS)
+    return info["rows"], info["dtypes"], info["load_schema"]
+
+
+def reconcile_catalog() -> None:
+    try:
+        result = catalog.reconcile(BASE_DIR, describe_csv, cleaned_parent)
+        print(f"Dataset catalog reconciled: {result}")
+        adopt_stored_files()
+        blob_store.collect_garbage()
+    except Exception as e:
+        print(f"Dataset catalog reconciliation failed: {e}")
+
+
+def adopt_stored_files() -> None:
+    """Move stored files that are not blob-backed yet into the blob store"""
+    with os.scandir(BASE_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".csv") or entry.stat().st_nlink > 1:
+                continue
+            known = catalog.get(entry.name)
+            if known and known["content_hash"]:
+                blob_store.adopt(entry.path, known["content_hash"])
+
+
+def store_cleaned_blob(path: str, previous_hash: Optional[str]) -> None:
+    """Hash a cleaned output into the catalog and the blob store"""
+    try:
+        signature = df_cache.file_signature(path)
+        content_hash = file_sha256(path)
+        if df_cache.file_signature(path) != signature:
+            return  # Rewritten meanwhile; the newer clean stores it
+        catalog.set_content_hash(os.path.basename(path), content_hash)
+        blob_store.adopt(path, content_hash)
+        if previous_hash != content_hash:
+            blob_store.release(previous_hash)
+    except Exception as e:
+        print(f"Content hash failed for {path}: {e}")
+
+
+def import_legacy_history() -> None:
+    """Move append-only storage/history/<file>.json logs into the history store"""
+    if not os.path.isdir(HISTORY_DIR):
+        return
+    for path in Path(HISTORY_DIR).glob("*.json"):
+        try:
+            history_store.import_jsonl(path.stem, str(path))
+            os.replace(path, f"{path}.imported")
+        except Exception as e:
+            print(f"History import failed for {path}: {e}")
+
+
+async def stream_upload(file: UploadFile, dest: str) -> Tuple[int, str]:
+    """Copy an upload to dest chunk by chunk, validating it as it arrives.
+
+    UTF-8 is checked with an incremental decoder and the header row is
+    checked as soon as it has been received, so the whole upload is never
+    held in memory. Returns the number of bytes written and their SHA-256.
+    """
+    digest = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    header = ""
+    header_checked = False
+    size = 0
+
+    with open(dest, "wb") as f:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if size > MAX_FILE_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File exceeds maximum size of {MAX_FILE_SIZE/1024/1024}MB",
+                )
+
+            text = decoder.decode(chunk)
+            if not header_checked:
+                header += text
+                if "\n" in header:
+                    validate_csv_header(header.split("\n", 1)[0])
+                    header_checked = True
+                elif len(header) > MAX_HEADER_CHARS:
+                    raise HTTPException(
+                        status_code=400, detail="CSV header row is too long"
+                    )
+
+            digest.update(chunk)
+            f.write(chunk)
+
+        decoder.decode(b"", final=True)
+
+    if not header_checked:
+        validate_csv_header(header)
+    return size, digest.hexdigest()
+
+
+def validate_csv_header(line: str) -> None:
+    """Reject uploads whose first line is not a usable CSV header"""
+    fields = next(csv.reader([line.strip("\r\ufeff")]), [])
+    if not any(field.strip() for field in fields):
+        raise HTTPException(status_code=400, detail="The CSV file appears to be empty")
+
+
+def build_sidecar(csv_path: str, info: Dict) -> None:
+    """Stream a stored CSV into its columnar sidecar in the background.
+
+    ``info`` is the file's ``scan_csv`` result; the sidecar stores the
+    columns with the dtypes of its load schema.
+    """
+    try:
+        with sidecar_build(csv_path):
+            signature = df_cache.file_signature(csv_path)
+            write_sidecar_from_csv(
+                csv_path,
+                info["dtypes"],
+                chunksize=INGEST_CHUNK_ROWS,
+                load_schema=info["load_schema"],
+                categories=info["categories"],
+            )
+            if df_cache.file_signature(csv_path) != signature:
+                # The CSV was replaced while we were reading it
+                remove_sidecar(csv_path)
+    except Exception as e:
+        print(f"Sidecar write failed for {csv_path}: {e}")
+
+
+def materialize_cube(csv_path: str) -> None:
+    """Precompute a stored dataset's aggregate cube in the background.
+
+    Dimensions and measures are picked from the dataset's profile; /ask
+    then answers the group-bys the cube holds without scanning the rows.
+    """
+    if not AGGREGATE_CUBE:
+        return
+    try:
+        signature = df_cache.file_signature(csv_path)
+        df = load_dataframe(csv_path)
+        profile = profile_cache.get(signature + (csv_path,), df)
+        layout = choose_layout(
+            profile,
+            max_dimension_values=CUBE_MAX_DIMENSION_VALUES,
+            max_cells=CUBE_MAX_CELLS,
+        )
+        build_cube(csv_path, df, layout)
+        if df_cache.file_signature(csv_path) != signature:
+            remove_cube(csv_path)
+    except Exception as e:
+        print(f"Aggregate cube build failed for {csv_path}: {e}")
+
+
+def upload_response(filename: str, size: int, entry: Dict, deduplicated: bool):
+    return JSONResponse(
+        status_code=200,
+        content={
+            "message": "File Successfully Uploaded",
+            "filename": filename,
+            "size": f"{size/1024:.2f} KB",
+            "columns": entry["columns"],
+            "rows": entry["rows"],
+            "deduplicated": deduplicated,
+        },
+    )
+
+
 @router.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    tmp_path = None
     try:
         if not file.filename.lower().endswith(".csv"):
             raise HTTPException(status_code=400, detail="wrong file type")
 
-        file_content = await file.read()
-        if len(file_content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File exceeds maximum size of {MAX_FILE_SIZE/1024/1024}MB",
-            )
+        safename = sanitize_filename(file.filename)
+        if not safename:
+            raise HTTPException(status_code=400, detail="Invalid filename")
+
+        os.makedirs(BASE_DIR, exist_ok=True)
+        tmp_path = os.path.join(BASE_DIR, f".{safename}.{uuid.uuid4().hex}.part")
 
         try:
-            df = pd.read_csv(io.StringIO(file_content.decode("utf-8")))
-            if df.empty:
-                raise HTTPException(status_code=400, detail="file is empty")
-
-            safename = sanitize_filename(file.filename)
-            if not safename:
-                raise HTTPException(status_code=400, detail="Invalid filename")
-
-            os.makedirs(BASE_DIR, exist_ok=True)
-            with open(f"storage/user_data/{safename}", "wb") as f:
-                f.write(file_content)
-
-            return JSONResponse(
-                status_code=200,
-                content={
-                    "message": "File Successfully Uploaded",
-                    "filename": safename,
-                    "size": f"{len(file_content)/1024:.2f} KB",
-                    "columns": list(df.columns),
-                    "rows": len(df),
-                },
+            size, content_hash = await stream_upload(file, tmp_path)
+            stored_path = os.path.join(BASE_DIR, safename)
+            previous = catalog.get(safename)
+
+            if (
+                previous
+                and previous["content_hash"] == content_hash
+                and os.path.exists(stored_path)
+            ):
+                # Same bytes under the same name: nothing to store or invalidate
+                return upload_response(safename, size, previous, deduplicated=True)
+
+            info = None
+            known = catalog.find_by_hash(content_hash, prefer_not=safename)
+            if known and blob_store.has(content_hash):
+                # Already stored under another name: reuse its metadata
+                rows, dtypes = known["rows"], known["dtypes"]
+                load_schema = known["load_schema"]
+            else:
+                known = None
+                info = await run_in_threadpool(scan_csv, tmp_path, INGEST_CHUNK_ROWS)
+                if info["rows"] == 0:
+                    raise HTTPException(status_code=400, detail="file is empty")
+                rows, dtypes = info["rows"], info["dtypes"]
+                load_schema = info["load_schema"]
+
+            await run_in_threadpool(blob_store.adopt, tmp_path, content_hash)
+            remove_sidecar(stored_path)
+            remove_cube(stored_path)
+            os.replace(tmp_path, stored_path)
+            tmp_path = None
+            df_cache.invalidate(stored_path)
+            entry = catalog.register(
+                stored_path,
+                rows,
+                dtypes,
+                content_hash=content_hash,
+                load_schema=load_schema,
             )
+            if previous:
+                blob_store.release(previous["content_hash"])
+
+            sibling = os.path.join(BASE_DIR, known["filename"]) if known else None
+            if info is not None:
+                background_tasks.add_task(build_sidecar, stored_path, info)
+            elif not share_sidecar(sibling, stored_path):
+                background_tasks.add_task(rebuild_sidecar, stored_path)
+            if not (sibling and share_cube(sibling, stored_path)):
+                background_tasks.add_task(materialize_cube, stored_path)
+
+            return upload_response(safename, size, entry, deduplicated=bool(known))
 
         except pd.errors.EmptyDataError:
             raise HTTPException(
@@ -279,9 +750,29 @@ async def upload_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
     finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         await file.close()
 
 
+def preview_body(path: str) -> bytes:
+    """The encoded /data/preview-cleaning response for a stored file"""
+    df = load_dataframe(path)
+    profile = profile_cache.get(df_cache.file_signature(path) + (path,), df)
+    cleaner = DataCleaner(df, profile)
+    summary = cleaner.get_data_summary()
+    summary["memory_optimization"] = memory_optimization(
+        df, stored_load_schema(path) or {}, summary["memory_usage"]
+    )
+    return dumps(
+        {
+            "summary": summary,
+            "suggestions": cleaner.suggest_cleaning_operations(),
+            "sample_data": records_json(df.head(5)),
+        }
+    )
+
+
 @router.post("/data/preview-cleaning")
 async def preview_cleaning(data: CleaningPreviewRequest):
     """Preview data quality issues and suggested cleaning operations"""
@@ -290,14 +781,12 @@ async def preview_cleaning(data: CleaningPreviewRequest):
         if not os.path.exists(path):
             raise HTTPException(status_code=404, detail="File does not exist")
 
-        df = pd.read_csv(path)
-        cleaner = DataCleaner(df)
-
-        return {
-            "summary": cleaner.get_data_summary(),
-            "suggestions": cleaner.suggest_cleaning_operations(),
-            "sample_data": df.head(5).to_dict(orient="records"),
-        }
+        body = await single_flight.run(
+            "preview-cleaning",
+            request_key(path),
+            lambda: run_in_threadpool(preview_body, path),
+        )
+        return FastJSONResponse(body)
 
     except HTTPException:
         raise
@@ -305,346 +794,636 @@ async def preview_cleaning(data: CleaningPreviewRequest):
         raise HTTPException(status_code=500, detail=f"Error analyzing data: {str(e)}")
 
 
-@router.post("/data/clean")
-async def clean_data(data: CleaningRequest):
-    """Apply cleaning operations to data"""
+def apply_cleaning_operations(cleaner, operations: List[Dict]) -> None:
+    """Record the requested operations on a DataCleaner or StreamingCleaner"""
+    for operation in operations:
+        if operation["type"] == "missing_values":
+            strategy = CleaningStrategy(operation["strategy"])
+            columns = operation.get("columns")
+            cleaner.handle_missing_values(strategy, columns)
+        elif operation["type"] == "duplicates":
+            cleaner.remove_duplicates()
+        elif operation["type"] == "standardize_columns":
+            cleaner.standardize_columns()
+
+
+def clean_streaming(
+    path: str,
+    cleaned_path: str,
+    operations: List[Dict],
+    progress: Optional[Callable[[float], None]] = None,
+):
+    """Clean a CSV that is too large to load, one chunk at a time"""
+    info = scan_csv(path, INGEST_CHUNK_ROWS)
+    report = progress or (lambda fraction: None)
+    report(0.1)
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    cleaner = StreamingCleaner(
+        path, info["dtypes"], chunksize=INGEST_CHUNK_ROWS, spill_dir=SPILL_DIR
+    )
+    apply_cleaning_operations(cleaner, operations)
+    # The run's last report comes just before it replaces cleaned_path;
+    # a cancellation after that no longer stops it
+    cleaner.run(
+        cleaned_path,
+        lambda fraction: report(0.1 + 0.85 * fraction),
+        info["rows"],
+    )
+    remove_sidecar(cleaned_path)
+    remove_cube(cleaned_path)
+    df_cache.invalidate(cleaned_path)
+    catalog.register(
+        cleaned_path,
+        cleaner.cleaned_rows,
+        cleaner.cleaned_dtypes,
+        parent=os.path.basename(path),
+    )
+    return cleaner
+
+
+def rebuild_sidecar(csv_path: str) -> None:
+    """Rescan a CSV written outside of upload and rebuild its sidecar"""
+    try:
+        info = scan_csv(csv_path, INGEST_CHUNK_ROWS)
+        catalog.set_load_schema(os.path.basename(csv_path), info["load_schema"])
+    except Exception as e:
+        print(f"Sidecar write failed for {csv_path}: {e}")
+        return
+    build_sidecar(csv_path, info)
+
+
+def clean_in_memory(
+    path: str,
+    cleaned_path: str,
+    operations: List[Dict],
+    progress: Optional[Callable[[float], None]] = None,
+) -> Tuple[DataCleaner, pd.DataFrame]:
+    """Clean a CSV that fits in memory and store the cleaned file"""
+    report = progress or (lambda fraction: None)
+    df = load_dataframe(path)
+    report(0.3)
+    cleaner = DataCleaner(df)
+    apply_cleaning_operations(cleaner, operations)
+    report(0.6)
+
+    # Save cleaned data
+    cleaned_df = cleaner.cleaned_df
+    report(0.8)
+    # Write beside and swap in: the old file may be a link to a shared blob
+    tmp_cleaned = f"{cleaned_path}.{uuid.uuid4().hex}.part"
+    try:
+        cleaned_df.to_csv(tmp_cleaned, index=False)
+        # Last point a cancellation takes effect: past it the file is replaced
+        report(0.95)
+    except Exception:
+        if os.path.exists(tmp_cleaned):
+            os.remove(tmp_cleaned)
+        raise
+    remove_cube(cleaned_path)
+    os.replace(tmp_cleaned, cleaned_path)
+    df_cache.invalidate(cleaned_path)
+    store_sidecar(cleaned_path, cleaned_df)
+    catalog.register(
+        cleaned_path,
+        len(cleaned_df),
+        cleaned_df.dtypes.astype(str).to_dict(),
+        parent=os.path.basename(path),
+        load_schema=frame_load_schema(cleaned_df),
+    )
+    return cleaner, cleaned_df
+
+
+async def clean_dataset(
+    data: CleaningRequest,
+    background_tasks: BackgroundTasks,
+    progress: Optional[Callable[[float], None]] = None,
+) -> Dict:
+    """Apply cleaning operations to a stored file and return the response body.
+
+    The work runs in a thread; ``progress`` is called from it with the
+    share done so far. Follow-up work (sidecar, blob, cube) is added to
+    background_tasks.
+    """
     try:
         path = get_file_path(data.filename)
         if not os.path.exists(path):
             raise HTTPException(status_code=404, detail="File does not exist")
 
-        df = pd.read_csv(path)
-        cleaner = DataCleaner(df)
-
-        # Apply cleaning operations
-        for operation in data.operations:
-            if operation["type"] == "missing_values":
-                strategy = CleaningStrategy(operation["strategy"])
-                columns = operation.get("columns")
-                cleaner.handle_missing_values(strategy, columns)
-            elif operation["type"] == "duplicates":
-                cleaner.remove_duplicates()
-            elif operation["type"] == "standardize_columns":
-                cleaner.standardize_columns()
-
-        # Save cleaned data
         cleaned_filename = f"cleaned_{data.filename}"
         cleaned_path = os.path.join(BASE_DIR, cleaned_filename)
-        cleaner.cleaned_df.to_csv(cleaned_path, index=False)
+        previous = catalog.get(os.path.basename(cleaned_path))
+        previous_hash = previous["content_hash"] if previous else None
+
+        if os.path.getsize(path) > STREAMING_CLEAN_BYTES:
+            cleaner = await run_in_threadpool(
+                clean_streaming, path, cleaned_path, data.operations, progress
+            )
+            background_tasks.add_task(rebuild_sidecar, cleaned_path)
+            background_tasks.add_task(store_cleaned_blob, cleaned_path, previous_hash)
+            background_tasks.add_task(materialize_cube, cleaned_path)
+            return {
+                "message": "Data cleaned successfully",
+                "cleaned_filename": cleaned_filename,
+                "cleaning_log": cleaner.cleaning_log,
+                "summary": {
+                    "original_rows": cleaner.original_rows,
+                    "cleaned_rows": cleaner.cleaned_rows,
+                    "original_columns": cleaner.original_columns,
+                    "cleaned_columns": cleaner.cleaned_columns,
+                },
+                "sample_data": records_json(cleaner.sample_data),
+                "streaming": True,
+            }
+
+        cleaner, cleaned_df = await run_in_threadpool(
+            clean_in_memory, path, cleaned_path, data.operations, progress
+        )
+        background_tasks.add_task(store_cleaned_blob, cleaned_path, previous_hash)
+        background_tasks.add_task(materialize_cube, cleaned_path)
 
         return {
             "message": "Data cleaned successfully",
             "cleaned_filename": cleaned_filename,
             "cleaning_log": cleaner.cleaning_log,
             "summary": {
-                "original_rows": len(cleaner.original_df),
-                "cleaned_rows": len(cleaner.cleaned_df),
-                "original_columns": len(cleaner.original_df.columns),
-                "cleaned_columns": len(cleaner.cleaned_df.columns),
+                "original_rows": cleaner.original_rows,
+                "cleaned_rows": len(cleaned_df),
+                "original_columns": cleaner.original_columns,
+                "cleaned_columns": len(cleaned_df.columns),
             },
-            "sample_data": cleaner.cleaned_df.head(5).to_dict(orient="records"),
+            "sample_data": records_json(cleaned_df.head(5)),
         }
 
-    except HTTPException:
+    except (HTTPException, JobCancelled):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error cleaning data: {str(e)}")
 
 
-@router.post("/ask")
-async def post_question(data: askRequest):
-    try:
-        path = get_file_path(data.filename)
-        if not os.path.exists(path):
-            raise HTTPException(status_code=404, detail="File does not exist")
+@router.post("/data/clean")
+async def clean_data(data: CleaningRequest, background_tasks: BackgroundTasks):
+    """Apply cleaning operations to data"""
+    return FastJSONResponse(await clean_dataset(data, background_tasks))
 
-        df = pd.read_csv(path)
-        sample_rows = df.head(3).to_dict(orient="records")
-        columns = df.columns.tolist()
-
-        sample_rows_json = json.dumps(sample_rows)
-        columns_json = json.dumps(columns)
-
-        prompt = f"""
-You are an expert business data analyst. Analyze this DataFrame and provide actionable business insights with Recharts.js configuration:
-
-COLUMNS: {columns_json}
-SAMPLE DATA: {sample_rows_json}
-USER QUESTION: {data.question}
-
-Return your response as STRICTLY VALID JSON parsable by `json.loads()`. Use this format:
-
-{{
-  "charts": [
-    {{
-      "pandas_code": "Pandas code that processes the data and ends with result variable",
-      "recharts_config": {{
-        "type": "BarChart|LineChart|PieChart",
-        "dataKey": "value",
-        "xAxisKey": "category",
-        "yAxisKey": "value",
-        "colors": ["#0088FE", "#00C49F", "#FFBB28", "#FF8042"],
-        "title": "Chart Title",
-        "components": {{
-          "XAxis": {{"dataKey": "category"}},
-          "YAxis": {{}},
-          "CartesianGrid": {{"strokeDasharray": "3 3"}},
-          "Tooltip": {{}},
-          "Legend": {{}},
-          "Bar": {{"dataKey": "value", "fill": "#8884d8"}}
-        }}
-      }},
-      "explanation": "Detailed business analysis with specific findings and implications",
-      "insights": ["Actionable recommendation with specific numbers and next steps", "Strategic insight with clear business impact and suggested actions"]
-    }}
-  ]
-}}
-
-CRITICAL INSTRUCTIONS for pandas_code:
-- Write pandas code that processes the data and ends with: result = final_dataframe
-- The result must be a DataFrame with EXACTLY 2 columns: 'category' and 'value'
-- 'category' contains labels (product names, dates, categories) - NOT indices
-- 'value' contains numeric data for visualization
-- Example: result = df.groupby('Product')['Revenue'].sum().reset_index(); result.columns = ['category', 'value']
-
-RECHARTS CONFIG INSTRUCTIONS:
-- Choose appropriate chart type: BarChart for comparisons, LineChart for trends, PieChart for proportions
-- Set proper dataKey values that match your data structure
-- For BarChart: include Bar component with dataKey and fill color
-- For LineChart: include Line component with dataKey, stroke color, and strokeWidth
-- For PieChart: include Pie component with dataKey, cx, cy, outerRadius, fill, and label
-- Always include Tooltip and Legend components
-- Use meaningful colors from the provided palette
-
-RECHARTS COMPONENT EXAMPLES:
-
-For BarChart:
-{{
-  "type": "BarChart",
-  "components": {{
-    "XAxis": {{"dataKey": "category"}},
-    "YAxis": {{}},
-    "CartesianGrid": {{"strokeDasharray": "3 3"}},
-    "Tooltip": {{}},
-    "Legend": {{}},
-    "Bar": {{"dataKey": "value", "fill": "#8884d8"}}
-  }}
-}}
-
-For LineChart:
-{{
-  "type": "LineChart",
-  "components": {{
-    "XAxis": {{"dataKey": "category"}},
-    "YAxis": {{}},
-    "CartesianGrid": {{"strokeDasharray": "3 3"}},
-    "Tooltip": {{}},
-    "Legend": {{}},
-    "Line": {{"type": "monotone", "dataKey": "value", "stroke": "#8884d8", "strokeWidth": 2}}
-  }}
-}}
-
-For PieChart:
-{{
-  "type": "PieChart",
-  "components": {{
-    "Tooltip": {{}},
-    "Legend": {{}},
-    "Pie": {{"dataKey": "value", "cx": "50%", "cy": "50%", "outerRadius": 80, "fill": "#8884d8", "label": true}}
-  }}
-}}
-
-EXPLANATION REQUIREMENTS - Write like a business consultant:
-- Start with the key finding: "Analysis reveals..." or "The data shows..."
-- Include specific numbers, percentages, and comparisons
-- Explain what this means for the business (revenue impact, efficiency, risks)
-- Be detailed but focused on business implications
-- Minimum 50 words, avoid generic statements
-
-INSIGHTS REQUIREMENTS - Each insight must be a complete actionable recommendation:
-- Start with a specific action: "Increase marketing spend for...", "Prioritize inventory for...", "Investigate the decline in..."
-- Include the business rationale with numbers
-- Suggest next steps or metrics to monitor
-- Make each insight 30-50 words
-- Focus on decisions executives can act on
-
-CRITICAL: Do not wrap the JSON in markdown code blocks (```). Do not include any markdown, explanations, or extra text. Output ONLY the raw JSON object starting with {{ and ending with }}.
-"""
-
-        # Add retry logic for LLM calls
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                chat_completion = client.chat.completions.create(
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a JSON-only assistant. Return ONLY valid JSON without any markdown code blocks, explanations, or formatting. Do not use ``` or any other markdown.",
-                        },
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.1,
-                    model="llama-3.3-70b-versatile",
-                )
 
-                content = chat_completion.choices[0].message.content
+ASK_SYSTEM_PROMPT = "You are a JSON-only assistant. Return ONLY valid JSON without any markdown code blocks, explanations, or formatting. Do not use ``` or any other markdown."
 
-                # Debug logging
-                print(
-                    f"LLM Response (attempt {attempt + 1}):",
-                    content[:200] + "..." if len(content) > 200 else content,
-                )
 
-                if not content or content.strip() == "":
-                    raise ValueError("Empty response from LLM")
+def build_ask_prompt(
+    path: str, df: pd.DataFrame, question: str, engine: str
+) -> Tuple[str, Dict]:
+    """Build the /ask prompt for engine from the dataset's cached profile"""
+    profile = profile_cache.get(df_cache.file_signature(path) + (path,), df)
+    prompt, report = prompt_builder.build(df, profile, question, engine)
+    return prompt, report
 
-                # Clean the content - handle markdown code blocks
-                content = content.strip()
 
-                # Remove opening markdown blocks
-                if content.startswith("```json"):
-                    content = content[7:]
-                elif content.startswith("```"):
-                    content = content[3:]
+CHART_FIELDS = ("recharts_config", "explanation", "insights")
+# The field holding each engine's generated code
+CODE_FIELDS = {"pandas": "pandas_code", "sql": "sql_query"}
 
-                # Remove closing markdown blocks
-                if content.endswith("```"):
-                    content = content[:-3]
 
-                content = content.strip()
+def resolve_engine(requested: Optional[str]) -> str:
+    """The engine answering a request: its own choice, else ASK_ENGINE.
 
-                try:
-                    llm_response = json.loads(content)
-                except json.JSONDecodeError as json_err:
-                    print(f"JSON Parse Error: {json_err}")
-                    print(f"Raw content: {repr(content)}")
-                    if attempt == max_retries - 1:
-                        raise HTTPException(
-                            status_code=500,
-                            detail=f"Invalid JSON from LLM after {max_retries} attempts: {json_err}",
-                        )
-                    continue
+    Asking for the SQL engine without duckdb installed is an error; a
+    configured SQL default falls back to pandas instead.
+    """
+    engine = requested or ASK_ENGINE
+    if engine not in CODE_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown engine '{engine}', expected one of {list(CODE_FIELDS)}",
+        )
+    if engine == "sql" and not sql_available():
+        if requested:
+            raise HTTPException(
+                status_code=400, detail="The sql engine needs duckdb installed"
+            )
+        return "pandas"
+    return engine
 
-                break
 
-            except Exception as e:
-                print(f"LLM API Error (attempt {attempt + 1}): {e}")
-                if attempt == max_retries - 1:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"LLM API failed after {max_retries} attempts: {str(e)}",
-                    )
-                continue
+def cache_key(key: str, engine: str) -> str:
+    """Response/plan cache key of engine's answers; pandas keeps the bare key"""
+    return key if engine == "pandas" else f"{key}:{engine}"
 
-        # Validate response structure
-        if not isinstance(llm_response, dict):
-            raise HTTPException(
-                status_code=500, detail="LLM response is not a JSON object"
-            )
 
-        if "charts" in llm_response and llm_response["charts"]:
-            if (
-                not isinstance(llm_response["charts"], list)
-                or len(llm_response["charts"]) == 0
-            ):
-                raise HTTPException(
-                    status_code=500, detail="LLM response charts field is invalid"
-                )
-            chart_data = llm_response["charts"][0]
-        else:
-            chart_data = llm_response
+def select_charts(llm_response: Dict) -> List[Dict]:
+    """Validate an LLM response and return every chart it describes"""
+    if not isinstance(llm_response, dict):
+        raise HTTPException(status_code=500, detail="LLM response is not a JSON object")
 
-        # Validate required keys for new format
-        required_keys = {"pandas_code", "recharts_config", "explanation", "insights"}
-        missing_keys = required_keys - set(chart_data.keys())
-        if missing_keys:
+    if "charts" in llm_response and llm_response["charts"]:
+        if not isinstance(llm_response["charts"], list):
             raise HTTPException(
-                status_code=422,
-                detail=f"LLM response missing required fields: {missing_keys}",
+                status_code=500, detail="LLM response charts field is invalid"
             )
+        return llm_response["charts"]
+    return [llm_response]
 
-        # Execute pandas code to get data
-        llm_code = chart_data["pandas_code"]
-        safe_locals = {"df": df.copy()}
 
+def check_chart(chart_data: Dict, engine: str) -> None:
+    """Raise if a chart lacks the fields needed to run it on engine and display it"""
+    if not isinstance(chart_data, dict):
+        raise HTTPException(status_code=422, detail="LLM chart is not a JSON object")
+    missing_keys = {CODE_FIELDS[engine], *CHART_FIELDS} - set(chart_data.keys())
+    if missing_keys:
+        raise HTTPException(
+            status_code=422,
+            detail=f"LLM response missing required fields: {missing_keys}",
+        )
+
+
+def ensure_sidecar(path: str, df: pd.DataFrame) -> None:
+    """Make sure sandbox workers can memory-map the dataset instead of parsing it.
+
+    The sidecar is written from df (already in memory here) unless one is
+    fresh or being built, e.g. streamed by the upload. Streamed sidecars
+    hold one record batch per CSV chunk, which readers concatenate with a
+    copy; that is cheaper than writing the dataset a second time.
+    """
+    store_sidecar(path, df, if_missing=True)
+
+
+def execute_chart_code(
+    path: str, llm_code: str, recharts_config: Dict
+) -> Tuple[RawJSON, Dict, Dict]:
+    """Run generated pandas code in the sandbox and return its encoded chart records.
+
+    The code is checked and rewritten first (group-bys the dataset's
+    aggregate cube holds become lookups), and only the columns it uses are
+    loaded. Large results are reduced to fit the chart payload budget;
+    the other values report what was reduced and what the analysis did.
+    """
+    signature = df_cache.file_signature(path)
+    entry = catalog.get(os.path.basename(path))
+    load_schema = entry["load_schema"] if entry else None
+    columns, rows = dataset_shape(path, entry, signature)
+    cube = read_manifest(path) if AGGREGATE_CUBE else None
+    try:
+        analyzed = analyze_code(
+            llm_code,
+            columns,
+            rows,
+            max_seconds=sandbox_pool.timeout,
+            cube=cube,
+        )
+    except CodeRejected as e:
+        print(f"Generated code: {llm_code}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    lookups = cube_path(path) if analyzed.cube_lookups else None
+    try:
         try:
-            exec(llm_code, {"pd": pd, "np": np}, safe_locals)
-        except Exception as e:
-            print(f"Code execution error: {e}")
-            print(f"Generated code: {llm_code}")
-            raise HTTPException(
-                status_code=400, detail=f"Error executing AI code: {str(e)}"
+            result = sandbox_pool.run(
+                path, signature, analyzed.code, analyzed.columns, load_schema, lookups
             )
-
-        result = safe_locals.get("result")
-        if result is None:
-            raise HTTPException(
-                status_code=400, detail="No variable 'result' found in AI code output"
+        except (SandboxTimeout, SandboxMemoryError):
+            raise
+        except SandboxError:
+            if analyzed.columns is None:
+                raise
+            # Pruning is conservative, but never let it be the cause of a failure
+            analyzed.columns = None
+            result = sandbox_pool.run(
+                path,
+                signature,
+                analyzed.code,
+                load_schema=load_schema,
+                cube_path=lookups,
             )
+    except (SandboxTimeout, SandboxMemoryError) as e:
+        print(f"Generated code: {llm_code}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except SandboxError as e:
+        print(f"Code execution error: {e}")
+        print(f"Generated code: {llm_code}")
+        raise HTTPException(
+            status_code=400, detail=f"Error executing AI code: {str(e)}"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Convert result to proper format
-        if isinstance(result, pd.DataFrame):
-            chart_data_records = result.to_dict(orient="records")
-        elif isinstance(result, pd.Series):
-            chart_data_records = result.reset_index().to_dict(orient="records")
-        else:
-            raise HTTPException(
-                status_code=400, detail="Unsupported result format for charting"
-            )
+    # Convert result to proper format
+    chart_data_records, reduction = chart_reducer.reduce(result, recharts_config)
 
-        if not chart_data_records:
-            raise HTTPException(status_code=400, detail="Generated chart data is empty")
+    if not reduction["returned_rows"]:
+        raise HTTPException(status_code=400, detail="Generated chart data is empty")
+    return chart_data_records, reduction, analyzed.report()
 
-        # Save to history
-        try:
-            history_path = os.path.join(
-                "storage/history", f"{sanitize_filename(data.filename)}.json"
-            )
-            entry = {
-                "question": data.question,
-                "pandas_code": chart_data["pandas_code"],
-                "recharts_config": chart_data["recharts_config"],
-                "explanation": chart_data["explanation"],
-                "insights": chart_data["insights"],
-            }
-            os.makedirs(os.path.dirname(history_path), exist_ok=True)
-            with open(history_path, "a") as f:
-                f.write(json.dumps(entry) + "\n")
-        except Exception as e:
-            print(f"History saving failed: {e}")
-
-        # Prepare final response with Recharts config
-        response_data = {
-            "analysis": {
-                "explanation": chart_data["explanation"],
-                "insights": chart_data["insights"],
-                "pandas_code": chart_data["pandas_code"],
-            },
-            "chart": {
-                "type": chart_data["recharts_config"]["type"],
-                "data": chart_data_records,
-                "config": chart_data["recharts_config"],
-            },
-            "metadata": {
-                "filename": os.path.basename(path),
-                "size_kb": round(os.path.getsize(path) / 1024, 2),
-                "shape": f"{len(df)} rows × {len(df.columns)} cols",
-            },
-            "sample_data": sample_rows,
-            "columns": columns,
+
+def execute_chart_sql(
+    path: str, sql: str, recharts_config: Dict
+) -> Tuple[RawJSON, Dict, Dict]:
+    """Run a generated SQL query on the embedded engine and return its encoded chart records.
+
+    The query scans the stored dataset directly; like pandas results, large
+    results are reduced to fit the chart payload budget.
+    """
+    started = time.perf_counter()
+    try:
+        result = sql_engine.run(path, sql)
+    except SQLError as e:
+        print(f"SQL execution error: {e}")
+        print(f"Generated SQL: {sql}")
+        raise HTTPException(status_code=400, detail=f"Error executing AI SQL: {str(e)}")
+
+    chart_data_records, reduction = chart_reducer.reduce(result, recharts_config)
+
+    if not reduction["returned_rows"]:
+        raise HTTPException(status_code=400, detail="Generated chart data is empty")
+    report = {
+        "engine": "sql",
+        "result_rows": len(result),
+        "query_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return chart_data_records, reduction, report
+
+
+def run_chart(path: str, chart_data: Dict, engine: str) -> Dict:
+    """Validate and execute one chart, capturing its failure instead of raising"""
+    started = time.perf_counter()
+    outcome = {
+        "chart_data": chart_data,
+        "records": None,
+        "reduction": None,
+        "code_analysis": None,
+    }
+    try:
+        check_chart(chart_data, engine)
+        execute = execute_chart_sql if engine == "sql" else execute_chart_code
+        outcome["records"], outcome["reduction"], outcome["code_analysis"] = execute(
+            path, chart_data[CODE_FIELDS[engine]], chart_data["recharts_config"]
+        )
+        outcome["error"] = None
+    except HTTPException as e:
+        outcome["error"] = e
+    outcome["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return outcome
+
+
+async def execute_charts(path: str, charts: List[Dict], engine: str):
+    """Run charts concurrently on engine, yielding (index, outcome) as each finishes"""
+
+    async def run(index: int, chart_data: Dict):
+        return index, await run_in_threadpool(run_chart, path, chart_data, engine)
+
+    tasks = [asyncio.ensure_future(run(i, chart)) for i, chart in enumerate(charts)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def chart_progress(index: int, outcome: Dict) -> Dict:
+    """Payload of the "data" event sent when one chart finishes"""
+    error = outcome["error"]
+    return {
+        "index": index,
+        "elapsed_ms": outcome["elapsed_ms"],
+        "chart_reduction": outcome["reduction"],
+        "code_analysis": outcome["code_analysis"],
+        "error": error and {"status_code": error.status_code, "detail": error.detail},
+    }
+
+
+def chart_analysis(chart_data: Dict) -> Dict:
+    """The explanation, insights and generated code shown with a chart"""
+    analysis = {
+        "explanation": chart_data.get("explanation"),
+        "insights": chart_data.get("insights"),
+        "pandas_code": chart_data.get("pandas_code"),
+    }
+    if "sql_query" in chart_data:
+        analysis["sql_query"] = chart_data["sql_query"]
+    return analysis
+
+
+def chart_entry(outcome: Dict) -> Dict:
+    """One panel of the multi-chart response"""
+    chart_data = (
+        outcome["chart_data"] if isinstance(outcome["chart_data"], dict) else {}
+    )
+    config = chart_data.get("recharts_config") or {}
+    entry = {
+        "analysis": chart_analysis(chart_data),
+        "chart": None,
+        "elapsed_ms": outcome["elapsed_ms"],
+        "error": None,
+    }
+    if outcome["error"] is not None:
+        entry["error"] = {
+            "status_code": outcome["error"].status_code,
+            "detail": outcome["error"].detail,
+        }
+    else:
+        entry["chart"] = {
+            "type": config.get("type"),
+            "data": outcome["records"],
+            "config": config,
+            "reduction": outcome["reduction"],
+            "code_analysis": outcome["code_analysis"],
         }
+    return entry
 
-        # Validate final response can be JSON serialized
-        try:
-            json.dumps(response_data)
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Response data cannot be JSON serialized: {str(e)}",
-            )
 
-        print("Successful response:", json.dumps(response_data, indent=2)[:500] + "...")
-        return response_data
+def save_history(filename: str, question: str, chart_data: Dict) -> None:
+    """Queue an answered question for the file's history"""
+    try:
+        history_store.append(sanitize_filename(filename), question, chart_data)
+    except Exception as e:
+        print(f"History saving failed: {e}")
+
+
+def warm_response_cache(filename: str, fingerprint: str, engine: str) -> None:
+    """Seed the response cache from the file's history the first time it is asked about"""
+    if not response_cache.needs_warming(fingerprint):
+        return
+    entries = []
+    try:
+        entries = history_store.page(
+            sanitize_filename(filename), limit=response_cache.max_entries
+        )
+    except Exception as e:
+        print(f"Response cache warm-up failed: {e}")
+    # Newest first: warm() keeps the first answer it sees for a question
+    response_cache.warm(fingerprint, entries, CODE_FIELDS[engine])
+
+
+async def answer_question(data: askRequest, stream_llm: bool = False):
+    """Answer an /ask request, yielding (event, payload) pairs as work finishes.
+
+    Progress events are "explanation" (text as the LLM writes it, only when
+    stream_llm is set), "code" per chart, "data" per chart as each one
+    finishes, and finally "result", whose payload is the encoded response
+    body. Every chart the LLM returns is executed concurrently; the first
+    one that succeeds fills the top-level "analysis" and "chart" fields and
+    all of them are listed under "charts". The charts' code is pandas or
+    SQL depending on the engine, whose answers are cached separately.
+    """
+    engine = resolve_engine(data.engine)
+    path = get_file_path(data.filename)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="File does not exist")
+
+    df = await run_in_threadpool(load_dataframe, path)
+    sample_rows = records_json(df.head(3))
+    columns = df.columns.tolist()
+
+    fingerprint = cache_key(dataset_fingerprint(df), engine)
+    schema_key = cache_key(schema_fingerprint(df), engine)
+    data_version = "{}:{}".format(*df_cache.file_signature(path))
+    await run_in_threadpool(warm_response_cache, data.filename, fingerprint, engine)
+    await run_in_threadpool(ensure_sidecar, path, df)
+
+    cached = response_cache.get(fingerprint, data.question)
+    if cached and cached["response"] and cached["data_version"] == data_version:
+        save_history(data.filename, data.question, cached["chart_data"])
+        yield "result", cached["response"]
+        return
+
+    # Reuse cached charts before asking the LLM: first those answered for
+    # this dataset, then validated plans from any file with the same schema
+    outcomes, source = None, "llm"
+    for cache, key in ((response_cache, fingerprint), (plan_cache, schema_key)):
+        entry = cached if cache is response_cache else cache.get(key, data.question)
+        if not entry:
+            continue
+        charts = entry["chart_data"].get("charts") or [entry["chart_data"]]
+        outcomes = [None] * len(charts)
+        async for index, outcome in execute_charts(path, charts, engine):
+            outcomes[index] = outcome
+            yield "data", chart_progress(index, outcome)
+        if any(outcome["error"] is None for outcome in outcomes):
+            source = "response_cache" if cache is response_cache else "plan_cache"
+            break
+        if not entry["fuzzy"]:
+            # A fuzzy match failing here says nothing about its own question
+            cache.delete(key, entry["question"])
+        outcomes = None
+
+    prompt_report = None
+    if outcomes is None:
+        prompt, prompt_report = await run_in_threadpool(
+            build_ask_prompt, path, df, data.question, engine
+        )
+        messages = [
+            {"role": "system", "content": ASK_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
+        llm_response = None
+        if stream_llm:
+            explanation = StreamedStringField("explanation")
+            content = []
+            try:
+                async for delta in llm_client.stream(messages):
+                    content.append(delta)
+                    text = explanation.feed(delta)
+                    if text:
+                        yield "explanation", {"text": text}
+                llm_response = parse_json_content("".join(content))
+            except (LLMError, ValueError) as e:
+                print(f"Streamed completion unusable, retrying without streaming: {e}")
+
+        if llm_response is None:
+            try:
+                llm_response = await llm_client.complete_json(messages)
+            except LLMError as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        charts = select_charts(llm_response)
+        for index, chart in enumerate(charts):
+            if isinstance(chart, dict):
+                yield "code", {
+                    "index": index,
+                    CODE_FIELDS[engine]: chart.get(CODE_FIELDS[engine]),
+                    "recharts_config": chart.get("recharts_config"),
+                }
+        # Every chart runs on its own sandbox worker; failures stay per chart
+        outcomes = [None] * len(charts)
+        async for index, outcome in execute_charts(path, charts, engine):
+            outcomes[index] = outcome
+            yield "data", chart_progress(index, outcome)
+
+    succeeded = [outcome for outcome in outcomes if outcome["error"] is None]
+    if not succeeded:
+        raise outcomes[0]["error"]
+    # The first chart that ran is the primary one shown by single-chart clients
+    primary = succeeded[0]
+    chart_data = dict(
+        primary["chart_data"], charts=[outcome["chart_data"] for outcome in outcomes]
+    )
+    save_history(data.filename, data.question, chart_data)
+    # Only code that ran successfully on real data becomes a reusable plan
+    plan_cache.put(
+        schema_key,
+        data.question,
+        dict(
+            primary["chart_data"],
+            charts=[outcome["chart_data"] for outcome in succeeded],
+        ),
+    )
+
+    # Prepare final response with Recharts config
+    response_data = {
+        "analysis": chart_analysis(chart_data),
+        "chart": {
+            "type": chart_data["recharts_config"]["type"],
+            "data": primary["records"],
+            "config": chart_data["recharts_config"],
+        },
+        "charts": [chart_entry(outcome) for outcome in outcomes],
+        "metadata": {
+            "filename": os.path.basename(path),
+            "size_kb": round(os.path.getsize(path) / 1024, 2),
+            "shape": f"{len(df)} rows × {len(df.columns)} cols",
+            "chart_reduction": primary["reduction"],
+            "code_analysis": primary["code_analysis"],
+            "prompt": prompt_report,
+            "source": source,
+            "engine": engine,
+        },
+        "sample_data": sample_rows,
+        "columns": columns,
+    }
+
+    # Encode once: the same bytes are cached and sent
+    try:
+        body = dumps(response_data)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Response data cannot be JSON serialized: {str(e)}",
+        )
+
+    response_cache.put(fingerprint, data.question, chart_data, body, data_version)
+
+    yield "result", body
+
+
+async def answer_body(data: askRequest) -> Optional[bytes]:
+    """The encoded /ask response, without the progress events"""
+    async for event, payload in answer_question(data):
+        if event == "result":
+            return payload
+    return None
+
+
+@router.post("/ask")
+async def post_question(data: askRequest):
+    try:
+        path = get_file_path(data.filename)
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="File does not exist")
+        key = request_key(
+            path, normalize_question(data.question), resolve_engine(data.engine)
+        )
+        body = await single_flight.run("ask", key, lambda: answer_body(data))
+        if body is not None:
+            return FastJSONResponse(body)
 
     except HTTPException:
         raise
@@ -655,37 +1434,222 @@ CRITICAL: Do not wrap the JSON in markdown code blocks (```). Do not include any
         )
 
 
+@router.post("/ask/stream")
+async def stream_question(data: askRequest):
+    """/ask over Server-Sent Events.
+
+    Emits "start" at once, then progress events as the answer is built
+    ("explanation", "code", "data" per chart), and ends with "result" carrying the
+    same body /ask returns, or "error" with the status code and detail
+    /ask would have raised.
+    """
+
+    async def events():
+        yield sse_event("start", {"filename": data.filename})
+        try:
+            async for event, payload in answer_question(data, stream_llm=True):
+                yield sse_event(event, payload)
+        except HTTPException as e:
+            yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            yield sse_event(
+                "error",
+                {
+                    "status_code": 500,
+                    "detail": f"Failed to handle question: {str(e)}",
+                },
+            )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def job_response(job: Job, deduplicated: bool) -> FastJSONResponse:
+    return FastJSONResponse(
+        {"job": job.snapshot(include_result=False), "deduplicated": deduplicated},
+        status_code=202,
+    )
+
+
+@router.post("/jobs/clean")
+async def submit_clean_job(data: CleaningRequest):
+    """Queue /data/clean as a background job and return its id at once"""
+    path = get_file_path(data.filename)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="File does not exist")
+
+    async def work(job: Job) -> Dict:
+        return await clean_dataset(data, job.background, job.report)
+
+    job, deduplicated = job_queue.submit(
+        "clean", request_key(path, data.operations), work
+    )
+    return job_response(job, deduplicated)
+
+
+@router.post("/jobs/ask")
+async def submit_ask_job(data: askRequest):
+    """Queue /ask as a background job and return its id at once"""
+    path = get_file_path(data.filename)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="File does not exist")
+    engine = resolve_engine(data.engine)
+
+    async def work(job: Job) -> RawJSON:
+        charts = finished = 0
+        job.report(0.0, "Preparing")
+        async for event, payload in answer_question(data):
+            if event == "code":
+                charts += 1
+                job.report(0.3, "Running charts")
+            elif event == "data":
+                finished += 1
+                job.report(
+                    0.3 + 0.7 * finished / max(charts, finished),
+                    f"{finished} chart(s) done",
+                )
+            elif event == "result":
+                return RawJSON(payload)
+
+    job, deduplicated = job_queue.submit(
+        "ask", request_key(path, normalize_question(data.question), engine), work
+    )
+    return job_response(job, deduplicated)
+
+
+def get_job(job_id: str) -> Job:
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def poll_job(job_id: str):
+    """Status, progress and (once succeeded) result of a job"""
+    return FastJSONResponse(get_job(job_id).snapshot())
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    """A job's status over Server-Sent Events.
+
+    Sends a "status" event at once and on every change, then "result" with
+    the job's result or "error" with its error, and ends. A cancelled job
+    ends after its last "status" event.
+    """
+    job = get_job(job_id)
+
+    async def events():
+        version = -1
+        while True:
+            if job.version != version:
+                version = job.version
+                yield sse_event("status", job.snapshot(include_result=False))
+            if not job.active:
+                break
+            await job.wait(version, timeout=15.0)
+            if job.version == version:
+                yield b": keep-alive\n\n"
+        if job.status == "succeeded":
+            yield sse_event("result", job.result)
+        elif job.status == "failed":
+            yield sse_event("error", job.error)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    if job_queue.cancel(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # Let the job's task observe the cancellation before reporting
+    await asyncio.sleep(0)
+    return FastJSONResponse(get_job(job_id).snapshot(include_result=False))
+
+
 @router.get("/files")
-async def get_files():
+async def get_files(
+    search: Optional[str] = None,
+    parent: Optional[str] = None,
+    cleaned: Optional[bool] = None,
+    sort: str = "filename",
+    order: str = "asc",
+    limit: int = 1000,
+    offset: int = 0,
+):
+    """List stored datasets from the catalog"""
     try:
-        if not os.path.exists(BASE_DIR):
-            return {"files": []}
-
-        files = Path(BASE_DIR).glob("*.csv")
-        file_list = []
-        for file in files:
-            file_list.append(
-                {"filename": file.name, "size_kb": round(file.stat().st_size / 1024, 2)}
-            )
-        return {"files": file_list}
+        entries, total = await run_in_threadpool(
+            catalog.page,
+            search,
+            parent,
+            cleaned,
+            sort,
+            order == "desc",
+            max(1, min(limit, FILES_PAGE_MAX)),
+            max(0, offset),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list files: {str(e)}")
 
+    file_list = []
+    for entry in entries:
+        entry["size_kb"] = round(entry.pop("size_bytes") / 1024, 2)
+        entry.pop("modified_ns")
+        file_list.append(entry)
+    return {"files": file_list, "total": total}
+
+
+@router.get("/metrics")
+async def get_metrics():
+    return {
+        "dataframe_cache": df_cache.stats(),
+        "llm": llm_client.stats(),
+        "response_cache": response_cache.stats(),
+        "plan_cache": plan_cache.stats(),
+        "sandbox": sandbox_pool.stats(),
+        "sql_engine": sql_engine.stats(),
+        "jobs": job_queue.stats(),
+        "single_flight": single_flight.stats(),
+        "history": history_store.stats(),
+        "catalog": catalog.stats(),
+        "blobs": blob_store.stats(),
+        "chart_payload": chart_reducer.stats(),
+        "prompt": prompt_builder.stats(),
+    }
+
 
 @router.get("/history/{filename}")
-async def get_history(filename: str):
+async def get_history(
+    filename: str,
+    limit: int = 50,
+    cursor: Optional[int] = None,
+    q: Optional[str] = None,
+):
+    """Newest-first page of a file's questions; pass next_cursor to get the next"""
     clean_filename = sanitize_filename(filename)
     if not clean_filename:
         raise HTTPException(status_code=400, detail="Invalid filename")
-
-    history_path = os.path.join("storage/history", f"{clean_filename}.json")
-
-    if not os.path.exists(history_path):
-        return {"history": []}
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
 
     try:
-        with open(history_path, "r") as f:
-            history = f.read()
-        return {"history": history}
+        history = await run_in_threadpool(
+            history_store.page, clean_filename, limit, cursor, q
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading history: {str(e)}")
+
+    next_cursor = history[-1]["id"] if len(history) == limit else None
+    return {"history": history, "next_cursor": next_cursor}
@@ -2,15 +2,24 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router
+from app.api.routes import router, shutdown, startup
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    yield
+    await shutdown()
 
 
 app = FastAPI(
     title="AI Business Intelligence API",
     version="1.0.0",
     description="Upload CSVs, clean data, and ask natural language questions to generate insights and charts.",
+    lifespan=lifespan,
 )
 
 # CORS settings - adjust origins as needed
@@ -0,0 +1,241 @@
+import itertools
+import json
+import os
+import shutil
+import uuid
+from typing import Dict, List, Optional, Sequence, Union
+
+import pandas as pd
+
+from app.services.dtype_optimizer import without_categories
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    feather = None
+
+
+CUBE_SUFFIX = ".cube.feather"
+# Aggregates a cube can answer, and the per-group statistics stored for them
+CUBE_AGGREGATES = {"sum", "mean", "count", "min", "max", "size"}
+_STATISTICS = ["sum", "count", "min", "max"]
+_ROWS = "|rows"
+_GROUPING = "|grouping"
+_MANIFEST_KEY = b"aggregate_cube"
+# Bumped when cubes built by older versions can no longer be trusted (2:
+# measures are aggregated at full int64/float64 width)
+CUBE_VERSION = 2
+
+
+def cube_path(csv_path: str) -> str:
+    """Return the path of the aggregate cube stored next to a CSV"""
+    return f"{csv_path}{CUBE_SUFFIX}"
+
+
+def has_fresh_cube(csv_path: str) -> bool:
+    """True when a cube exists and is not older than its CSV"""
+    path = cube_path(csv_path)
+    if feather is None or not os.path.exists(path):
+        return False
+    return os.stat(path).st_mtime_ns >= os.stat(csv_path).st_mtime_ns
+
+
+def remove_cube(csv_path: str) -> None:
+    path = cube_path(csv_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def share_cube(source_csv: str, dest_csv: str) -> bool:
+    """Reuse source_csv's fresh cube for dest_csv, which has the same bytes"""
+    if not has_fresh_cube(source_csv):
+        return False
+    # A temp name of its own, as cube builds for dest_csv may run meanwhile
+    tmp_path = f"{cube_path(dest_csv)}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(cube_path(source_csv), tmp_path)
+    except OSError:
+        shutil.copyfile(cube_path(source_csv), tmp_path)
+    os.replace(tmp_path, cube_path(dest_csv))
+    if os.path.exists(tmp_path):
+        # Renaming onto another link to the same file leaves both in place
+        os.remove(tmp_path)
+    return True
+
+
+def choose_layout(
+    profile: Dict,
+    max_dimension_values: int = 1000,
+    max_dimensions: int = 8,
+    max_measures: int = 20,
+    max_cells: int = 50_000,
+) -> Dict[str, List]:
+    """Pick the dimensions, measures and groupings of a cube from a profile.
+
+    Dimensions are categorical or text columns with a few distinct values;
+    measures are numeric columns that are not row keys. Every dimension is
+    a grouping on its own, and pairs of dimensions are added (fewest cells
+    first) while their combined cell count stays under max_cells.
+    """
+    rows = profile["rows"]
+    dimensions, measures = [], []
+    for col, stats in profile["columns"].items():
+        distinct = stats["distinct"]
+        if stats["inferred_type"] in ("categorical", "string", "boolean"):
+            if 1 < distinct <= max_dimension_values and distinct < rows:
+                dimensions.append((distinct, col))
+        elif stats["inferred_type"] == "numeric" and not (
+            distinct == rows
+            and stats["nulls"] == 0
+            and stats["dtype"].startswith("int")
+        ):
+            measures.append(col)
+
+    dimensions = sorted(dimensions)[:max_dimensions]
+    cardinality = {col: distinct for distinct, col in dimensions}
+    names = [col for col in profile["columns"] if col in cardinality]
+    groupings = [[col] for col in names]
+    cells = sum(cardinality.values())
+    for pair in sorted(
+        itertools.combinations(names, 2),
+        key=lambda pair: cardinality[pair[0]] * cardinality[pair[1]],
+    ):
+        size = cardinality[pair[0]] * cardinality[pair[1]]
+        if cells + size > max_cells:
+            break
+        groupings.append(list(pair))
+        cells += size
+    return {
+        "dimensions": names,
+        "measures": measures[:max_measures],
+        "groupings": groupings,
+    }
+
+
+def build_cube(
+    csv_path: str, df: pd.DataFrame, layout: Dict[str, List]
+) -> Optional[Dict]:
+    """Precompute the layout's group-by aggregates of df into a cube file.
+
+    Each grouping stores, per measure, the sum, non-null count, min and max
+    of every group, plus its row count; means are derived as sum/count.
+    Groups are computed exactly as ``df.groupby(keys, observed=True)``
+    would, so lookups match scanning the rows. Returns the cube's manifest,
+    or None when pyarrow is not installed or there is nothing to group by.
+    """
+    if feather is None or not layout["groupings"]:
+        return None
+
+    measures = layout["measures"]
+    parts = []
+    for keys in layout["groupings"]:
+        grouped = df.groupby(keys, observed=True)
+        part = grouped.size().rename(_ROWS).to_frame()
+        if measures:
+            stats = grouped[measures].agg(_STATISTICS)
+            stats.columns = [f"{measure}|{stat}" for measure, stat in stats.columns]
+            part = part.join(stats)
+        part = part.reset_index()
+        part[_GROUPING] = _grouping_id(keys)
+        parts.append(part)
+
+    table = pd.concat(parts, ignore_index=True)
+    for col in layout["dimensions"]:
+        # Keep each dimension's dtype where groupings that lack it left nulls
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            table[col] = table[col].astype(df[col].dtype)
+
+    manifest = dict(layout, groups=len(table), rows=len(df), version=CUBE_VERSION)
+    arrow_table = pa.Table.from_pandas(table, preserve_index=False)
+    metadata = dict(arrow_table.schema.metadata or {})
+    metadata[_MANIFEST_KEY] = json.dumps(manifest).encode("utf-8")
+
+    path = cube_path(csv_path)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        feather.write_feather(
+            arrow_table.replace_schema_metadata(metadata),
+            tmp_path,
+            compression="uncompressed",
+        )
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return manifest
+
+
+def read_manifest(csv_path: str) -> Optional[Dict]:
+    """The manifest of csv_path's cube, or None when it has no fresh cube.
+
+    Cubes written with another CUBE_VERSION count as missing.
+    """
+    if not has_fresh_cube(csv_path):
+        return None
+    try:
+        with pa.memory_map(cube_path(csv_path)) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+        manifest = json.loads(metadata[_MANIFEST_KEY])
+    except (OSError, KeyError, ValueError, pa.ArrowInvalid):
+        return None
+    return manifest if manifest.get("version") == CUBE_VERSION else None
+
+
+def _grouping_id(keys: Sequence[str]) -> str:
+    return json.dumps(sorted(keys))
+
+
+class AggregateCube:
+    """Group-by aggregates of a dataset, answered from its cube file.
+
+    ``aggregate(["region"], "sales", "sum")`` returns what
+    ``df.groupby("region", observed=True)["sales"].sum()`` would, without
+    reading the rows. Group keys come back with the dtype generated code
+    sees in the sandbox, where ``category`` columns are plain values.
+    """
+
+    def __init__(self, table: pd.DataFrame, manifest: Dict):
+        self.manifest = manifest
+        self._groupings = {
+            key: part.drop(columns=_GROUPING)
+            for key, part in table.groupby(_GROUPING, sort=False)
+        }
+
+    @classmethod
+    def load(cls, path: str) -> "AggregateCube":
+        table = feather.read_table(path, memory_map=True)
+        manifest = json.loads(table.schema.metadata[_MANIFEST_KEY])
+        return cls(without_categories(table.to_pandas()), manifest)
+
+    def aggregate(
+        self,
+        keys: Sequence[str],
+        columns: Union[str, List[str], None],
+        how: str,
+    ) -> Union[pd.Series, pd.DataFrame]:
+        """The ``how`` aggregate of columns grouped by keys.
+
+        A single column name gives a Series, a list a DataFrame; ``size``
+        takes columns=None. Raises KeyError for a grouping or measure the
+        cube does not hold.
+        """
+        part = self._groupings[_grouping_id(keys)].set_index(list(keys))
+        names = [columns] if isinstance(columns, str) else list(columns or [])
+        if how == "size":
+            values = {name: part[_ROWS] for name in names} or {None: part[_ROWS]}
+        elif how == "mean":
+            values = {
+                name: part[f"{name}|sum"] / part[f"{name}|count"] for name in names
+            }
+        else:
+            values = {name: part[f"{name}|{how}"] for name in names}
+
+        if isinstance(columns, list):
+            result = pd.DataFrame(values)
+        else:
+            ((name, result),) = values.items()
+            result = result.rename(name)
+        return result.sort_index()
@@ -0,0 +1,93 @@
+import os
+import shutil
+import uuid
+from typing import Dict
+
+
+class BlobStore:
+    """Content-addressed storage for dataset bytes.
+
+    Each distinct content is stored once as ``<root>/<hash[:2]>/<hash>``.
+    Named datasets are hard links to their blob, so every path-based
+    reader keeps working while identical uploads share one copy on disk.
+    The link count is the reference count: a blob whose only remaining
+    link is its own entry here is garbage. On filesystems without hard
+    links, names fall back to private copies.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.deduplicated = 0
+        self.collected = 0
+
+    def blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash)
+
+    def has(self, content_hash: str) -> bool:
+        return os.path.exists(self.blob_path(content_hash))
+
+    def refcount(self, content_hash: str) -> int:
+        """Number of dataset names that point at the blob"""
+        try:
+            return os.stat(self.blob_path(content_hash)).st_nlink - 1
+        except FileNotFoundError:
+            return 0
+
+    def adopt(self, path: str, content_hash: str) -> bool:
+        """Make the file at path share storage with the blob for its hash.
+
+        If the blob is new, path becomes it (no copy). If the content is
+        already stored, path is replaced by a link to the existing blob and
+        its own bytes are dropped. Returns True when the content was a
+        duplicate.
+        """
+        blob = self.blob_path(content_hash)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(path, blob)
+            return False
+        except FileExistsError:
+            pass
+        except OSError:
+            # No hard links here: keep path as a private copy
+            return False
+
+        if not os.path.samefile(path, blob):
+            self.link(content_hash, path)
+            self.deduplicated += 1
+        return True
+
+    def link(self, content_hash: str, dest: str) -> None:
+        """Atomically point dest at the stored blob"""
+        tmp_path = f"{dest}.{uuid.uuid4().hex}.link"
+        try:
+            os.link(self.blob_path(content_hash), tmp_path)
+        except OSError:
+            shutil.copyfile(self.blob_path(content_hash), tmp_path)
+        os.replace(tmp_path, dest)
+
+    def release(self, content_hash: str) -> bool:
+        """Delete the blob if no dataset name refers to it any more"""
+        if content_hash and self.has(content_hash) and self.refcount(content_hash) == 0:
+            os.remove(self.blob_path(content_hash))
+            self.collected += 1
+            return True
+        return False
+
+    def collect_garbage(self) -> int:
+        """Delete every unreferenced blob; returns how many were removed"""
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        for prefix in os.scandir(self.root):
+            if not prefix.is_dir():
+                continue
+            for blob in os.scandir(prefix.path):
+                if blob.is_file() and blob.stat().st_nlink <= 1:
+                    os.remove(blob.path)
+                    removed += 1
+        self.collected += removed
+        return removed
+
+    def stats(self) -> Dict:
+        return {"deduplicated": self.deduplicated, "collected": self.collected}
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services.db import connect, escape_like
+
+SORT_COLUMNS = {
+    "filename": "filename",
+    "size": "size_bytes",
+    "rows": "rows",
+    "created_at": "created_at",
+}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DatasetCatalog:
+    """Persistent metadata for every stored dataset.
+
+    Entries are written when a file is uploaded or cleaned and hold its
+    schema, row count, byte size, content hash, creation time, the load
+    schema its frames are optimized to and, for ``cleaned_*`` outputs, the
+    file it was cleaned from. Listing reads the
+    indexed table instead of walking and stat()-ing the storage directory.
+    ``reconcile`` brings the catalog back in line with the directory after
+    files were changed behind the API's back.
+    """
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._conn = connect(db_path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS datasets (
+                filename TEXT PRIMARY KEY,
+                size_bytes INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                columns TEXT NOT NULL,
+                dtypes TEXT NOT NULL,
+                content_hash TEXT,
+                parent TEXT,
+                created_at REAL NOT NULL,
+                modified_ns INTEGER NOT NULL,
+                load_schema TEXT
+            )
+            """)
+        existing = {
+            row["name"] for row in self._conn.execute("PRAGMA table_info(datasets)")
+        }
+        if "load_schema" not in existing:
+            self._conn.execute("ALTER TABLE datasets ADD COLUMN load_schema TEXT")
+        for column in ("size_bytes", "rows", "created_at", "parent", "content_hash"):
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS datasets_{column} ON datasets ({column})"
+            )
+
+    def register(
+        self,
+        path: str,
+        rows: int,
+        dtypes: Dict[str, str],
+        content_hash: Optional[str] = None,
+        parent: Optional[str] = None,
+        load_schema: Optional[Dict[str, str]] = None,
+    ) -> Dict:
+        """Record (or refresh) the metadata of the file stored at path.
+
+        Re-registering a file keeps the ``created_at`` of its first entry.
+        """
+        stat = os.stat(path)
+        entry = {
+            "filename": os.path.basename(path),
+            "size_bytes": stat.st_size,
+            "rows": int(rows),
+            "columns": list(dtypes),
+            "dtypes": {str(col): str(dtype) for col, dtype in dtypes.items()},
+            "content_hash": content_hash,
+            "parent": parent,
+            "created_at": time.time(),
+            "modified_ns": stat.st_mtime_ns,
+            "load_schema": load_schema,
+        }
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO datasets
+                    (filename, size_bytes, rows, columns, dtypes, content_hash,
+                     parent, created_at, modified_ns, load_schema)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (filename) DO UPDATE SET
+                    size_bytes = excluded.size_bytes,
+                    rows = excluded.rows,
+                    columns = excluded.columns,
+                    dtypes = excluded.dtypes,
+                    content_hash = excluded.content_hash,
+                    parent = excluded.parent,
+                    modified_ns = excluded.modified_ns,
+                    load_schema = excluded.load_schema
+                """,
+                (
+                    entry["filename"],
+                    entry["size_bytes"],
+                    entry["rows"],
+                    json.dumps(entry["columns"]),
+                    json.dumps(entry["dtypes"]),
+                    entry["content_hash"],
+                    entry["parent"],
+                    entry["created_at"],
+                    entry["modified_ns"],
+                    _dumps_optional(load_schema),
+                ),
+            )
+            entry["created_at"] = self._conn.execute(
+                "SELECT created_at FROM datasets WHERE filename = ?",
+                (entry["filename"],),
+            ).fetchone()[0]
+        return entry
+
+    def set_content_hash(self, filename: str, content_hash: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE datasets SET content_hash = ? WHERE filename = ?",
+                (content_hash, filename),
+            )
+
+    def set_load_schema(self, filename: str, load_schema: Dict[str, str]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE datasets SET load_schema = ? WHERE filename = ?",
+                (json.dumps(load_schema), filename),
+            )
+
+    def find_by_hash(
+        self, content_hash: str, prefer_not: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Any dataset with this content, preferring one not named prefer_not"""
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT * FROM datasets WHERE content_hash = ?
+                ORDER BY filename = ? LIMIT 1
+                """,
+                (content_hash, prefer_not),
+            ).fetchone()
+        return _row_to_entry(row) if row else None
+
+    def remove(self, filename: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM datasets WHERE filename = ?", (filename,))
+
+    def get(self, filename: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM datasets WHERE filename = ?", (filename,)
+            ).fetchone()
+        return _row_to_entry(row) if row else None
+
+    def page(
+        self,
+        search: Optional[str] = None,
+        parent: Optional[str] = None,
+        cleaned: Optional[bool] = None,
+        sort: str = "filename",
+        descending: bool = False,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> Tuple[List[Dict], int]:
+        """Return one page of entries and the total number that match"""
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unsupported sort key: {sort}")
+
+        conditions, params = [], []
+        if search:
+            conditions.append("filename LIKE ? ESCAPE '\\'")
+            params.append(f"%{escape_like(search)}%")
+        if parent is not None:
+            conditions.append("parent = ?")
+            params.append(parent)
+        if cleaned is not None:
+            conditions.append("parent IS NOT NULL" if cleaned else "parent IS NULL")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = f"{SORT_COLUMNS[sort]} {'DESC' if descending else 'ASC'}, filename"
+
+        with self._lock:
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM datasets {where}", params
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM datasets {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        return [_row_to_entry(row) for row in rows], total
+
+    def reconcile(
+        self,
+        directory: str,
+        describe: Callable[[str], Tuple[int, Dict[str, str], Dict[str, str]]],
+        parent_of: Callable[[str], Optional[str]] = lambda name: None,
+    ) -> Dict:
+        """Sync the catalog with the CSV files currently in directory.
+
+        Entries whose file is gone are dropped; files that are new or whose
+        size/mtime changed are described (rows, dtypes, load schema) and
+        hashed again.
+        """
+        on_disk = {}
+        if os.path.isdir(directory):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(".csv"):
+                        stat = entry.stat()
+                        on_disk[entry.name] = (
+                            entry.path,
+                            stat.st_size,
+                            stat.st_mtime_ns,
+                        )
+
+        with self._lock:
+            known = {
+                row["filename"]: (row["size_bytes"], row["modified_ns"])
+                for row in self._conn.execute(
+                    "SELECT filename, size_bytes, modified_ns FROM datasets"
+                )
+            }
+
+        removed = [name for name in known if name not in on_disk]
+        for name in removed:
+            self.remove(name)
+
+        refreshed = 0
+        for name, (path, size, modified_ns) in on_disk.items():
+            if known.get(name) == (size, modified_ns):
+                continue
+            try:
+                rows, dtypes, load_schema = describe(path)
+                self.register(
+                    path,
+                    rows,
+                    dtypes,
+                    file_sha256(path),
+                    parent_of(name),
+                    load_schema=load_schema,
+                )
+                refreshed += 1
+            except Exception as e:
+                print(f"Catalog refresh failed for {path}: {e}")
+        return {"removed": len(removed), "refreshed": refreshed}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM datasets").fetchone()[0]
+        return {"datasets": count}
+
+
+def _row_to_entry(row) -> Dict:
+    entry = dict(row)
+    entry["columns"] = json.loads(entry["columns"])
+    entry["dtypes"] = json.loads(entry["dtypes"])
+    if entry.get("load_schema") is not None:
+        entry["load_schema"] = json.loads(entry["load_schema"])
+    return entry
+
+
+def _dumps_optional(value: Optional[Dict]) -> Optional[str]:
+    return None if value is None else json.dumps(value)
@@ -0,0 +1,225 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.json_encoding import RawJSON, records_json
+
+# Chart types whose x axis is a continuous series
+SERIES_CHARTS = {"LineChart", "AreaChart", "ScatterChart", "ComposedChart"}
+# Chart types that show one mark per category
+CATEGORY_CHARTS = {"BarChart", "PieChart", "RadarChart", "FunnelChart"}
+
+OTHER_LABEL = "Other"
+
+
+def largest_triangle_three_buckets(
+    x: np.ndarray, y: np.ndarray, threshold: int
+) -> np.ndarray:
+    """Indices of ``threshold`` points that preserve the visual shape of y(x).
+
+    Implements Largest-Triangle-Three-Buckets (Steinarsson, 2013): the first
+    and last points are kept and every bucket in between contributes the
+    point forming the largest triangle with the previously chosen point and
+    the average of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(area)) if end > start else start
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+class ChartPayloadReducer:
+    """Caps the size of chart data sent to the Recharts frontend.
+
+    Reduction depends on ``recharts_config.type``: series charts are
+    downsampled with LTTB to ``max_points``, category charts keep the
+    ``max_categories - 1`` largest categories and fold the rest into an
+    "Other" row, and anything else is thinned by a regular stride. Floats
+    are rounded to ``significant_digits``. If the JSON payload is still over
+    ``max_bytes``, the point/category budget is shrunk until it fits.
+    """
+
+    def __init__(
+        self,
+        max_points: int = 2000,
+        max_categories: int = 25,
+        max_bytes: int = 1_000_000,
+        significant_digits: int = 6,
+    ):
+        self.max_points = max_points
+        self.max_categories = max_categories
+        self.max_bytes = max_bytes
+        self.significant_digits = significant_digits
+        self.reduced = 0
+
+    def reduce(self, result, config: Dict) -> Tuple[RawJSON, Dict]:
+        """Encode a code result as chart records and report what changed"""
+        frame = result.reset_index() if isinstance(result, pd.Series) else result
+        chart_type = config.get("type") if isinstance(config, dict) else None
+        x_key, y_keys = _chart_keys(frame, config if isinstance(config, dict) else {})
+
+        frame, decimals = self._round(frame)
+        points, categories = self.max_points, self.max_categories
+        while True:
+            reduced, method = self._reduce_rows(
+                frame, chart_type, x_key, y_keys, points, categories
+            )
+            records = records_json(reduced)
+            size = len(records)
+            if size <= self.max_bytes or len(reduced) <= 3:
+                break
+            # Shrink the budget in proportion to the overshoot and retry
+            scale = self.max_bytes / size * 0.9
+            points = max(3, min(points, len(reduced)) * scale)
+            categories = max(3, min(categories, len(reduced)) * scale)
+            points, categories = int(points), int(categories)
+
+        report = {
+            "original_rows": len(frame),
+            "returned_rows": len(reduced),
+            "method": method,
+            "rounded_to_significant_digits": (
+                self.significant_digits if decimals else None
+            ),
+            "bytes": size,
+        }
+        if method:
+            self.reduced += 1
+        return records, report
+
+    def _reduce_rows(
+        self,
+        frame: pd.DataFrame,
+        chart_type: Optional[str],
+        x_key: Optional[str],
+        y_keys: List[str],
+        points: int,
+        categories: int,
+    ) -> Tuple[pd.DataFrame, Optional[str]]:
+        if chart_type in CATEGORY_CHARTS and y_keys and len(frame) > categories:
+            return _top_n_with_other(frame, x_key, y_keys, categories), "top_n_other"
+        if len(frame) <= points:
+            return frame, None
+        if chart_type in SERIES_CHARTS and y_keys:
+            return _lttb_frame(frame, x_key, y_keys[0], points), "lttb"
+        step = math.ceil(len(frame) / points)
+        return frame.iloc[::step], "stride"
+
+    def _round(self, frame: pd.DataFrame) -> Tuple[pd.DataFrame, bool]:
+        rounded = {}
+        for col in frame.columns:
+            if not pd.api.types.is_float_dtype(frame[col]):
+                continue
+            values = frame[col].to_numpy()
+            finite = np.abs(values[np.isfinite(values)])
+            if len(finite) == 0 or finite.max() == 0:
+                continue
+            magnitude = int(math.floor(math.log10(finite.max())))
+            decimals = max(0, self.significant_digits - 1 - magnitude)
+            rounded[col] = frame[col].round(decimals)
+        if not rounded:
+            return frame, False
+        frame = frame.copy(deep=False)
+        for col, values in rounded.items():
+            frame[col] = values
+        return frame, True
+
+    def stats(self) -> Dict:
+        return {
+            "reduced": self.reduced,
+            "max_points": self.max_points,
+            "max_categories": self.max_categories,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def _chart_keys(frame: pd.DataFrame, config: Dict) -> Tuple[Optional[str], List[str]]:
+    """The x/category column and the plotted value columns of a chart"""
+    components = config.get("components") or {}
+    x_candidates = [
+        config.get("xAxisKey"),
+        config.get("nameKey"),
+        (components.get("XAxis") or {}).get("dataKey"),
+    ]
+    y_candidates = [config.get("dataKey"), config.get("yAxisKey")]
+    for name in ("Line", "Bar", "Area", "Pie", "Scatter", "Radar"):
+        component = components.get(name)
+        for item in component if isinstance(component, list) else [component]:
+            if isinstance(item, dict):
+                y_candidates.append(item.get("dataKey"))
+                x_candidates.append(item.get("nameKey"))
+
+    columns = [str(col) for col in frame.columns]
+    numeric = [
+        str(col) for col in frame.columns if pd.api.types.is_numeric_dtype(frame[col])
+    ]
+    x_key = next((key for key in x_candidates if key in columns), None)
+    y_keys = []
+    for key in y_candidates:
+        if key in numeric and key != x_key and key not in y_keys:
+            y_keys.append(key)
+    if not y_keys:
+        y_keys = [col for col in numeric if col != x_key]
+    if x_key is None:
+        x_key = next((col for col in columns if col not in y_keys), None)
+    return x_key, y_keys
+
+
+def _column(frame: pd.DataFrame, key: str) -> pd.Series:
+    return frame[next(col for col in frame.columns if str(col) == key)]
+
+
+def _lttb_frame(
+    frame: pd.DataFrame, x_key: Optional[str], y_key: str, points: int
+) -> pd.DataFrame:
+    x = _column(frame, x_key) if x_key is not None else None
+    if x is not None and pd.api.types.is_datetime64_any_dtype(x):
+        x_values = x.to_numpy().astype("datetime64[ns]").astype(np.int64).astype(float)
+    elif x is not None and pd.api.types.is_numeric_dtype(x):
+        x_values = x.to_numpy(dtype=float)
+    else:
+        x_values = np.arange(len(frame), dtype=float)
+    y_values = np.nan_to_num(_column(frame, y_key).to_numpy(dtype=float))
+    return frame.iloc[largest_triangle_three_buckets(x_values, y_values, points)]
+
+
+def _top_n_with_other(
+    frame: pd.DataFrame, x_key: Optional[str], y_keys: List[str], categories: int
+) -> pd.DataFrame:
+    # Positions, not labels: results can repeat index labels
+    magnitude = np.abs(_column(frame, y_keys[0]).to_numpy(dtype=float))
+    order = np.argsort(-magnitude, kind="stable")
+    top = frame.iloc[np.sort(order[: categories - 1])]
+    rest = frame.iloc[order[categories - 1 :]]
+
+    other = {}
+    for col in frame.columns:
+        if str(col) in y_keys:
+            other[col] = rest[col].sum()
+        elif x_key is not None and str(col) == x_key:
+            other[col] = OTHER_LABEL
+        else:
+            other[col] = None
+    # Keep the original category order for the rows that remain
+    return pd.concat([top, pd.DataFrame([other])], ignore_index=True)
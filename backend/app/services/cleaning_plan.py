@@ -0,0 +1,242 @@
+from enum import Enum
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class CleaningStrategy(Enum):
+    DROP = "drop"
+    FILL_MEAN = "fill_mean"
+    FILL_MEDIAN = "fill_median"
+    FILL_MODE = "fill_mode"
+    FILL_FORWARD = "fill_forward"
+    FILL_BACKWARD = "fill_backward"
+    FILL_ZERO = "fill_zero"
+
+
+# Strategy -> fill method understood by the cleaning executors
+FILL_METHODS = {
+    CleaningStrategy.FILL_MEAN: "mean",
+    CleaningStrategy.FILL_MEDIAN: "median",
+    CleaningStrategy.FILL_MODE: "mode",
+    CleaningStrategy.FILL_FORWARD: "ffill",
+    CleaningStrategy.FILL_BACKWARD: "bfill",
+    CleaningStrategy.FILL_ZERO: "zero",
+}
+
+# Fills that propagate values along the surviving rows
+ORDERED_FILLS = {"ffill", "bfill"}
+NUMERIC_DTYPES = ["int64", "float64"]
+
+
+class CleaningPlan:
+    """Lazy, fused execution of a sequence of cleaning operations.
+
+    Operations are recorded against a shallow copy of the frame instead of
+    being applied one by one:
+
+    - dropping rows only narrows a boolean keep-mask, so any number of
+      ``drop_missing`` calls cost one row selection at the end;
+    - scalar fills (mean/median/mode/zero) are resolved to a value per
+      column with one aggregate per operation and queued, then applied
+      together with a single ``fillna(dict)``;
+    - renames only relabel the columns and the queued state.
+
+    Forward/backward fills and duplicate removal depend on which rows
+    survive, so they first apply the pending row selection. Null and row
+    counts for the cleaning log are computed from cached per-column null
+    masks and stay exact.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        # Shallow copy: with copy-on-write only modified columns are materialized
+        self._frame = df.copy(deep=False)
+        self._keep: Optional[np.ndarray] = None
+        self._pending: Dict[Hashable, object] = {}
+        self._null_masks: Dict[Hashable, np.ndarray] = {}
+
+    @property
+    def columns(self) -> List[Hashable]:
+        return self._frame.columns.tolist()
+
+    @property
+    def row_count(self) -> int:
+        if self._keep is None:
+            return len(self._frame)
+        return int(np.count_nonzero(self._keep))
+
+    def count_nulls(self, columns: List[Hashable]) -> int:
+        """Nulls left in columns over the rows still alive"""
+        self._check_columns(columns)
+        total = 0
+        for col in columns:
+            if col in self._pending:
+                continue
+            mask = self._null_mask(col)
+            if self._keep is not None:
+                mask = mask & self._keep
+            total += int(np.count_nonzero(mask))
+        return total
+
+    def drop_missing(self, columns: List[Hashable]) -> None:
+        """Drop rows with a null in any of columns"""
+        self._check_columns(columns)
+        masks = [self._null_mask(col) for col in columns if col not in self._pending]
+        if not masks:
+            return
+        alive = ~np.logical_or.reduce(masks)
+        self._keep = alive if self._keep is None else self._keep & alive
+
+    def fill_missing(self, columns: List[Hashable], method: str) -> None:
+        """Fill nulls in columns with ``method``.
+
+        ``method`` is one of mean, median, mode, zero, ffill or bfill. Mean
+        and median only apply to numeric (non-boolean) columns, as before.
+        """
+        self._check_columns(columns)
+        if method in ORDERED_FILLS:
+            self._fill_ordered(columns, method)
+            return
+
+        targets = [col for col in columns if self.count_nulls([col]) > 0]
+        if method in ("mean", "median"):
+            targets = [col for col in targets if is_measure(self._frame[col])]
+        if not targets:
+            return
+
+        if method == "zero":
+            values = {col: 0 for col in targets}
+        else:
+            values = self._aggregate(targets, method)
+
+        for col, value in values.items():
+            if not pd.isna(value):
+                self._pending[col] = value
+
+    def drop_duplicates(
+        self, subset: Optional[List[Hashable]] = None, keep: str = "first"
+    ) -> None:
+        self._compact()
+        self._flush()
+        duplicated = self._frame.duplicated(subset=subset, keep=keep).to_numpy()
+        if duplicated.any():
+            self._keep = ~duplicated
+
+    def rename(self, new_columns: List[Hashable]) -> None:
+        """Relabel the columns positionally"""
+        mapping = dict(zip(self._frame.columns, new_columns))
+        self._frame = self._frame.set_axis(new_columns, axis=1)
+        self._pending = {mapping[col]: value for col, value in self._pending.items()}
+        if len(set(new_columns)) == len(new_columns):
+            self._null_masks = {
+                mapping[col]: mask for col, mask in self._null_masks.items()
+            }
+        else:
+            self._null_masks = {}
+
+    def materialize(self) -> pd.DataFrame:
+        """Apply everything still pending and return the cleaned frame"""
+        self._flush()
+        self._compact()
+        return self._frame
+
+    def _check_columns(self, columns: List[Hashable]) -> None:
+        missing = [col for col in columns if col not in self._frame.columns]
+        if missing:
+            raise KeyError(f"{missing} not in index")
+
+    def _null_mask(self, col: Hashable) -> np.ndarray:
+        mask = self._null_masks.get(col)
+        if mask is None:
+            mask = self._frame[col].isna().to_numpy()
+            self._null_masks[col] = mask
+        return mask
+
+    def _aggregate(
+        self, columns: List[Hashable], method: str
+    ) -> Dict[Hashable, object]:
+        """Compute the fill value of every column in one pass over live rows"""
+        if self._keep is None:
+            view = self._frame[columns]
+        else:
+            view = self._frame.loc[self._keep, columns]
+
+        if method == "mean":
+            return view.mean().to_dict()
+        if method == "median":
+            return view.median().to_dict()
+
+        values = {}
+        for col in columns:
+            mode_val = view[col].mode()
+            values[col] = mode_val.iloc[0] if not mode_val.empty else "Unknown"
+        return values
+
+    def _fill_ordered(self, columns: List[Hashable], method: str) -> None:
+        # Propagation runs over surviving rows only, so drop the rest first
+        self._compact()
+        self._flush(columns)
+        targets = [col for col in columns if self.count_nulls([col]) > 0]
+        if not targets:
+            return
+        filled = getattr(self._frame[targets], method)()
+        frame = self._frame.copy(deep=False)
+        for col in targets:
+            frame[col] = filled[col]
+            self._null_masks.pop(col, None)
+        self._frame = frame
+
+    def _flush(self, columns: Optional[List[Hashable]] = None) -> None:
+        """Apply queued scalar fills (only those touching columns, if given)"""
+        if columns is None:
+            pending = dict(self._pending)
+        else:
+            pending = {
+                col: value for col, value in self._pending.items() if col in columns
+            }
+        if not pending:
+            return
+        frame = self._frame.copy(deep=False)
+        for col, value in pending.items():
+            series = frame[col]
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                continue
+            # Keep text categories all text, as the CSV will read them back
+            if pd.api.types.is_string_dtype(series.cat.categories.dtype):
+                value = pending[col] = str(value)
+            if value not in series.cat.categories:
+                # A fill value must be a category before it can be used
+                frame[col] = series.cat.add_categories([value])
+        self._frame = frame.fillna(pending)
+        for col in pending:
+            del self._pending[col]
+            self._null_masks.pop(col, None)
+
+    def _compact(self) -> None:
+        """Apply the pending row selection"""
+        if self._keep is None:
+            return
+        if not self._keep.all():
+            self._frame = self._frame[self._keep]
+            self._null_masks = {
+                col: mask[self._keep] for col, mask in self._null_masks.items()
+            }
+        self._keep = None
+
+
+def is_measure(series: pd.Series) -> bool:
+    """Numeric columns mean/median fills apply to, including downcast ones"""
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(
+        series
+    )
+
+
+def standardized_names(columns: List[Hashable]) -> List[str]:
+    """Lowercase names, replace spaces/dashes with underscores, drop the rest"""
+    new_columns = []
+    for col in columns:
+        new_col = col.lower().replace(" ", "_").replace("-", "_")
+        new_col = "".join(c for c in new_col if c.isalnum() or c == "_")
+        new_columns.append(new_col)
+    return new_columns
@@ -0,0 +1,935 @@
+import ast
+import re
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+
+from app.services.aggregate_cube import CUBE_AGGREGATES
+
+# Modules generated code may import; everything else is rejected
+ALLOWED_IMPORTS = {
+    "calendar",
+    "collections",
+    "datetime",
+    "itertools",
+    "math",
+    "numpy",
+    "pandas",
+    "re",
+    "statistics",
+}
+FORBIDDEN_NAMES = {
+    "__import__",
+    "breakpoint",
+    "compile",
+    "delattr",
+    "eval",
+    "exec",
+    "exit",
+    "getattr",
+    "globals",
+    "help",
+    "input",
+    "locals",
+    "open",
+    "quit",
+    "setattr",
+    "vars",
+}
+# DataFrame/Series writers and NumPy file I/O; pandas readers are matched
+# by their read_ prefix
+FORBIDDEN_ATTRIBUTES = {
+    "DataSource",
+    "fromfile",
+    "fromregex",
+    "genfromtxt",
+    "load",
+    "loadtxt",
+    "memmap",
+    "open_memmap",
+    "save",
+    "savetxt",
+    "savez",
+    "savez_compressed",
+    "tofile",
+    "to_clipboard",
+    "to_csv",
+    "to_excel",
+    "to_feather",
+    "to_hdf",
+    "to_html",
+    "to_json",
+    "to_latex",
+    "to_markdown",
+    "to_orc",
+    "to_parquet",
+    "to_pickle",
+    "to_sql",
+    "to_stata",
+    "to_xml",
+}
+
+# Frame methods whose result keeps the rows/columns structure, so pruning
+# stays valid as long as the result is itself narrowed to named columns
+FRAME_METHODS = {
+    "assign",
+    "astype",
+    "copy",
+    "fillna",
+    "head",
+    "nlargest",
+    "nsmallest",
+    "query",
+    "rename",
+    "reset_index",
+    "sample",
+    "set_index",
+    "sort_index",
+    "sort_values",
+    "tail",
+}
+# These look at every column unless told which ones to consider
+SUBSET_METHODS = {"dropna", "drop_duplicates"}
+MASK_METHODS = {
+    "between",
+    "contains",
+    "duplicated",
+    "endswith",
+    "eq",
+    "ge",
+    "gt",
+    "isin",
+    "isna",
+    "isnull",
+    "le",
+    "lt",
+    "ne",
+    "notna",
+    "notnull",
+    "startswith",
+}
+GROUPED_SAFE = {"size", "ngroups", "groups", "ngroup"}
+# Methods that change the frame, Series, Index or array they are called on
+# even without inplace=True
+MUTATING_METHODS = {
+    "fill",
+    "insert",
+    "itemset",
+    "partition",
+    "pop",
+    "put",
+    "resize",
+    "setfield",
+    "setflags",
+    "sort",
+    "update",
+}
+# Methods known to leave the object they are called on unchanged (unless
+# passed inplace=True); any other method called on a frame counts as a
+# change. Accessor methods (``.str.upper()``) return new objects too.
+PURE_METHODS = {
+    name
+    for source in (
+        pd.DataFrame,
+        pd.Series,
+        pd.Index,
+        pd.Series.str,
+        pd.Series.dt,
+        pd.Series.cat,
+    )
+    for name in dir(source)
+    if not name.startswith("_")
+} - MUTATING_METHODS
+WINDOW_METHODS = {"groupby", "rolling", "expanding", "ewm", "resample"}
+
+# Rough per-row costs (seconds) of constructs that run Python code per row
+ROW_COSTS = {
+    "iterrows": 50e-6,
+    "itertuples": 5e-6,
+    "rowwise_apply": 20e-6,
+    "elementwise_apply": 1e-6,
+}
+LOOP_NODE_COST = 0.1e-6
+# Attributes that list a frame's columns, so loops over them are short
+COLUMN_ATTRIBUTES = {"columns", "dtypes", "keys"}
+# Per row, per vectorized operation: columnar kernels process a row in well
+# under a nanosecond, so only per-row Python work can exceed a time limit
+VECTOR_NODE_COST = 0.2e-9
+
+_IDENTIFIER = re.compile(r"`([^`]+)`|[A-Za-z_]\w*")
+_VECTOR_OPS = (
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.Pow,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+    ast.Eq,
+    ast.NotEq,
+    ast.USub,
+    ast.UAdd,
+)
+
+_NESTED_SCOPES = (
+    ast.Lambda,
+    ast.ListComp,
+    ast.SetComp,
+    ast.DictComp,
+    ast.GeneratorExp,
+    ast.FunctionDef,
+    ast.AsyncFunctionDef,
+    ast.ClassDef,
+)
+
+
+class CodeRejected(ValueError):
+    """Raised when generated code is disallowed or estimated to be too slow"""
+
+
+class AnalyzedCode:
+    """Generated code after static checks and rewriting.
+
+    ``code`` is what should run; ``columns`` lists the only dataset
+    columns it can observe, or is None when it may depend on all of them.
+    """
+
+    def __init__(
+        self,
+        code: str,
+        columns: Optional[List[str]],
+        rewrites: List[str],
+        estimated_seconds: float,
+        cube_lookups: int = 0,
+    ):
+        self.code = code
+        self.columns = columns
+        self.rewrites = rewrites
+        self.estimated_seconds = estimated_seconds
+        self.cube_lookups = cube_lookups
+
+    def report(self) -> Dict:
+        return {
+            "rewrites": self.rewrites,
+            "columns": self.columns,
+            "estimated_seconds": round(self.estimated_seconds, 4),
+            "cube_lookups": self.cube_lookups,
+        }
+
+
+def analyze_code(
+    code: str,
+    columns: List[str],
+    rows: int,
+    max_seconds: Optional[float] = None,
+    cube: Optional[Dict] = None,
+) -> AnalyzedCode:
+    """Check, rewrite and cost generated pandas code that reads ``df``.
+
+    With the manifest of the dataset's aggregate ``cube``, group-by
+    aggregates it holds are answered from ``_cube`` instead of the rows.
+    Raises CodeRejected for disallowed constructs, for code that does not
+    parse, and when the estimated run time exceeds max_seconds.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise CodeRejected(f"Generated code is not valid Python: {e.msg}")
+    _check_allowed(tree)
+
+    rewrites: List[str] = []
+    cube_lookups = _use_cube(tree, cube, rewrites) if cube else 0
+    tree = _Vectorizer(rewrites, columns).visit(tree)
+    _hoist_groupbys(tree, rewrites)
+    ast.fix_missing_locations(tree)
+
+    estimated = estimate_seconds(tree, rows)
+    if max_seconds is not None and estimated > max_seconds:
+        raise CodeRejected(
+            f"Generated code is estimated to take ~{estimated:.0f}s on {rows} rows "
+            f"(limit {max_seconds:g}s)"
+        )
+
+    used = referenced_columns(tree, columns)
+    if used is not None and len(set(columns)) == len(columns):
+        # Keep dataset order; at least one column so the row count survives
+        used = [col for col in columns if col in used] or columns[:1]
+    else:
+        used = None
+    return AnalyzedCode(ast.unparse(tree), used, rewrites, estimated, cube_lookups)
+
+
+def _check_allowed(tree: ast.AST) -> None:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            modules = (
+                [alias.name for alias in node.names]
+                if isinstance(node, ast.Import)
+                else [node.module or ""]
+            )
+            for module in modules:
+                if module.split(".")[0] not in ALLOWED_IMPORTS:
+                    raise CodeRejected(f"Import of '{module}' is not allowed")
+            if isinstance(node, ast.ImportFrom):
+                for alias in node.names:
+                    if _is_file_access(alias.name):
+                        raise CodeRejected(
+                            f"File access via '{alias.name}' is not allowed"
+                        )
+        elif isinstance(node, ast.Name) and node.id in FORBIDDEN_NAMES:
+            raise CodeRejected(f"Use of '{node.id}' is not allowed")
+        elif isinstance(node, ast.Attribute):
+            if node.attr.startswith("__"):
+                raise CodeRejected(f"Access to '{node.attr}' is not allowed")
+            if _is_file_access(node.attr):
+                raise CodeRejected(f"File access via '{node.attr}' is not allowed")
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            raise CodeRejected("Global statements are not allowed")
+
+
+def _is_file_access(name: str) -> bool:
+    return name in FORBIDDEN_ATTRIBUTES or name.startswith("read_")
+
+
+def _keyword(call: ast.Call, name: str) -> Optional[ast.expr]:
+    return next((kw.value for kw in call.keywords if kw.arg == name), None)
+
+
+def _is_rowwise(call: ast.Call) -> bool:
+    axis = _keyword(call, "axis")
+    return isinstance(axis, ast.Constant) and axis.value in (1, "columns")
+
+
+def _plain_reference(node: ast.expr) -> bool:
+    """A name, attribute or constant subscript: cheap and pure to re-evaluate"""
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        if isinstance(node, ast.Subscript) and not _is_column_key(node.slice):
+            return False
+        node = node.value
+    return isinstance(node, ast.Name)
+
+
+def _root_name(node: ast.expr) -> Optional[str]:
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+class _Vectorizer(ast.NodeTransformer):
+    """Replace ``apply``/``map`` with arithmetic lambdas by vectorized expressions.
+
+    ``frame.apply(lambda r: r["a"] * r["b"], axis=1)`` becomes
+    ``frame["a"] * frame["b"]`` and ``s.apply(lambda x: x * 2)`` becomes
+    ``s * 2``. Only lambdas built from arithmetic and single comparisons
+    are rewritten, and never on groupby/window objects, where apply means
+    something else. Row attributes (``r.price``) are only read as columns
+    when they name a dataset column that is not also a Series attribute
+    (``r.name`` is the row label, not a column).
+    """
+
+    def __init__(self, rewrites: List[str], columns: List[str]):
+        self.rewrites = rewrites
+        self.row_attributes = {
+            col
+            for col in columns
+            if isinstance(col, str) and not hasattr(pd.Series, col)
+        }
+        self.windowed: Set[str] = set()
+
+    def visit_Module(self, node: ast.Module) -> ast.Module:
+        for child in ast.walk(node):
+            if isinstance(child, ast.Assign) and any(
+                isinstance(call, ast.Call)
+                and isinstance(call.func, ast.Attribute)
+                and call.func.attr in WINDOW_METHODS
+                for call in ast.walk(child.value)
+            ):
+                self.windowed.update(
+                    target.id
+                    for target in child.targets
+                    if isinstance(target, ast.Name)
+                )
+        return self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call) -> ast.expr:
+        self.generic_visit(node)
+        func = node.func
+        if not (
+            isinstance(func, ast.Attribute)
+            and func.attr in ("apply", "map")
+            and len(node.args) == 1
+            and isinstance(node.args[0], ast.Lambda)
+            and all(kw.arg == "axis" for kw in node.keywords)
+            and _plain_reference(func.value)
+            and _root_name(func.value) not in self.windowed
+        ):
+            return node
+        function = node.args[0]
+        if len(function.args.args) != 1 or function.args.vararg or function.args.kwarg:
+            return node
+
+        rowwise = func.attr == "apply" and _is_rowwise(node)
+        if node.keywords and not rowwise:
+            return node
+        body = _substitute(
+            function.body,
+            function.args.args[0].arg,
+            func.value,
+            self.row_attributes if rowwise else None,
+        )
+        if body is None:
+            return node
+        self.rewrites.append(f"vectorized {'row-wise ' if rowwise else ''}{func.attr}")
+        return ast.copy_location(body, node)
+
+
+def _use_cube(tree: ast.Module, cube: Dict, rewrites: List[str]) -> int:
+    """Rewrite ``df.groupby(keys)[columns].<agg>()`` into cube lookups.
+
+    Only top-level statements before the first one that may change ``df``
+    are rewritten, and only for groupings and measures the cube holds.
+    Returns the number of lookups.
+    """
+    lookups = _CubeLookups(cube)
+    frames = _aliases(tree, {"df"})
+    for statement in tree.body:
+        if _mutates(statement, frames):
+            break
+        lookups.visit(statement)
+    if lookups.count:
+        rewrites.append(f"answered {lookups.count} group-by(s) from the aggregate cube")
+    return lookups.count
+
+
+class _CubeLookups(ast.NodeTransformer):
+    def __init__(self, cube: Dict):
+        self.groupings = {frozenset(keys) for keys in cube["groupings"]}
+        self.measures = set(cube["measures"])
+        self.count = 0
+
+    def visit(self, node: ast.AST) -> ast.AST:
+        if isinstance(node, _NESTED_SCOPES):
+            return node
+        return super().visit(node)
+
+    def visit_Call(self, node: ast.Call) -> ast.expr:
+        self.generic_visit(node)
+        func = node.func
+        if not isinstance(func, ast.Attribute):
+            return node
+        how = func.attr
+        if how in ("agg", "aggregate"):
+            spec = node.args[0] if len(node.args) == 1 else None
+            if node.keywords or not (
+                isinstance(spec, ast.Constant) and isinstance(spec.value, str)
+            ):
+                return node
+            how = spec.value
+        elif node.args or node.keywords:
+            return node
+        if how not in CUBE_AGGREGATES:
+            return node
+
+        target, selection, columns = func.value, ast.Constant(value=None), []
+        if isinstance(target, ast.Subscript):
+            columns = _constant_strings(target.slice)
+            if not columns or not set(columns) <= self.measures:
+                return node
+            if how == "size" and isinstance(target.slice, ast.List):
+                return node  # One size per group, not per column
+            selection, target = target.slice, target.value
+        elif how != "size":
+            return node
+
+        keys = _cube_keys(target)
+        if keys is None or frozenset(keys) not in self.groupings:
+            return node
+        if set(columns) & set(keys):
+            return node
+
+        self.count += 1
+        return ast.copy_location(
+            ast.Call(
+                func=ast.Attribute(
+                    value=ast.Name(id="_cube", ctx=ast.Load()),
+                    attr="aggregate",
+                    ctx=ast.Load(),
+                ),
+                args=[
+                    ast.List(
+                        elts=[ast.Constant(value=key) for key in keys], ctx=ast.Load()
+                    ),
+                    selection,
+                    ast.Constant(value=how),
+                ],
+                keywords=[],
+            ),
+            node,
+        )
+
+
+def _constant_strings(node: ast.expr) -> Optional[List[str]]:
+    """The strings of a string constant or a list of them, else None"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, ast.List) and node.elts:
+        values = [
+            elt.value
+            for elt in node.elts
+            if isinstance(elt, ast.Constant) and isinstance(elt.value, str)
+        ]
+        return values if len(values) == len(node.elts) else None
+    return None
+
+
+def _cube_keys(node: ast.expr) -> Optional[List[str]]:
+    """The keys of a plain ``df.groupby(keys)`` call, else None"""
+    if not (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "groupby"
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id == "df"
+    ):
+        return None
+    by = node.args[0] if len(node.args) == 1 else _keyword(node, "by")
+    if by is None or len(node.args) > 1:
+        return None
+    for keyword in node.keywords:
+        if keyword.arg == "by":
+            continue
+        # Defaults that do not change the result
+        if keyword.arg not in ("observed", "sort") or not (
+            isinstance(keyword.value, ast.Constant) and keyword.value.value is True
+        ):
+            return None
+    keys = _constant_strings(by)
+    if keys is None or len(set(keys)) != len(keys):
+        return None
+    return keys
+
+
+def _substitute(
+    body: ast.expr,
+    arg: str,
+    receiver: ast.expr,
+    row_attributes: Optional[Set[str]],
+) -> Optional[ast.expr]:
+    """The lambda body applied to the whole receiver, or None if not vectorizable.
+
+    ``row_attributes`` is set for row-wise lambdas: the attribute names of
+    ``arg`` that are read as columns.
+    """
+    used = False
+
+    def convert(node: ast.expr) -> Optional[ast.expr]:
+        nonlocal used
+        # Strings only in comparisons: with % or + they would format or
+        # concatenate the whole Series instead of each value
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node
+        if isinstance(node, ast.BinOp) and isinstance(node.op, _VECTOR_OPS):
+            left, right = convert(node.left), convert(node.right)
+            if left is None or right is None:
+                return None
+            return ast.BinOp(left=left, op=node.op, right=right)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, _VECTOR_OPS):
+            operand = convert(node.operand)
+            return None if operand is None else ast.UnaryOp(op=node.op, operand=operand)
+        if (
+            isinstance(node, ast.Compare)
+            and len(node.ops) == 1
+            and isinstance(node.ops[0], _VECTOR_OPS)
+        ):
+            left, right = compared(node.left), compared(node.comparators[0])
+            if left is None or right is None:
+                return None
+            return ast.Compare(left=left, ops=node.ops, comparators=[right])
+        if row_attributes is not None:
+            # r["col"] or r.col -> receiver["col"]
+            key = None
+            if (
+                isinstance(node, ast.Subscript)
+                and isinstance(node.value, ast.Name)
+                and node.value.id == arg
+                and isinstance(node.slice, ast.Constant)
+                and isinstance(node.slice.value, str)
+            ):
+                key = node.slice.value
+            elif (
+                isinstance(node, ast.Attribute)
+                and isinstance(node.value, ast.Name)
+                and node.value.id == arg
+                and node.attr in row_attributes
+            ):
+                key = node.attr
+            if key is not None:
+                used = True
+                return ast.Subscript(
+                    value=receiver, slice=ast.Constant(value=key), ctx=ast.Load()
+                )
+        elif isinstance(node, ast.Name) and node.id == arg:
+            used = True
+            return receiver
+        return None
+
+    def compared(node: ast.expr) -> Optional[ast.expr]:
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return node
+        return convert(node)
+
+    converted = convert(body)
+    return converted if used else None
+
+
+def _hoist_groupbys(tree: ast.Module, rewrites: List[str]) -> None:
+    """Compute identical top-level ``x.groupby(...)`` calls once.
+
+    Only hoisted when nothing the call reads is reassigned or mutated
+    between its first and last use.
+    """
+    uses: Dict[str, List[int]] = {}
+    calls: Dict[str, ast.Call] = {}
+    for index, statement in enumerate(tree.body):
+        for node in _walk_scope(statement):
+            if (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and node.func.attr == "groupby"
+                and _root_name(node.func.value) is not None
+            ):
+                key = ast.dump(node)
+                calls.setdefault(key, node)
+                if index not in uses.setdefault(key, []):
+                    uses[key].append(index)
+
+    inserted = 0
+    for number, (key, indices) in enumerate(uses.items()):
+        if len(indices) < 2:
+            continue
+        reads = _aliases(
+            tree,
+            {node.id for node in ast.walk(calls[key]) if isinstance(node, ast.Name)},
+        )
+        first, last = indices[0], indices[-1]
+        if any(
+            _mutates(tree.body[i + inserted], reads) for i in range(first, last + 1)
+        ):
+            continue
+        name = f"_grouped_{number}"
+        replacer = _Replace(key, name)
+        for i in range(first, last + 1):
+            replacer.visit(tree.body[i + inserted])
+        tree.body.insert(
+            first + inserted,
+            ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=calls[key]),
+        )
+        inserted += 1
+        rewrites.append(f"reused groupby over {len(indices)} statements")
+
+
+def _walk_scope(node: ast.AST):
+    """ast.walk that does not enter lambdas, comprehensions or definitions"""
+    yield node
+    for child in ast.iter_child_nodes(node):
+        if not isinstance(child, _NESTED_SCOPES):
+            yield from _walk_scope(child)
+
+
+def _mutates(statement: ast.stmt, names: Set[str]) -> bool:
+    """Whether statement may rebind or change any of names.
+
+    Assignments to them (or their items and attributes), ``inplace=``
+    calls and calls of any method not in PURE_METHODS on them count.
+    """
+    for node in ast.walk(statement):
+        targets = []
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign)):
+            targets = [node.target]
+        elif isinstance(node, ast.Call) and any(
+            kw.arg == "inplace" for kw in node.keywords
+        ):
+            targets = [node.func]
+        elif (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr not in PURE_METHODS
+        ):
+            if _reference_root(node.func.value) in names:
+                return True
+        elif isinstance(node, (ast.For, ast.With, ast.Delete)):
+            return True
+        if any(_root_name(target) in names for target in targets):
+            return True
+    return False
+
+
+def _reference_root(node: ast.expr) -> Optional[str]:
+    """The name an attribute/subscript chain without calls starts from"""
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _aliases(tree: ast.AST, names: Set[str]) -> Set[str]:
+    """names plus every name bound to one of them or to their attributes.
+
+    ``d = df`` or ``rows = df.loc`` let later statements change ``df``
+    through ``d`` and ``rows``. Bindings anywhere in tree count.
+    """
+    names = set(names)
+    while True:
+        found = {
+            target.id
+            for node in ast.walk(tree)
+            if isinstance(node, ast.Assign)
+            and isinstance(node.value, (ast.Name, ast.Attribute))
+            and _reference_root(node.value) in names
+            for target in node.targets
+            if isinstance(target, ast.Name)
+        }
+        if found <= names:
+            return names
+        names |= found
+
+
+class _Replace(ast.NodeTransformer):
+    def __init__(self, key: str, name: str):
+        self.key = key
+        self.name = name
+
+    def visit(self, node: ast.AST) -> ast.AST:
+        if isinstance(node, _NESTED_SCOPES):
+            return node
+        return super().visit(node)
+
+    def visit_Call(self, node: ast.Call) -> ast.expr:
+        if ast.dump(node) == self.key:
+            return ast.copy_location(ast.Name(id=self.name, ctx=ast.Load()), node)
+        return self.generic_visit(node)
+
+
+def estimate_seconds(tree: ast.AST, rows: int) -> float:
+    """Rough run time: per-row Python work dominates, vectorized work is cheap.
+
+    ``for`` loops are costed per row only when they iterate something
+    computed from ``df``; loops over literals or ``range(3)`` are not.
+    """
+    frames = _frame_names(tree)
+    seconds = 0.0
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Call, ast.BinOp, ast.Compare)):
+            seconds += rows * VECTOR_NODE_COST
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+            if isinstance(node, ast.For) and _iterates_rows(node.iter, frames):
+                body = sum(1 for child in node.body for _ in ast.walk(child))
+                seconds += rows * body * LOOP_NODE_COST
+            continue
+        attr = node.func.attr
+        if attr in ("iterrows", "itertuples"):
+            seconds += rows * ROW_COSTS[attr]
+        elif attr == "apply" and _is_rowwise(node):
+            seconds += rows * ROW_COSTS["rowwise_apply"]
+        elif attr in ("apply", "map", "transform", "agg", "aggregate") and any(
+            isinstance(arg, (ast.Lambda, ast.Name)) for arg in node.args
+        ):
+            seconds += rows * ROW_COSTS["elementwise_apply"]
+    return seconds
+
+
+def _frame_names(tree: ast.AST) -> Set[str]:
+    """``df`` and every name bound, directly or through others, to a value
+    computed from it (``s = df["a"]``, ``n = len(df)``, loop variables)"""
+    names = {"df"}
+    changed = True
+    while changed:
+        changed = False
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Assign):
+                value, targets = node.value, node.targets
+            elif isinstance(node, (ast.AugAssign, ast.AnnAssign)):
+                value, targets = node.value, [node.target]
+            elif isinstance(node, (ast.For, ast.comprehension)):
+                value, targets = node.iter, [node.target]
+            else:
+                continue
+            if value is None or not _reads_rows(value, names):
+                continue
+            for target in targets:
+                for name in ast.walk(target):
+                    if isinstance(name, ast.Name) and name.id not in names:
+                        names.add(name.id)
+                        changed = True
+    return names
+
+
+def _reads_rows(node: ast.expr, frames: Set[str]) -> bool:
+    """Whether node uses a frame-derived name other than for its column labels"""
+    if isinstance(node, ast.Attribute) and node.attr in COLUMN_ATTRIBUTES:
+        return False
+    if isinstance(node, ast.Name):
+        return node.id in frames
+    return any(_reads_rows(child, frames) for child in ast.iter_child_nodes(node))
+
+
+def _iterates_rows(node: ast.expr, frames: Set[str]) -> bool:
+    """Whether a loop over node may run once per row of the dataset"""
+    if isinstance(node, ast.Name) and node.id == "df":
+        return False  # Iterating a DataFrame yields its column labels
+    return _reads_rows(node, frames)
+
+
+def _is_column_key(node: ast.expr) -> bool:
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, str)
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return bool(node.elts) and all(
+            isinstance(elt, ast.Constant) and isinstance(elt.value, str)
+            for elt in node.elts
+        )
+    return False
+
+
+def _is_row_selector(node: ast.expr) -> bool:
+    """A boolean mask or slice, as opposed to a (possibly computed) column key"""
+    if isinstance(node, (ast.Compare, ast.Slice)):
+        return True
+    if isinstance(node, ast.BinOp):
+        return isinstance(node.op, (ast.BitAnd, ast.BitOr, ast.BitXor))
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, ast.Invert)
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr in MASK_METHODS
+    )
+
+
+def referenced_columns(tree: ast.AST, columns: List[str]) -> Optional[Set[str]]:
+    """Dataset columns the code can observe, or None if that cannot be bounded.
+
+    Every use of ``df`` (and of names it is assigned to) must end in a
+    selection of named columns: ``df["a"]``, ``df[["a", "b"]]``, ``df.a``,
+    ``df.loc[rows, "a"]``, ``df.groupby(...)["a"]``, ``len(df)``, possibly
+    after row filters or frame methods that keep the structure. Any other
+    use could depend on every column, and disables pruning. The columns are
+    a superset: every string literal or identifier naming a column.
+    """
+    parents = {}
+    for node in ast.walk(tree):
+        for child in ast.iter_child_nodes(node):
+            parents[child] = node
+
+    known = set(columns)
+    roles = {"df": "frame"}
+    pending = ["df"]
+    while pending:
+        name = pending.pop()
+        for node in ast.walk(tree):
+            if (
+                isinstance(node, ast.Name)
+                and node.id == name
+                and isinstance(node.ctx, ast.Load)
+            ):
+                if not _consume(node, roles[name], parents, known, roles, pending):
+                    return None
+
+    # Names passed to cube lookups are answered without reading the rows
+    lookups = {
+        id(child)
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Call) and _root_name(node.func) == "_cube"
+        for child in ast.walk(node)
+    }
+    used = set()
+    for node in ast.walk(tree):
+        if id(node) in lookups:
+            continue
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            if node.value in known:
+                used.add(node.value)
+            for match in _IDENTIFIER.finditer(node.value):
+                token = match.group(1) or match.group(0)
+                if token in known:
+                    used.add(token)
+        elif isinstance(node, ast.Attribute) and node.attr in known:
+            used.add(node.attr)
+    return used
+
+
+def _consume(node, role, parents, known, roles, pending) -> bool:
+    """Whether this use of a frame/grouped value keeps pruning valid"""
+    parent = parents.get(node)
+
+    if isinstance(parent, ast.Assign) and parent.value is node:
+        if len(parent.targets) != 1 or not isinstance(parent.targets[0], ast.Name):
+            return False
+        target = parent.targets[0].id
+        if target == "result":
+            return False
+        if roles.get(target) is None:
+            roles[target] = role
+            pending.append(target)
+        return roles[target] == role
+
+    if isinstance(parent, ast.Subscript) and parent.value is node:
+        if _is_column_key(parent.slice):
+            return True
+        if role == "grouped" or not _is_row_selector(parent.slice):
+            return False
+        # Row filter: the result is still a frame with the same columns
+        return _consume(parent, "frame", parents, known, roles, pending)
+
+    if (
+        isinstance(parent, ast.Call)
+        and isinstance(parent.func, ast.Name)
+        and parent.func.id == "len"
+        and role == "frame"
+    ):
+        return True
+
+    if not (isinstance(parent, ast.Attribute) and parent.value is node):
+        return False
+    attr = parent.attr
+    call = parents.get(parent)
+    is_call = isinstance(call, ast.Call) and call.func is parent
+
+    if role == "grouped":
+        if attr in GROUPED_SAFE:
+            return True
+        if attr in ("agg", "aggregate") and is_call:
+            if call.args:
+                return isinstance(call.args[0], ast.Dict)
+            return bool(call.keywords)
+        return False
+
+    if attr in known:
+        return True
+    if attr == "loc":
+        if not isinstance(call, ast.Subscript) or call.value is not parent:
+            return False
+        key = call.slice
+        if isinstance(key, ast.Tuple) and len(key.elts) == 2:
+            return _is_column_key(key.elts[1])
+        return _consume(call, "frame", parents, known, roles, pending)
+    if attr == "shape":
+        return (
+            isinstance(call, ast.Subscript)
+            and isinstance(call.slice, ast.Constant)
+            and call.slice.value == 0
+        )
+    if not is_call:
+        return False
+    if attr == "groupby":
+        return _consume(call, "grouped", parents, known, roles, pending)
+    if attr in SUBSET_METHODS and _keyword(call, "subset") is None:
+        return False
+    if attr in FRAME_METHODS or attr in SUBSET_METHODS:
+        return _consume(call, "frame", parents, known, roles, pending)
+    return False
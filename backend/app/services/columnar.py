@@ -0,0 +1,193 @@
+import os
+import shutil
+import uuid
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from app.services.dtype_optimizer import apply_load_schema
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    feather = None
+
+
+SIDECAR_SUFFIX = ".feather"
+
+_ARROW_TYPES = {
+    "int64": "int64",
+    "float64": "float64",
+    "bool": "bool_",
+    "object": "string",
+    "str": "string",  # text columns on pandas 3
+}
+# Arrow types of the dtypes a load schema can choose
+_LOAD_SCHEMA_TYPES = {
+    "datetime64[ns]": "timestamp",
+    "category": "dictionary",
+}
+
+
+def sidecar_path(csv_path: str) -> str:
+    """Return the path of the columnar sidecar stored next to a CSV"""
+    return f"{csv_path}{SIDECAR_SUFFIX}"
+
+
+def has_fresh_sidecar(csv_path: str) -> bool:
+    """True when a sidecar exists and is not older than its CSV"""
+    path = sidecar_path(csv_path)
+    if feather is None or not os.path.exists(path):
+        return False
+    return os.stat(path).st_mtime_ns >= os.stat(csv_path).st_mtime_ns
+
+
+def _tmp_path(path: str) -> str:
+    """A temp file for path that concurrent writers of path do not share"""
+    return f"{path}.{uuid.uuid4().hex}.tmp"
+
+
+def write_sidecar(csv_path: str, df: pd.DataFrame) -> Optional[str]:
+    """Write df as an uncompressed Feather (Arrow IPC) file next to csv_path.
+
+    Uncompressed files can be memory-mapped on read, and the whole frame
+    goes into one record batch so its fixed-width columns can be read back
+    without a copy (see ``read_dataset``). Returns the sidecar path, or
+    None when pyarrow is not installed.
+    """
+    if feather is None:
+        return None
+
+    path = sidecar_path(csv_path)
+    tmp_path = _tmp_path(path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    try:
+        feather.write_feather(
+            table, tmp_path, compression="uncompressed", chunksize=max(len(df), 1)
+        )
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def sidecar_batches(csv_path: str) -> int:
+    """Number of record batches in csv_path's sidecar (streamed ones have many)"""
+    with pa.memory_map(sidecar_path(csv_path)) as source:
+        return pa.ipc.open_file(source).num_record_batches
+
+
+def write_sidecar_from_csv(
+    csv_path: str,
+    dtypes: Dict[str, str],
+    chunksize: int = 100_000,
+    load_schema: Optional[Dict[str, str]] = None,
+    categories: Optional[Dict[str, List[str]]] = None,
+) -> Optional[str]:
+    """Stream a CSV into its Feather sidecar one chunk at a time.
+
+    ``dtypes`` is the whole-file dtype map from ``ingest.scan_csv``; pinning it
+    keeps every chunk on the same schema, so the full table is never held in
+    memory. With the scan's ``load_schema`` and ``categories`` the sidecar
+    stores the optimized columns (dates already parsed, strings dictionary
+    encoded). Returns the sidecar path, or None when pyarrow is not installed.
+    """
+    if feather is None:
+        return None
+
+    load_schema = load_schema or {}
+    read_dtypes = {col: dtype for col, dtype in dtypes.items() if dtype in _ARROW_TYPES}
+    schema = pa.schema(
+        [
+            (col, _arrow_type(load_schema.get(col), dtype))
+            for col, dtype in dtypes.items()
+        ]
+    )
+
+    path = sidecar_path(csv_path)
+    tmp_path = _tmp_path(path)
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                with pd.read_csv(
+                    csv_path, dtype=read_dtypes, chunksize=chunksize
+                ) as reader:
+                    for chunk in reader:
+                        chunk = apply_load_schema(chunk, load_schema, categories)
+                        writer.write_table(
+                            pa.Table.from_pandas(
+                                chunk, schema=schema, preserve_index=False
+                            )
+                        )
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return path
+
+
+def _arrow_type(load_dtype: Optional[str], dtype: str):
+    arrow_type = _LOAD_SCHEMA_TYPES.get(load_dtype)
+    if arrow_type == "timestamp":
+        return pa.timestamp("ns")
+    if arrow_type == "dictionary":
+        return pa.dictionary(pa.int32(), pa.string())
+    return getattr(pa, arrow_type or _ARROW_TYPES.get(dtype, "string"))()
+
+
+def share_sidecar(source_csv: str, dest_csv: str) -> bool:
+    """Reuse source_csv's fresh sidecar for dest_csv, which has the same bytes.
+
+    The sidecar is hard-linked (copied where links are unsupported).
+    Returns False when there is no usable sidecar to share.
+    """
+    if not has_fresh_sidecar(source_csv):
+        return False
+    source = sidecar_path(source_csv)
+    tmp_path = _tmp_path(sidecar_path(dest_csv))
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, sidecar_path(dest_csv))
+    if os.path.exists(tmp_path):
+        # Renaming onto another link to the same file leaves both in place
+        os.remove(tmp_path)
+    return True
+
+
+def remove_sidecar(csv_path: str) -> None:
+    path = sidecar_path(csv_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def read_dataset(
+    csv_path: str,
+    columns: Optional[List[str]] = None,
+    load_schema: Optional[Dict[str, str]] = None,
+) -> pd.DataFrame:
+    """Load a stored dataset, preferring its columnar sidecar.
+
+    Falls back to parsing the CSV when no up-to-date sidecar exists. Columns
+    are cast to ``load_schema`` unless (as in sidecars written with it)
+    they already have its dtypes.
+
+    Numeric and datetime columns without nulls in a single-batch sidecar
+    are read-only views of the memory-mapped file rather than heap copies;
+    everything else (strings, nulls, columns spread over several batches)
+    is copied into memory.
+    """
+    if has_fresh_sidecar(csv_path):
+        table = feather.read_table(
+            sidecar_path(csv_path), columns=columns, memory_map=True
+        )
+        df = table.to_pandas(split_blocks=True)
+    else:
+        df = pd.read_csv(csv_path, usecols=columns)
+    return apply_load_schema(df, load_schema)
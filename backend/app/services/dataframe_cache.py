@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+
+def enable_copy_on_write() -> None:
+    """Turn on pandas copy-on-write (always on from pandas 3.0).
+
+    With it enabled, shallow copies of a cached frame share its buffers and
+    only the columns that get modified are materialized.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+class DataFrameCache:
+    """Process-wide LRU cache of parsed DataFrames.
+
+    Entries are keyed by file path and validated against the file's
+    mtime/size, so a rewritten file is never served stale. The cache keeps
+    the total in-memory size of its frames under ``max_bytes`` by evicting
+    the least recently used entries.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], pd.DataFrame, int]]" = (
+            OrderedDict()
+        )
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def file_signature(path: str) -> Tuple[int, int]:
+        """Return the (mtime_ns, size) pair used to detect file rewrites"""
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, path: str, loader: Callable[[str], pd.DataFrame]) -> pd.DataFrame:
+        """Return the cached frame for path, loading it on a miss.
+
+        Callers share the returned object; take ``df.copy(deep=False)``
+        before modifying it.
+        """
+        key = os.path.abspath(path)
+        signature = self.file_signature(path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        df = loader(path)
+        size = int(df.memory_usage(deep=True).sum())
+
+        with self._lock:
+            self._discard(key)
+            if size <= self.max_bytes:
+                self._entries[key] = (signature, df, size)
+                self._total_bytes += size
+                while self._total_bytes > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    self._discard(oldest)
+                    self.evictions += 1
+        return df
+
+    def invalidate(self, path: str) -> None:
+        """Drop any cached frame for path"""
+        with self._lock:
+            if self._discard(os.path.abspath(path)):
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _discard(self, key: str) -> bool:
+        entry: Optional[Tuple] = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._total_bytes -= entry[2]
+        return True
@@ -0,0 +1,21 @@
+import os
+import sqlite3
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a SQLite database under storage/ for use from multiple threads.
+
+    Callers are expected to serialize access with their own lock. WAL mode
+    keeps readers from blocking on the single writer.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def escape_like(text: str) -> str:
+    """Escape LIKE wildcards; use with ``ESCAPE '\\'``"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
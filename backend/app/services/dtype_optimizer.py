@@ -0,0 +1,283 @@
+import re
+import sys
+import warnings
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# A string column becomes ``category`` when its distinct values are at most
+# this share of its non-null values (and no more than CATEGORY_MAX_VALUES)
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_MAX_VALUES = 10_000
+DATE_SAMPLE_ROWS = 200
+DATETIME_DTYPE = "datetime64[ns]"
+# The only dtypes a load schema chooses. Numbers stay int64/float64: narrower
+# types overflow or lose precision in the arithmetic and sums of generated
+# code (numpy keeps ``int16 * 1000`` in int16 and sums float32 in float32)
+LOAD_SCHEMA_DTYPES = ("category", DATETIME_DTYPE)
+_NARROW_NUMERIC = {"int8": "int64", "int16": "int64", "int32": "int64"}
+_NARROW_NUMERIC.update({"float16": "float64", "float32": "float64"})
+_DATE_LIKE = re.compile(
+    r"\s*(\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4})"
+    r"([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?\s*"
+)
+# Size of a pointer in an object array, and of the NaN object behind a null
+_POINTER_BYTES = 8
+_NULL_BYTES = sys.getsizeof(float("nan"))
+
+
+class SchemaScan:
+    """Choose a dataset's load schema from its chunks, one chunk at a time.
+
+    Tracks per column what the choice needs over the whole file: the
+    distinct strings (up to CATEGORY_MAX_VALUES) and whether every string
+    parses as a date. ``load_schema`` then maps each text column that can
+    be stored more compactly to ``category`` or ``datetime64[ns]``; other
+    columns are left as parsed.
+    """
+
+    def __init__(self):
+        self._columns: Dict[Hashable, Dict] = {}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        for col, series in chunk.items():
+            stats = self._columns.setdefault(
+                col,
+                {
+                    "kinds": set(),
+                    "values": set(),
+                    "non_null": 0,
+                    "dates": None,
+                },
+            )
+            non_null = series.dropna()
+            if non_null.empty:
+                continue
+            stats["non_null"] += len(non_null)
+            kind = _kind(series)
+            stats["kinds"].add(kind)
+
+            if kind in ("string", "category"):
+                self._add_values(stats, non_null)
+                if kind == "string" and stats["dates"] is not False:
+                    stats["dates"] = _parses_as_dates(non_null)
+
+    def load_schema(self) -> Dict[str, str]:
+        schema = {}
+        for col, stats in self._columns.items():
+            kinds = stats["kinds"]
+            dtype = None
+            if kinds == {"datetime"}:
+                dtype = DATETIME_DTYPE
+            elif kinds and kinds <= {"string", "category"}:
+                if kinds == {"string"} and stats["dates"]:
+                    dtype = DATETIME_DTYPE
+                elif (
+                    stats["values"] is not None
+                    and len(stats["values"]) <= CATEGORY_MAX_RATIO * stats["non_null"]
+                ):
+                    dtype = "category"
+            if dtype is not None:
+                schema[str(col)] = dtype
+        return schema
+
+    def categories(self) -> Dict[str, List[str]]:
+        """The sorted distinct values of every ``category`` column"""
+        return {
+            col: sorted(self._columns[col]["values"])
+            for col, dtype in self.load_schema().items()
+            if dtype == "category"
+        }
+
+    @staticmethod
+    def _add_values(stats: Dict, non_null: pd.Series) -> None:
+        if stats["values"] is None:
+            return
+        values = non_null.unique()
+        if not all(isinstance(value, str) for value in values):
+            stats["values"] = None
+            return
+        stats["values"].update(values)
+        if len(stats["values"]) > CATEGORY_MAX_VALUES:
+            stats["values"] = None
+
+
+def _kind(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # Any naive unit (pandas 3 parses to microseconds); not time zones
+        return "datetime" if pd.api.types.is_datetime64_dtype(series) else "other"
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return "category"
+    if pd.api.types.is_string_dtype(series.dtype):
+        return "string"  # object on pandas 2, str on pandas 3
+    return "other"
+
+
+def _parse_dates(series: pd.Series) -> Optional[pd.Series]:
+    """series parsed as naive timestamps, or None when any value does not parse"""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            parsed = pd.to_datetime(series)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    if not pd.api.types.is_datetime64_dtype(parsed):
+        return None  # Time zones or mixed offsets: keep the text
+    try:
+        return parsed.astype(DATETIME_DTYPE)
+    except (ValueError, OverflowError):
+        return None  # Out of the nanosecond range
+
+
+def _parses_as_dates(non_null: pd.Series) -> bool:
+    sample = non_null.iloc[:DATE_SAMPLE_ROWS]
+    if not all(
+        isinstance(value, str) and _DATE_LIKE.fullmatch(value) for value in sample
+    ):
+        return False
+    return _parse_dates(non_null) is not None
+
+
+def choose_load_schema(df: pd.DataFrame) -> Dict[str, str]:
+    """The load schema for a frame that is already in memory"""
+    scan = SchemaScan()
+    scan.update(df)
+    return scan.load_schema()
+
+
+def frame_load_schema(df: pd.DataFrame) -> Dict[str, str]:
+    """The load schema that reproduces df's optimized dtypes from its CSV"""
+    schema = {}
+    for col, dtype in df.dtypes.items():
+        if str(dtype) in LOAD_SCHEMA_DTYPES:
+            schema[str(col)] = str(dtype)
+    return schema
+
+
+def apply_load_schema(
+    df: pd.DataFrame,
+    load_schema: Optional[Dict[str, str]],
+    categories: Optional[Dict[str, List[str]]] = None,
+) -> pd.DataFrame:
+    """Cast df's columns to a load schema.
+
+    Columns already of the right dtype, missing from df, or whose values no
+    longer fit (the file changed since the schema was chosen) are left as
+    they are, so the schema can never make a load fail. ``categories`` pins
+    the categories of ``category`` columns, e.g. to keep chunks uniform.
+    Narrow numeric columns (from schemas and sidecars written before
+    numbers were kept at full width) are widened back to int64/float64.
+    """
+    converted = {
+        col: series.astype(_NARROW_NUMERIC[str(series.dtype)])
+        for col, series in df.items()
+        if str(series.dtype) in _NARROW_NUMERIC
+    }
+    for col, dtype in (load_schema or {}).items():
+        if (
+            dtype not in LOAD_SCHEMA_DTYPES
+            or col not in df.columns
+            or str(df[col].dtype) == dtype
+        ):
+            continue
+        cast = _cast(df[col], dtype, (categories or {}).get(col))
+        if cast is not None:
+            converted[col] = cast
+    if not converted:
+        return df
+    df = df.copy(deep=False)
+    for col, series in converted.items():
+        df[col] = series
+    return df
+
+
+def without_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """df with its ``category`` columns turned back into their values' dtype.
+
+    Generated code is written for the CSV's own dtypes, and string methods
+    such as ``+`` or ``fillna('x')`` fail on a categorical. Each column is
+    cast to the dtype of its categories, which is what ``pd.read_csv``
+    gives the same text (``object`` on pandas 2, ``str`` on pandas 3).
+    """
+    converted = {
+        col: series.astype(series.cat.categories.dtype)
+        for col, series in df.items()
+        if isinstance(series.dtype, pd.CategoricalDtype)
+    }
+    if not converted:
+        return df
+    df = df.copy(deep=False)
+    for col, series in converted.items():
+        df[col] = series
+    return df
+
+
+def _cast(series: pd.Series, dtype: str, categories: Optional[List[str]]):
+    try:
+        if dtype == "category":
+            if categories is None:
+                return series.astype(dtype)
+            # Values outside pinned categories would silently become null
+            if not series.dropna().isin(categories).all():
+                return None
+            return series.astype(pd.CategoricalDtype(categories))
+        if dtype == DATETIME_DTYPE:
+            return _parse_dates(series)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return None
+
+
+def memory_optimization(
+    df: pd.DataFrame, load_schema: Dict[str, str], memory_usage: int
+) -> Dict:
+    """Before/after memory of a frame loaded with load_schema.
+
+    ``memory_usage`` is df's (possibly approximate) deep size; the size
+    before is estimated from it by replacing each optimized column with
+    what a plain CSV parse would hold (int64/float64 or Python strings).
+    """
+    rows = len(df)
+    before = memory_usage
+    optimized = {}
+    for col, dtype in load_schema.items():
+        if col not in df.columns or str(df[col].dtype) != dtype:
+            continue
+        series = df[col]
+        optimized[col] = dtype
+        before += _plain_bytes(series) - int(
+            series.memory_usage(deep=True, index=False)
+        )
+    return {
+        "before_bytes": int(before),
+        "after_bytes": int(memory_usage),
+        "saved_bytes": int(before - memory_usage),
+        "ratio": round(before / memory_usage, 2) if memory_usage else None,
+        "rows": rows,
+        "columns": optimized,
+    }
+
+
+def _plain_bytes(series: pd.Series) -> int:
+    """Estimated deep size of series as plain ``pd.read_csv`` would parse it"""
+    rows = len(series)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        counts = np.bincount(series.cat.codes.to_numpy() + 1, minlength=1)
+        sizes = np.array(
+            [_NULL_BYTES] + [sys.getsizeof(value) for value in series.cat.categories]
+        )
+        return rows * _POINTER_BYTES + int(counts @ sizes[: len(counts)])
+    if pd.api.types.is_datetime64_any_dtype(series):
+        valid = series.dropna()
+        nulls = rows - len(valid)
+        with_time = bool(len(valid)) and bool((valid != valid.dt.normalize()).any())
+        text = sys.getsizeof("0000-00-00 00:00:00" if with_time else "0000-00-00")
+        return rows * _POINTER_BYTES + len(valid) * text + nulls * _NULL_BYTES
+    return rows * 8
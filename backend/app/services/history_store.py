@@ -0,0 +1,222 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.services.db import connect, escape_like
+
+HISTORY_FIELDS = ("pandas_code", "recharts_config", "explanation", "insights")
+# Stored only by answers that have them (SQL-engine answers have no pandas_code)
+OPTIONAL_FIELDS = ("sql_query",)
+
+
+class HistoryStore:
+    """Per-file /ask history in SQLite, written off the request path.
+
+    ``append`` only enqueues the entry; a writer thread inserts queued
+    entries in batches of up to ``batch_size`` per transaction. Reads are
+    newest-first keyset pages over an index on (filename, id), so loading
+    a page costs the same however long the history is. Question search
+    uses an FTS5 index when SQLite has it and falls back to LIKE.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 256):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self.writes = 0
+        self.batches = 0
+
+        self._conn = connect(db_path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL,
+                question TEXT NOT NULL,
+                entry TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS history_filename ON history (filename, id)"
+        )
+        self.full_text = self._create_fts()
+
+    def _create_fts(self) -> bool:
+        try:
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                    question, content='history', content_rowid='id'
+                )
+                """)
+        except sqlite3.OperationalError:
+            return False
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history
+            BEGIN
+                INSERT INTO history_fts (rowid, question) VALUES (new.id, new.question);
+            END
+            """)
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history
+            BEGIN
+                INSERT INTO history_fts (history_fts, rowid, question)
+                VALUES ('delete', old.id, old.question);
+            END
+            """)
+        return True
+
+    def start(self) -> None:
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(
+                    target=self._write_loop, name="history-writer", daemon=True
+                )
+                self._writer.start()
+
+    def close(self) -> None:
+        """Write out everything queued and stop the writer thread"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+
+    def append(self, filename: str, question: str, chart_data: Dict) -> None:
+        entry = {key: chart_data.get(key) for key in HISTORY_FIELDS}
+        entry.update(
+            {key: chart_data[key] for key in OPTIONAL_FIELDS if key in chart_data}
+        )
+        self._queue.put((filename, question, json.dumps(entry), time.time()))
+        if self._writer is None:
+            self.start()
+
+    def flush(self) -> None:
+        """Block until every queued entry is written"""
+        self._queue.join()
+
+    def page(
+        self,
+        filename: str,
+        limit: int = 50,
+        before: Optional[int] = None,
+        search: Optional[str] = None,
+    ) -> List[Dict]:
+        """Newest-first entries for filename with id < before"""
+        self.flush()
+        search = (search or "").strip()
+        conditions = ["h.filename = ?"]
+        params: List = [filename]
+        if before is not None:
+            conditions.append("h.id < ?")
+            params.append(before)
+
+        join = ""
+        if search:
+            if self.full_text:
+                join = "JOIN history_fts f ON f.rowid = h.id"
+                conditions.append("history_fts MATCH ?")
+                params.append(_fts_query(search))
+            else:
+                conditions.append("h.question LIKE ? ESCAPE '\\'")
+                params.append(f"%{escape_like(search)}%")
+
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT h.id, h.question, h.entry, h.created_at FROM history h {join}
+                WHERE {" AND ".join(conditions)}
+                ORDER BY h.id DESC LIMIT ?
+                """,
+                params,
+            ).fetchall()
+        return [_row_to_entry(row) for row in rows]
+
+    def import_jsonl(self, filename: str, path: str) -> int:
+        """Load a legacy append-only history file, oldest entry first"""
+        created_at = os.path.getmtime(path)
+        rows = []
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "question" not in entry:
+                    continue
+                chart_data = {key: entry.get(key) for key in HISTORY_FIELDS}
+                rows.append(
+                    (filename, entry["question"], json.dumps(chart_data), created_at)
+                )
+        with self._lock:
+            self._insert(rows)
+        return len(rows)
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self._queue.qsize(),
+            "writes": self.writes,
+            "batches": self.batches,
+            "full_text_search": self.full_text,
+        }
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            rows = [row for row in batch if row is not None]
+            try:
+                with self._lock:
+                    self._insert(rows)
+            except Exception as e:
+                print(f"History saving failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(rows) < len(batch):
+                return
+
+    def _insert(self, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "INSERT INTO history (filename, question, entry, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        self.writes += len(rows)
+        self.batches += 1
+
+
+def _row_to_entry(row) -> Dict:
+    entry = {"id": row["id"], "question": row["question"]}
+    entry.update(json.loads(row["entry"]))
+    entry["created_at"] = row["created_at"]
+    return entry
+
+
+def _fts_query(search: str) -> str:
+    # Quote every term so user input is never parsed as FTS syntax; the
+    # last one matches as a prefix so partially typed words find results
+    terms = [f'"{term}"' for term in search.replace('"', " ").split()]
+    if not terms:
+        return '""'
+    terms[-1] += "*"
+    return " ".join(terms)
@@ -0,0 +1,54 @@
+from typing import Dict, Optional
+
+import pandas as pd
+
+from app.services.dtype_optimizer import SchemaScan
+
+INGEST_CHUNK_ROWS = 100_000
+
+_NUMERIC_DTYPES = {"int64", "float64"}
+
+
+def merge_dtypes(current: Optional[str], chunk: str) -> str:
+    """Combine the dtype seen so far for a column with the dtype of a new chunk.
+
+    Mirrors what a single whole-file ``pd.read_csv`` would infer: ints that
+    meet floats (or missing values) become float64, anything else that
+    disagrees becomes object.
+    """
+    if current is None or current == chunk:
+        return chunk
+    if {current, chunk} <= _NUMERIC_DTYPES:
+        return "float64"
+    return "object"
+
+
+def scan_csv(path: str, chunksize: int = INGEST_CHUNK_ROWS) -> Dict:
+    """Count rows and infer column dtypes without loading the whole file.
+
+    Also chooses the file's load schema (see ``dtype_optimizer``) and the
+    categories of its ``category`` columns. Raises the usual ``pd.errors``
+    exceptions for empty or malformed input.
+    """
+    columns = None
+    dtypes: Dict[str, Optional[str]] = {}
+    rows = 0
+    schema_scan = SchemaScan()
+
+    with pd.read_csv(path, chunksize=chunksize) as reader:
+        for chunk in reader:
+            if columns is None:
+                columns = chunk.columns.tolist()
+                dtypes = {col: None for col in columns}
+            rows += len(chunk)
+            for col, dtype in chunk.dtypes.astype(str).items():
+                dtypes[col] = merge_dtypes(dtypes[col], dtype)
+            schema_scan.update(chunk)
+
+    return {
+        "columns": columns or [],
+        "rows": rows,
+        "dtypes": dtypes,
+        "load_schema": schema_scan.load_schema(),
+        "categories": schema_scan.categories(),
+    }
@@ -0,0 +1,234 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from starlette.background import BackgroundTasks
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    """Raised from ``Job.report`` once the job has been cancelled"""
+
+
+class Job:
+    """One unit of background work and its observable state.
+
+    Work reports progress with ``report(fraction, message)``, which is safe
+    to call from worker threads and raises JobCancelled once the job is
+    cancelled, so long-running work stops at its next report. Tasks added
+    to ``background`` run after the job has succeeded, like a route's
+    BackgroundTasks run after its response.
+    """
+
+    def __init__(self, kind: str, key: Hashable, loop: asyncio.AbstractEventLoop):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"
+        self.progress = 0.0
+        self.message: Optional[str] = None
+        self.result: Any = None
+        self.error: Optional[Dict] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.background = BackgroundTasks()
+        self.version = 0
+        self.cancel_requested = False
+        self._loop = loop
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Future] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    def report(self, fraction: float, message: Optional[str] = None) -> None:
+        """Record progress (0..1); raises JobCancelled if the job was cancelled"""
+        if self.cancel_requested:
+            raise JobCancelled(f"Job {self.id} was cancelled")
+        self.progress = max(self.progress, min(max(fraction, 0.0), 1.0))
+        if message is not None:
+            self.message = message
+        self._loop.call_soon_threadsafe(self._notify)
+
+    async def wait(self, version: int, timeout: float) -> None:
+        """Wait until the job changes after ``version``, or for timeout seconds"""
+        if self.version != version:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def snapshot(self, include_result: bool = True) -> Dict:
+        snapshot = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress * 100, 1),
+            "message": self.message,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if include_result:
+            snapshot["result"] = self.result
+        return snapshot
+
+    def _set(self, status: str, **fields) -> None:
+        self.status = status
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self._notify()
+
+    def _notify(self) -> None:
+        self.version += 1
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class JobQueue:
+    """In-process queue of background jobs run by a bounded pool of workers.
+
+    ``submit`` returns at once with a Job that at most ``max_workers`` run
+    at a time, in submission order. Jobs are deduplicated by key: while a
+    job with the same key is queued or running, submitting it again
+    returns that job. Finished jobs (and their results) are kept for
+    ``finished_ttl`` seconds, and no more than ``max_finished`` of them.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_finished: int = 1000,
+        finished_ttl: float = 3600.0,
+    ):
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self.finished_ttl = finished_ttl
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[Hashable, Job] = {}
+        self._lock = threading.Lock()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.submitted = 0
+        self.deduplicated = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def submit(
+        self, kind: str, key: Hashable, work: Callable[[Job], Awaitable[Any]]
+    ) -> Tuple[Job, bool]:
+        """Queue ``work(job)`` unless an identical job is in flight.
+
+        Must be called from the event loop. Returns the job and whether it
+        is an existing in-flight job.
+        """
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        with self._lock:
+            existing = self._active.get((kind, key))
+            if existing is not None:
+                self.deduplicated += 1
+                return existing, True
+            job = Job(kind, key, loop)
+            self._jobs[job.id] = job
+            self._active[(kind, key)] = job
+            self.submitted += 1
+            self._evict()
+        job._task = asyncio.ensure_future(self._run(job, work))
+        job._task.add_done_callback(lambda _task: self._cancelled_early(job))
+        return job, False
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job; finished jobs are left as they are.
+
+        Work already running in a thread cannot be interrupted; it stops at
+        its next ``report``.
+        """
+        job = self.get(job_id)
+        if job is not None and job.active and not job.cancel_requested:
+            job.cancel_requested = True
+            job.message = "Cancelling"
+            job._notify()
+            job._task.cancel()
+        return job
+
+    def shutdown(self) -> None:
+        with self._lock:
+            active = list(self._active.values())
+        for job in active:
+            job.cancel_requested = True
+            job._task.cancel()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            running = sum(1 for job in self._active.values() if job.status == "running")
+            return {
+                "workers": self.max_workers,
+                "queued": len(self._active) - running,
+                "running": running,
+                "retained": len(self._jobs),
+                "submitted": self.submitted,
+                "deduplicated": self.deduplicated,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+            }
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Any]]) -> None:
+        try:
+            async with self._slots:
+                job._set("running", started_at=time.time())
+                result = await work(job)
+        except (asyncio.CancelledError, JobCancelled):
+            self._finish(job, "cancelled", message="Cancelled")
+            return
+        except Exception as e:
+            self._finish(
+                job,
+                "failed",
+                error={
+                    "status_code": getattr(e, "status_code", 500),
+                    "detail": getattr(e, "detail", str(e)),
+                },
+            )
+            return
+        self._finish(job, "succeeded", result=result, progress=1.0)
+
+        try:
+            await job.background()
+        except Exception as e:
+            print(f"Background tasks of job {job.id} failed: {e}")
+
+    def _cancelled_early(self, job: Job) -> None:
+        # A task cancelled before its first step never enters _run
+        if job.active:
+            self._finish(job, "cancelled", message="Cancelled")
+
+    def _finish(self, job: Job, status: str, **fields) -> None:
+        with self._lock:
+            if self._active.get((job.kind, job.key)) is job:
+                del self._active[(job.kind, job.key)]
+            setattr(self, status, getattr(self, status) + 1)
+        job._set(status, finished_at=time.time(), **fields)
+
+    def _evict(self) -> None:
+        finished = [job for job in self._jobs.values() if not job.active]
+        expired = time.time() - self.finished_ttl
+        excess = len(finished) - self.max_finished
+        for index, job in enumerate(finished):
+            if index < excess or job.finished_at < expired:
+                del self._jobs[job.id]
@@ -0,0 +1,137 @@
+import datetime
+import json
+import math
+import uuid
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# Fragments (pre-encoded JSON embedded as-is) need orjson >= 3.9
+_ORJSON = orjson is not None and hasattr(orjson, "Fragment")
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if _ORJSON else 0
+
+# pandas' writer rounds floats to 10 significant digits unless told otherwise
+DOUBLE_PRECISION = 15
+
+
+class RawJSON:
+    """Already-encoded JSON that ``dumps`` embeds without re-encoding"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+def records_json(frame: pd.DataFrame) -> RawJSON:
+    """Encode a DataFrame as a list of row objects straight from its columns.
+
+    This skips building a Python dict per row (``to_dict``): pandas' C
+    writer walks the arrays and emits NaN/NaT as null and datetimes as ISO
+    strings.
+    """
+    try:
+        text = frame.to_json(
+            orient="records",
+            date_format="iso",
+            double_precision=DOUBLE_PRECISION,
+            default_handler=str,
+        )
+    except ValueError:
+        # Duplicate column names cannot be written as records
+        return RawJSON(dumps(frame.to_dict(orient="records")))
+    return RawJSON(text.encode("utf-8"))
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to compact JSON bytes.
+
+    numpy arrays and scalars, pandas timestamps and NaN are handled
+    natively (NaN and infinities become null) and ``RawJSON`` values are
+    spliced in unchanged. Uses orjson when installed.
+    """
+    if _ORJSON:
+        return orjson.dumps(content, default=_orjson_default, option=_ORJSON_OPTIONS)
+
+    fragments = {}
+    token = uuid.uuid4().hex
+    text = json.dumps(
+        _prepare(content, fragments, token),
+        default=_default,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    for placeholder, fragment in fragments.items():
+        text = text.replace(f'"{placeholder}"', fragment.data.decode("utf-8"), 1)
+    return text.encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded once by ``dumps``; bytes are sent as given"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return dumps(content)
+
+
+def _orjson_default(value: Any) -> Any:
+    if isinstance(value, RawJSON):
+        return orjson.Fragment(value.data)
+    return _default(value)
+
+
+def _default(value: Any) -> Any:
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, pd.Timedelta):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+        if isinstance(value, float) and not math.isfinite(value):
+            return None
+        return value
+    if isinstance(value, np.ndarray):
+        return _prepare(value.tolist(), {}, "")
+    if isinstance(value, (pd.Series, pd.Index)):
+        return _prepare(value.tolist(), {}, "")
+    return str(value)
+
+
+def _prepare(value: Any, fragments: dict, token: str) -> Any:
+    """Make content safe for the stdlib encoder: no NaN, fragments as placeholders"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {
+            key if isinstance(key, str) else str(key): _prepare(item, fragments, token)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_prepare(item, fragments, token) for item in value]
+    if isinstance(value, RawJSON):
+        placeholder = f"__raw_json_{token}_{len(fragments)}__"
+        fragments[placeholder] = value
+        return placeholder
+    return value
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    """Encode one Server-Sent Event whose data is JSON (bytes are sent as given)"""
+    if not isinstance(data, (bytes, bytearray)):
+        data = dumps(data)
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + bytes(data) + b"\n\n"
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import random
+import re
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from groq import AsyncGroq, DefaultAsyncHttpxClient
+
+
+class LLMError(Exception):
+    """Raised when the LLM could not produce a usable response"""
+
+
+def parse_json_content(content: Optional[str]) -> Dict:
+    """Parse a completion as JSON, tolerating markdown code fences"""
+    if not content or content.strip() == "":
+        raise ValueError("Empty response from LLM")
+
+    content = content.strip()
+
+    # Remove opening markdown blocks
+    if content.startswith("```json"):
+        content = content[7:]
+    elif content.startswith("```"):
+        content = content[3:]
+
+    # Remove closing markdown blocks
+    if content.endswith("```"):
+        content = content[:-3]
+
+    return json.loads(content.strip())
+
+
+class StreamedStringField:
+    """Decode one string field of a JSON object while the object is streaming.
+
+    ``feed`` takes the next piece of raw completion text and returns the
+    part of the field's value that became available, with JSON escapes
+    decoded. Escapes split across pieces are held back until complete.
+    """
+
+    def __init__(self, key: str):
+        self._pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(key))
+        self._text = ""
+        self._position: Optional[int] = None
+        self.done = False
+
+    def feed(self, delta: str) -> str:
+        self._text += delta
+        if self.done:
+            return ""
+        if self._position is None:
+            match = self._pattern.search(self._text)
+            if not match:
+                return ""
+            self._position = match.end()
+
+        text, i, decoded = self._text, self._position, []
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                self.done = True
+                break
+            if char != "\\":
+                decoded.append(char)
+                i += 1
+                continue
+            length = 6 if text[i + 1 : i + 2] == "u" else 2
+            if i + length > len(text):
+                break
+            if length == 6 and text[i + 2 : i + 4].lower() in ("d8", "d9", "da", "db"):
+                length = 12  # high surrogate: wait for its pair
+                if i + length > len(text):
+                    break
+            try:
+                decoded.append(json.loads(f'"{text[i:i + length]}"'))
+            except ValueError:
+                self.done = True
+                break
+            i += length
+        self._position = i
+        return "".join(decoded)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+class LLMClient:
+    """Async Groq chat client with pooled connections and a concurrency cap.
+
+    At most ``max_concurrency`` completions are in flight at once; further
+    callers wait on a semaphore without blocking the event loop. Each
+    attempt is bounded by ``timeout`` seconds and failed attempts are
+    retried with jittered exponential backoff. Set ``base_url`` (or
+    GROQ_BASE_URL) to point the client at a local stub server.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        model: str,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 8,
+        timeout: float = 60.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 8.0,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max(1, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._client: Optional[AsyncGroq] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def _get_client(self) -> AsyncGroq:
+        if self._client is None:
+            self._client = AsyncGroq(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=0,  # retries are handled in complete_json
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_concurrency,
+                        max_keepalive_connections=self.max_concurrency,
+                    )
+                ),
+            )
+        return self._client
+
+    async def _create(self, messages: List[Dict], temperature: float) -> str:
+        async with self._semaphore:
+            self.in_flight += 1
+            self.calls += 1
+            try:
+                completion = await asyncio.wait_for(
+                    self._get_client().chat.completions.create(
+                        messages=messages,
+                        temperature=temperature,
+                        model=self.model,
+                    ),
+                    timeout=self.timeout,
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"LLM call timed out after {self.timeout}s")
+            finally:
+                self.in_flight -= 1
+        if completion.usage is not None:
+            self.prompt_tokens += completion.usage.prompt_tokens or 0
+            self.completion_tokens += completion.usage.completion_tokens or 0
+        return completion.choices[0].message.content
+
+    async def stream(
+        self, messages: List[Dict], temperature: float = 0.1
+    ) -> AsyncIterator[str]:
+        """Yield the completion text as it is generated.
+
+        Makes a single attempt: a failure raises LLMError and callers that
+        need retries fall back to ``complete_json``.
+        """
+        async with self._semaphore:
+            self.in_flight += 1
+            self.calls += 1
+            try:
+                completion = await asyncio.wait_for(
+                    self._get_client().chat.completions.create(
+                        messages=messages,
+                        temperature=temperature,
+                        model=self.model,
+                        stream=True,
+                    ),
+                    timeout=self.timeout,
+                )
+                async for chunk in completion:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+            except asyncio.TimeoutError:
+                raise LLMError(f"LLM stream timed out after {self.timeout}s")
+            except Exception as e:
+                raise LLMError(f"LLM stream failed: {e}")
+            finally:
+                self.in_flight -= 1
+
+    async def complete_json(
+        self, messages: List[Dict], temperature: float = 0.1
+    ) -> Dict:
+        """Request a completion and parse it as JSON, retrying on failure"""
+        for attempt in range(self.max_retries):
+            try:
+                content = await self._create(messages, temperature)
+                return parse_json_content(content)
+
+            except json.JSONDecodeError as json_err:
+                error = f"Invalid JSON from LLM after {self.max_retries} attempts: {json_err}"
+            except Exception as e:
+                error = f"LLM API failed after {self.max_retries} attempts: {str(e)}"
+
+            if attempt < self.max_retries - 1:
+                self.retries += 1
+                await asyncio.sleep(
+                    backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                )
+
+        self.failures += 1
+        raise LLMError(error)
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
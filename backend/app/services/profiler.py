@@ -0,0 +1,215 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.util import hash_pandas_object
+
+APPROXIMATE_ROWS = 2_000_000
+DISTINCT_SAMPLE_BITS = 6
+MIN_DISTINCT_SAMPLE = 10_000
+MEMORY_SAMPLE_ROWS = 10_000
+INFER_SAMPLE_ROWS = 1_000
+# Rows whose 64-bit hashes collide are rehashed with this second key
+_SECOND_HASH_KEY = "profile-hash-key"  # 16 bytes, as pandas requires
+
+
+def count_distinct(hashes: np.ndarray) -> int:
+    """Exact number of distinct 64-bit hashes (sort-based, no hash table)"""
+    if len(hashes) == 0:
+        return 0
+    ordered = np.sort(hashes)
+    return int(np.count_nonzero(ordered[1:] != ordered[:-1])) + 1
+
+
+def approx_distinct(hashes: np.ndarray, sample_bits: int = DISTINCT_SAMPLE_BITS) -> int:
+    """Estimate distinct hashes by counting only those in the lowest 1/2^bits
+    of the hash space and scaling up (distinct sampling).
+
+    Every occurrence of a value lands on the same side of the threshold, so
+    the sample is unbiased regardless of how often values repeat. When the
+    sample is too small to be accurate it is retaken from the largest slice
+    of the hash space that is still expected to hold MIN_DISTINCT_SAMPLE
+    values, and columns with too few values even for that are counted
+    exactly with a hash table, which stays small, instead of sorting every
+    hash.
+    """
+    sampled = count_distinct(hashes[hashes <= _sample_threshold(sample_bits)])
+    if sampled >= MIN_DISTINCT_SAMPLE:
+        return sampled << sample_bits
+    bits = ((sampled << sample_bits) // MIN_DISTINCT_SAMPLE).bit_length() - 1
+    if bits <= 0:
+        return len(pd.unique(hashes))
+    return count_distinct(hashes[hashes <= _sample_threshold(bits)]) << bits
+
+
+def _sample_threshold(sample_bits: int) -> np.uint64:
+    return np.uint64(np.iinfo(np.uint64).max >> sample_bits)
+
+
+def _inferred_type(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "boolean"
+    if pd.api.types.is_numeric_dtype(series):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return "categorical"
+    return pd.api.types.infer_dtype(series.iloc[:INFER_SAMPLE_ROWS], skipna=True)
+
+
+def count_duplicates(row_hashes: np.ndarray) -> int:
+    """Number of rows that repeat an earlier row, from per-row hashes"""
+    if len(row_hashes) == 0:
+        return 0
+    return len(row_hashes) - count_distinct(row_hashes)
+
+
+def _duplicate_rows(df: pd.DataFrame, row_hash: np.ndarray) -> int:
+    """Duplicate rows, with repeated 64-bit row hashes checked on 128 bits.
+
+    Rows whose combined hash repeats are hashed again with a second key,
+    as the streaming cleaner's dedup does, so distinct rows only count as
+    duplicates when both 64-bit hashes collide.
+    """
+    if count_duplicates(row_hash) == 0:
+        return 0
+    order = np.argsort(row_hash, kind="stable")
+    ordered = row_hash[order]
+    same = ordered[1:] == ordered[:-1]
+    repeated = np.zeros(len(ordered), dtype=bool)
+    repeated[1:] |= same
+    repeated[:-1] |= same
+    candidates = np.sort(order[repeated])
+
+    first = row_hash[candidates]
+    second = hash_pandas_object(
+        df.take(candidates), index=False, hash_key=_SECOND_HASH_KEY
+    ).to_numpy()
+    pairs = np.lexsort((second, first))
+    first, second = first[pairs], second[pairs]
+    distinct = 1 + int(
+        np.count_nonzero((first[1:] != first[:-1]) | (second[1:] != second[:-1]))
+    )
+    return len(candidates) - distinct
+
+
+def _strictly_increasing(series: pd.Series) -> bool:
+    if len(series) < 2 or not pd.api.types.is_integer_dtype(series):
+        return False
+    values = series.to_numpy()
+    return bool(np.all(values[1:] > values[:-1]))
+
+
+def _scalar(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+def _memory_usage(df: pd.DataFrame, approximate: bool) -> int:
+    if not approximate or len(df) <= MEMORY_SAMPLE_ROWS:
+        return int(df.memory_usage(deep=True).sum())
+    # Extrapolate the deep size of object columns from a sample
+    positions = np.random.default_rng(0).integers(0, len(df), MEMORY_SAMPLE_ROWS)
+    sample = df.take(positions)
+    scale = len(df) / MEMORY_SAMPLE_ROWS
+    shallow = df.memory_usage(deep=False)
+    sampled = sample.memory_usage(deep=True)
+    total = int(shallow["Index"])
+    for col in df.columns:
+        if pd.api.types.is_string_dtype(df[col].dtype):
+            total += int(sampled[col] * scale)
+        else:
+            total += int(shallow[col])
+    return total
+
+
+def profile_dataframe(df: pd.DataFrame, approximate: Optional[bool] = None) -> Dict:
+    """Compute per-column data-quality statistics in one vectorized pass.
+
+    Every column is hashed once; the hashes give its distinct count and are
+    combined into a single row hash for the duplicate count, and the rows
+    whose row hashes repeat are rehashed to compare them on 128 bits. In
+    approximate mode (default for frames over APPROXIMATE_ROWS rows)
+    distinct counts are estimated by sampling the hash space and the deep
+    memory size is extrapolated from a row sample. Null counts stay exact,
+    and duplicate counts are exact barring 128-bit hash collisions.
+    """
+    if approximate is None:
+        approximate = len(df) > APPROXIMATE_ROWS
+
+    rows = len(df)
+    row_hash = np.zeros(rows, dtype=np.uint64)
+    has_key_column = False
+    columns = {}
+
+    for position, col in enumerate(df.columns):
+        series = df.iloc[:, position]
+        hashes = hash_pandas_object(series, index=False).to_numpy()
+        row_hash = (row_hash * np.uint64(1_000_003)) ^ hashes
+
+        null_mask = series.isna().to_numpy()
+        null_count = int(null_mask.sum())
+        valid = hashes if null_count == 0 else hashes[~null_mask]
+        distinct = approx_distinct(valid) if approximate else count_distinct(valid)
+        has_key_column = has_key_column or (
+            null_count == 0 and _strictly_increasing(series)
+        )
+
+        stats = {
+            "dtype": str(series.dtype),
+            "inferred_type": _inferred_type(series),
+            "nulls": null_count,
+            "distinct": int(distinct),
+            "min": None,
+            "max": None,
+        }
+        if rows > null_count and (
+            pd.api.types.is_numeric_dtype(series)
+            or pd.api.types.is_datetime64_any_dtype(series)
+        ):
+            stats["min"] = series.min()
+            stats["max"] = series.max()
+            if pd.api.types.is_datetime64_any_dtype(series):
+                stats["min"], stats["max"] = str(stats["min"]), str(stats["max"])
+            else:
+                stats["min"], stats["max"] = _scalar(stats["min"]), _scalar(
+                    stats["max"]
+                )
+        columns[col] = stats
+
+    return {
+        "rows": rows,
+        "columns": columns,
+        # A strictly increasing column (e.g. an id) rules out duplicate rows
+        "duplicates": 0 if has_key_column else _duplicate_rows(df, row_hash),
+        "memory_usage": _memory_usage(df, approximate),
+        "approximate": approximate,
+    }
+
+
+class ProfileCache:
+    """Memoizes profiles per dataset version (path + file signature)"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self, version: Hashable, df: pd.DataFrame, approximate: Optional[bool] = None
+    ) -> Dict:
+        key = (version, approximate)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        profile = profile_dataframe(df, approximate)
+
+        with self._lock:
+            self._entries[key] = profile
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return profile
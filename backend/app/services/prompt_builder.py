@@ -0,0 +1,391 @@
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+# Roughly one BPE token per word, number or punctuation mark
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_WORD_PATTERN = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+_STOPWORDS = set(
+    "a an and are by for from how in is me of on per show the to what which with".split()
+)
+EXAMPLE_ROWS = 1000
+# Sample rows show only the most relevant columns and use at most this
+# share of the budget
+SAMPLE_COLUMNS = 12
+SAMPLE_BUDGET_SHARE = 0.25
+SAMPLE_DECIMALS = 6
+# The dtype pd.read_csv gives text: ``object`` on pandas 2, ``str`` on 3
+_TEXT_DTYPE = str(pd.Series(["text"]).dtype)
+
+_PROMPT_TEMPLATE = """
+You are an expert business data analyst. Analyze this DataFrame and provide actionable business insights with Recharts.js configuration:
+
+COLUMNS (name: dtype, distinct values, nulls, range, examples):
+{schema}
+SAMPLE DATA: {sample}
+USER QUESTION: {question}
+
+Return your response as STRICTLY VALID JSON parsable by `json.loads()`. Use this format:
+
+{{
+  "charts": [
+    {{
+      "@CODE_FIELD@",
+      "recharts_config": {{
+        "type": "BarChart|LineChart|PieChart",
+        "dataKey": "value",
+        "xAxisKey": "category",
+        "yAxisKey": "value",
+        "colors": ["#0088FE", "#00C49F", "#FFBB28", "#FF8042"],
+        "title": "Chart Title",
+        "components": {{
+          "XAxis": {{"dataKey": "category"}},
+          "YAxis": {{}},
+          "CartesianGrid": {{"strokeDasharray": "3 3"}},
+          "Tooltip": {{}},
+          "Legend": {{}},
+          "Bar": {{"dataKey": "value", "fill": "#8884d8"}}
+        }}
+      }},
+      "explanation": "Detailed business analysis with specific findings and implications",
+      "insights": ["Actionable recommendation with specific numbers and next steps", "Strategic insight with clear business impact and suggested actions"]
+    }}
+  ]
+}}
+
+@CODE_INSTRUCTIONS@
+
+RECHARTS CONFIG INSTRUCTIONS:
+- Choose appropriate chart type: BarChart for comparisons, LineChart for trends, PieChart for proportions
+- Set proper dataKey values that match your data structure
+- For BarChart: include Bar component with dataKey and fill color
+- For LineChart: include Line component with dataKey, stroke color, and strokeWidth
+- For PieChart: include Pie component with dataKey, cx, cy, outerRadius, fill, and label
+- Always include Tooltip and Legend components
+- Use meaningful colors from the provided palette
+
+RECHARTS COMPONENT EXAMPLES:
+
+For BarChart:
+{{
+  "type": "BarChart",
+  "components": {{
+    "XAxis": {{"dataKey": "category"}},
+    "YAxis": {{}},
+    "CartesianGrid": {{"strokeDasharray": "3 3"}},
+    "Tooltip": {{}},
+    "Legend": {{}},
+    "Bar": {{"dataKey": "value", "fill": "#8884d8"}}
+  }}
+}}
+
+For LineChart:
+{{
+  "type": "LineChart",
+  "components": {{
+    "XAxis": {{"dataKey": "category"}},
+    "YAxis": {{}},
+    "CartesianGrid": {{"strokeDasharray": "3 3"}},
+    "Tooltip": {{}},
+    "Legend": {{}},
+    "Line": {{"type": "monotone", "dataKey": "value", "stroke": "#8884d8", "strokeWidth": 2}}
+  }}
+}}
+
+For PieChart:
+{{
+  "type": "PieChart",
+  "components": {{
+    "Tooltip": {{}},
+    "Legend": {{}},
+    "Pie": {{"dataKey": "value", "cx": "50%", "cy": "50%", "outerRadius": 80, "fill": "#8884d8", "label": true}}
+  }}
+}}
+
+EXPLANATION REQUIREMENTS - Write like a business consultant:
+- Start with the key finding: "Analysis reveals..." or "The data shows..."
+- Include specific numbers, percentages, and comparisons
+- Explain what this means for the business (revenue impact, efficiency, risks)
+- Be detailed but focused on business implications
+- Minimum 50 words, avoid generic statements
+
+INSIGHTS REQUIREMENTS - Each insight must be a complete actionable recommendation:
+- Start with a specific action: "Increase marketing spend for...", "Prioritize inventory for...", "Investigate the decline in..."
+- Include the business rationale with numbers
+- Suggest next steps or metrics to monitor
+- Make each insight 30-50 words
+- Focus on decisions executives can act on
+
+CRITICAL: Do not wrap the JSON in markdown code blocks (```). Do not include any markdown, explanations, or extra text. Output ONLY the raw JSON object starting with {{ and ending with }}."""
+
+_CODE_FIELDS = {
+    "pandas": (
+        '"pandas_code": "Pandas code that processes the data and ends with result variable"',
+        """CRITICAL INSTRUCTIONS for pandas_code:
+- Write pandas code that processes the data and ends with: result = final_dataframe
+- The result must be a DataFrame with EXACTLY 2 columns: 'category' and 'value'
+- 'category' contains labels (product names, dates, categories) - NOT indices
+- 'value' contains numeric data for visualization
+- Example: result = df.groupby('Product')['Revenue'].sum().reset_index(); result.columns = ['category', 'value']""",
+    ),
+    "sql": (
+        '"sql_query": "One SQL SELECT over the table data returning category and value columns"',
+        """CRITICAL INSTRUCTIONS for sql_query:
+- Write ONE DuckDB SQL SELECT statement that reads from the table named data
+- Quote column names with double quotes exactly as listed, e.g. "Order Date"
+- The query must return EXACTLY 2 columns aliased category and value
+- category contains labels (product names, dates, categories) - NOT row numbers
+- value contains numeric data for visualization
+- Example: SELECT "Product" AS category, SUM("Revenue") AS value FROM data GROUP BY 1 ORDER BY 2 DESC""",
+    ),
+}
+# One /ask template per engine; they differ only in the code they ask for
+PROMPT_TEMPLATES = {
+    engine: _PROMPT_TEMPLATE.replace('"@CODE_FIELD@"', field).replace(
+        "@CODE_INSTRUCTIONS@", instructions
+    )
+    for engine, (field, instructions) in _CODE_FIELDS.items()
+}
+ASK_PROMPT_TEMPLATE = PROMPT_TEMPLATES["pandas"]
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count without a model-specific tokenizer"""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def _words(text: str) -> Set[str]:
+    return {
+        word.lower()
+        for word in _WORD_PATTERN.findall(str(text))
+        if word.lower() not in _STOPWORDS
+    }
+
+
+def _truncate(value, max_chars: int):
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[: max_chars - 1] + "…"
+    return value
+
+
+def _format_number(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+class PromptBuilder:
+    """Builds the /ask prompt within a token budget.
+
+    Instead of the raw column list, each column is described by one compact
+    schema line (dtype, distinct count, nulls, min/max, example values)
+    taken from the cached profile. Columns whose names or example values
+    share words with the question come first: as many columns as the
+    budget has room for are kept, the rest are dropped (and counted), and
+    the kept ones get schema lines in that order while the budget lasts,
+    then only their names. Columns the question refers to always get a
+    schema line, at the expense of the least relevant names. Sample rows cover the
+    most relevant columns only, with long cells truncated. The template
+    and question are never pruned: when they alone exceed the budget the
+    prompt holds no columns and its report is flagged ``over_budget``.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 6000,
+        max_cell_chars: int = 40,
+        max_examples: int = 3,
+        sample_rows: int = 3,
+    ):
+        self.token_budget = token_budget
+        self.max_cell_chars = max_cell_chars
+        self.max_examples = max_examples
+        self.sample_rows = sample_rows
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.pruned_requests = 0
+        self.over_budget_requests = 0
+
+    def build(
+        self, df: pd.DataFrame, profile: Dict, question: str, engine: str = "pandas"
+    ) -> Tuple[str, Dict]:
+        """Return the prompt asking for engine's code, and a report of its
+        token count and pruning"""
+        template = PROMPT_TEMPLATES[engine]
+        # Columns are handled by position so duplicate names stay distinct
+        names = [str(col) for col in df.columns]
+        stats = [profile["columns"].get(col, {}) for col in df.columns]
+        examples = self._examples(df, stats)
+        scores = self._scores(names, examples, question)
+        # Most relevant first, ties in table order
+        ordered = sorted(range(len(names)), key=lambda position: -scores[position])
+        fixed = estimate_tokens(
+            template.format(schema="", sample="", question=question)
+        )
+        # Keep room for the "Other columns" and "more columns" notes
+        available = max(self.token_budget - fixed - 16, 0)
+
+        sample, sample_count = "[]", 0
+        sample_positions = ordered[:SAMPLE_COLUMNS]
+        for count in range(min(self.sample_rows, len(df)), 0, -1):
+            candidate = self._sample(df, sample_positions, count)
+            if estimate_tokens(candidate) <= available * SAMPLE_BUDGET_SHARE:
+                sample, sample_count = candidate, count
+                available -= estimate_tokens(candidate)
+                break
+
+        # The most relevant columns that fit get at least their name...
+        name_costs = [estimate_tokens(name) + 1 for name in names]
+        listed, used = [], 0
+        for position in ordered:
+            if used + name_costs[position] > available:
+                break
+            listed.append(position)
+            used += name_costs[position]
+
+        # ...and then, in the same order, a schema line in place of the name.
+        # Columns the question refers to push the least relevant names out
+        lines, described = [], set()
+        for index, position in enumerate(listed):
+            line = self._schema_line(
+                names[position], stats[position], examples.get(position)
+            )
+            cost = estimate_tokens(line) - name_costs[position]
+            while (
+                used + cost > available
+                and scores[position]
+                and len(listed) > index + 1
+            ):
+                used -= name_costs[listed.pop()]
+            if used + cost > available:
+                break
+            lines.append(line)
+            described.add(position)
+            used += cost
+
+        named = [names[position] for position in sorted(set(listed) - described)]
+        omitted = len(names) - len(listed)
+        if named:
+            lines.append("Other columns: " + ", ".join(named))
+        if omitted:
+            lines.append(f"(+{omitted} more columns not shown)")
+
+        prompt = template.format(
+            schema="\n".join(lines), sample=sample, question=question
+        )
+        prompt_tokens = estimate_tokens(prompt)
+        report = {
+            "prompt_tokens": prompt_tokens,
+            "token_budget": self.token_budget,
+            "over_budget": prompt_tokens > self.token_budget,
+            "columns": len(df.columns),
+            "described_columns": len(described),
+            "named_columns": len(named),
+            "omitted_columns": omitted,
+            "sample_rows": sample_count,
+        }
+        self._record(report)
+        return prompt, report
+
+    def _scores(self, names: List[str], examples: Dict, question: str) -> List[int]:
+        """Relevance of each column to the question, by position (0: unrelated)"""
+        question_words = _words(question)
+        lowered = question.lower()
+        scores = []
+        for position, name in enumerate(names):
+            name_words = _words(name)
+            score = 2 * len(name_words & question_words)
+            score += sum(
+                1
+                for word in name_words - question_words
+                if len(word) >= 3
+                and any(
+                    q.startswith(word) or word.startswith(q) for q in question_words
+                )
+            )
+            if len(name) >= 3 and name.lower() in lowered:
+                score += 2
+            if any(
+                isinstance(value, str) and value.lower() in lowered
+                for value in examples.get(position) or []
+            ):
+                score += 1
+            scores.append(score)
+        return scores
+
+    def _examples(self, df: pd.DataFrame, stats: List[Dict]) -> Dict[int, List]:
+        """A few distinct values of each non-numeric column, by position"""
+        head = df.head(EXAMPLE_ROWS)
+        examples = {}
+        for position, column_stats in enumerate(stats):
+            if column_stats.get("min") is not None:
+                continue  # numeric and datetime columns are described by their range
+            values = head.iloc[:, position].dropna()
+            examples[position] = [
+                _truncate(value, self.max_cell_chars)
+                for value in pd.unique(values.to_numpy())[: self.max_examples]
+            ]
+        return examples
+
+    def _schema_line(self, col, stats: Dict, examples: Optional[List]) -> str:
+        dtype = stats.get("dtype", "unknown")
+        parts = [
+            # The sandbox hands generated code category columns as text
+            _TEXT_DTYPE if dtype == "category" else dtype,
+            f"{stats.get('distinct', '?')} distinct",
+        ]
+        if stats.get("nulls"):
+            parts.append(f"{stats['nulls']} nulls")
+        if stats.get("min") is not None:
+            parts.append(
+                f"{_format_number(stats['min'])}..{_format_number(stats['max'])}"
+            )
+        if examples:
+            parts.append("e.g. " + ", ".join(repr(value) for value in examples))
+        return f"- {col}: " + "; ".join(parts)
+
+    def _sample(self, df: pd.DataFrame, positions: List[int], rows: int) -> str:
+        head = df.head(rows).iloc[:, sorted(positions)]
+        for position in range(len(head.columns)):
+            if pd.api.types.is_string_dtype(head.iloc[:, position].dtype):
+                head.isetitem(
+                    position,
+                    head.iloc[:, position].map(
+                        lambda value: _truncate(value, self.max_cell_chars)
+                    ),
+                )
+        return head.to_json(
+            orient="records",
+            date_format="iso",
+            double_precision=SAMPLE_DECIMALS,
+            default_handler=str,
+        )
+
+    def _record(self, report: Dict) -> None:
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += report["prompt_tokens"]
+            self.max_prompt_tokens = max(
+                self.max_prompt_tokens, report["prompt_tokens"]
+            )
+            if report["omitted_columns"] or report["named_columns"]:
+                self.pruned_requests += 1
+            if report["over_budget"]:
+                self.over_budget_requests += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "token_budget": self.token_budget,
+                "avg_prompt_tokens": (
+                    round(self.prompt_tokens / self.requests) if self.requests else 0
+                ),
+                "max_prompt_tokens": self.max_prompt_tokens,
+                "pruned_requests": self.pruned_requests,
+                "over_budget_requests": self.over_budget_requests,
+            }
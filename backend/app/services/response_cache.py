@@ -0,0 +1,291 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+import pandas as pd
+
+from app.services.db import connect
+
+_STOPWORDS = {"a", "an", "the", "of", "for", "in", "on", "me", "show", "please"}
+
+
+# Numbers keep their sign, decimals and percent; any other symbol is a token
+_TOKEN = re.compile(r"[-+]?\d[\d.,]*%?|\w+|[^\w\s]")
+
+
+def normalize_question(question: str) -> str:
+    """Casefold, collapse whitespace and drop trailing punctuation.
+
+    Operators, signs and percent signs are kept: "amount > 100" and
+    "amount < 100" are different questions.
+    """
+    return " ".join(question.casefold().split()).rstrip(" ?!.,;:")
+
+
+def question_tokens(normalized: str) -> Set[str]:
+    return {token for token in _TOKEN.findall(normalized) if token not in _STOPWORDS}
+
+
+def dataset_fingerprint(df: pd.DataFrame, sample_rows: int = 3) -> str:
+    """Hash the parts of a dataset the LLM sees: schema and sample rows"""
+    payload = {
+        "columns": [str(col) for col in df.columns],
+        "dtypes": df.dtypes.astype(str).tolist(),
+        "sample": df.head(sample_rows).to_json(orient="records"),
+    }
+    return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    """Hash only column names and dtypes: files with the same layout share it"""
+    payload = {
+        "columns": [str(col) for col in df.columns],
+        "dtypes": df.dtypes.astype(str).tolist(),
+    }
+    return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Persistent /ask response cache keyed by dataset fingerprint + question.
+
+    Each entry holds the chart the LLM produced and, when available, the
+    full response computed for a specific ``data_version`` of the file,
+    kept as the encoded JSON bytes so a hit is sent without re-encoding.
+    Lookups first try the exact normalized question and then, if a
+    ``similarity_threshold`` is given, the most similar cached question for
+    the same dataset by token Jaccard similarity. Questions whose numbers
+    differ never match fuzzily, and a fuzzy hit returns only the chart (a
+    plan to re-run and validate), never the stored response.
+    Entries expire after ``ttl_seconds``: lookups skip them and writes
+    delete them. The least recently used are evicted beyond
+    ``max_entries``.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_entries: int = 10_000,
+        ttl_seconds: float = 7 * 24 * 3600,
+        similarity_threshold: Optional[float] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._warmed: Set[str] = set()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = connect(db_path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                fingerprint TEXT NOT NULL,
+                question TEXT NOT NULL,
+                chart_data TEXT NOT NULL,
+                response TEXT,
+                data_version TEXT,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (fingerprint, question)
+            )
+            """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)"
+        )
+
+    def get(self, fingerprint: str, question: str) -> Optional[Dict]:
+        """Return the best cached entry for a question, or None"""
+        normalized = normalize_question(question)
+        now = time.time()
+        cutoff = now - self.ttl_seconds
+
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT * FROM responses
+                WHERE fingerprint = ? AND question = ? AND created_at >= ?
+                """,
+                (fingerprint, normalized, cutoff),
+            ).fetchone()
+
+            fuzzy = False
+            if row is None and self.similarity_threshold:
+                row = self._most_similar(fingerprint, normalized, cutoff)
+                fuzzy = row is not None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE fingerprint = ? AND question = ?",
+                (now, fingerprint, row["question"]),
+            )
+            self.hits += 1
+            if fuzzy:
+                self.fuzzy_hits += 1
+
+        return {
+            "question": row["question"],
+            "chart_data": json.loads(row["chart_data"]),
+            # A different question's response is never replayed as this one's
+            "response": (
+                row["response"].encode("utf-8")
+                if row["response"] and not fuzzy
+                else None
+            ),
+            "data_version": row["data_version"],
+            "fuzzy": fuzzy,
+        }
+
+    def put(
+        self,
+        fingerprint: str,
+        question: str,
+        chart_data: Dict,
+        response: Optional[bytes] = None,
+        data_version: Optional[str] = None,
+    ) -> None:
+        """Store a chart and, optionally, the encoded JSON response built from it"""
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO responses
+                    (fingerprint, question, chart_data, response, data_version,
+                     created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    fingerprint,
+                    normalize_question(question),
+                    json.dumps(chart_data),
+                    response.decode("utf-8") if response is not None else None,
+                    data_version,
+                    now,
+                    now,
+                ),
+            )
+            self._evict()
+
+    def delete(self, fingerprint: str, question: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM responses WHERE fingerprint = ? AND question = ?",
+                (fingerprint, normalize_question(question)),
+            )
+
+    def needs_warming(self, fingerprint: str) -> bool:
+        with self._lock:
+            return fingerprint not in self._warmed
+
+    def warm(
+        self, fingerprint: str, entries: Iterable[Dict], code_field: str = "pandas_code"
+    ) -> int:
+        """Seed chart_data from past question -> code history entries.
+
+        Only entries whose ``code_field`` is set are used, so answers of one
+        engine never seed another's cache. Existing entries are left
+        untouched. Returns the number inserted.
+        """
+        now = time.time()
+        inserted = 0
+        with self._lock:
+            self._warmed.add(fingerprint)
+            self._purge_expired(now)
+            for entry in entries:
+                chart_data = {
+                    key: entry[key]
+                    for key in (
+                        code_field,
+                        "recharts_config",
+                        "explanation",
+                        "insights",
+                    )
+                    if key in entry
+                }
+                if (
+                    "question" not in entry
+                    or len(chart_data) < 4
+                    or chart_data[code_field] is None
+                ):
+                    continue
+                cursor = self._conn.execute(
+                    """
+                    INSERT OR IGNORE INTO responses
+                        (fingerprint, question, chart_data, created_at, last_access)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (
+                        fingerprint,
+                        normalize_question(entry["question"]),
+                        json.dumps(chart_data),
+                        now,
+                        now,
+                    ),
+                )
+                inserted += cursor.rowcount
+            self._evict()
+        return inserted
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _most_similar(self, fingerprint: str, normalized: str, cutoff: float):
+        tokens = question_tokens(normalized)
+        numbers = _numbers(tokens)
+        best, best_score = None, 0.0
+        for row in self._conn.execute(
+            "SELECT * FROM responses WHERE fingerprint = ? AND created_at >= ?",
+            (fingerprint, cutoff),
+        ):
+            candidate = question_tokens(row["question"])
+            if not tokens or not candidate or _numbers(candidate) != numbers:
+                continue
+            score = len(tokens & candidate) / len(tokens | candidate)
+            if score > best_score:
+                best, best_score = row, score
+        if best is not None and best_score >= self.similarity_threshold:
+            return best
+        return None
+
+    def _purge_expired(self, now: float) -> None:
+        self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+
+    def _evict(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                """
+                DELETE FROM responses WHERE rowid IN (
+                    SELECT rowid FROM responses ORDER BY last_access LIMIT ?
+                )
+                """,
+                (overflow,),
+            )
+            self.evictions += overflow
+
+
+def _numbers(tokens: Set[str]) -> List[str]:
+    return sorted(token for token in tokens if any(c.isdigit() for c in token))
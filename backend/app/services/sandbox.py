@@ -0,0 +1,350 @@
+import multiprocessing
+import os
+import queue
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.aggregate_cube import AggregateCube
+from app.services.columnar import read_dataset
+from app.services.dataframe_cache import enable_copy_on_write
+from app.services.dtype_optimizer import without_categories
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+
+class SandboxError(Exception):
+    """Raised when generated code fails inside the sandbox"""
+
+
+class SandboxTimeout(SandboxError):
+    pass
+
+
+class SandboxMemoryError(SandboxError):
+    pass
+
+
+def run_code(code: str, df: pd.DataFrame, cube: Optional[AggregateCube] = None):
+    """Execute generated pandas code against df and return its ``result``.
+
+    The code gets a shallow copy; with copy-on-write enabled it shares df's
+    buffers and any column it modifies is copied on first write. Lookups
+    that analysis rewrote to the aggregate cube read it as ``_cube``.
+    """
+    safe_locals = {"df": df.copy(deep=False), "_cube": cube}
+    exec(code, {"pd": pd, "np": np}, safe_locals)
+    return safe_locals.get("result")
+
+
+def _apply_memory_limit(limit_bytes: Optional[int]) -> None:
+    # RLIMIT_DATA caps heap and private mappings, not the shared read-only
+    # mapping of the sidecar file. Only the columns read_dataset hands out as
+    # views of that mapping are free; whatever it copies on load (strings,
+    # columns with nulls, multi-batch sidecars) is charged to the worker
+    if limit_bytes and resource is not None and hasattr(resource, "RLIMIT_DATA"):
+        resource.setrlimit(resource.RLIMIT_DATA, (limit_bytes, limit_bytes))
+
+
+def _worker_main(conn, memory_limit: Optional[int], max_datasets: int) -> None:
+    enable_copy_on_write()
+    _apply_memory_limit(memory_limit)
+    datasets: "OrderedDict[Tuple, pd.DataFrame]" = OrderedDict()
+    cubes: "OrderedDict[Tuple, AggregateCube]" = OrderedDict()
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+
+        try:
+            # Only this query's columns are cast back to plain values
+            df = without_categories(_load(datasets, max_datasets, task))
+            cube = _load_cube(cubes, max_datasets, task.get("cube_path"))
+        except MemoryError:
+            conn.send(("load_memory", None))
+            return
+        except Exception as e:
+            conn.send(("error", str(e)))
+            continue
+
+        try:
+            # The code's time limit starts once its data is in memory
+            conn.send(("loaded", None))
+            result = run_code(task["code"], df, cube)
+            if result is None:
+                conn.send(("missing", None))
+            elif not isinstance(result, (pd.DataFrame, pd.Series)):
+                conn.send(("unsupported", None))
+            else:
+                conn.send(("ok", result))
+        except MemoryError:
+            conn.send(("memory", None))
+            return
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+def _load(datasets: "OrderedDict[Tuple, pd.DataFrame]", max_datasets: int, task):
+    """The task's dataset, reading only its columns unless the full frame is cached.
+
+    Frames are cached with their ``category`` columns, which is what keeps
+    a worker's copy of a dataset small.
+    """
+    full_key = (task["path"], task["signature"], None)
+    columns = task.get("columns")
+    key = full_key if columns is None else full_key[:2] + (tuple(columns),)
+    df = datasets.get(key)
+    if df is None and key != full_key and full_key in datasets:
+        return datasets[full_key][columns]
+    if df is None:
+        df = read_dataset(task["path"], columns, task.get("load_schema"))
+        datasets[key] = df
+        while len(datasets) > max_datasets:
+            datasets.popitem(last=False)
+    datasets.move_to_end(key)
+    return df
+
+
+def _load_cube(
+    cubes: "OrderedDict[Tuple, AggregateCube]", max_cubes: int, path: Optional[str]
+) -> Optional[AggregateCube]:
+    if path is None:
+        return None
+    key = (path, os.stat(path).st_mtime_ns)
+    cube = cubes.get(key)
+    if cube is None:
+        cube = AggregateCube.load(path)
+        cubes[key] = cube
+        while len(cubes) > max_cubes:
+            cubes.popitem(last=False)
+    cubes.move_to_end(key)
+    return cube
+
+
+class _Worker:
+    def __init__(self, context, memory_limit: Optional[int], max_datasets: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit, max_datasets),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class SandboxPool:
+    """Pool of pre-warmed worker processes that run generated pandas code.
+
+    Each worker imports pandas once and then serves tasks one at a time.
+    Datasets are read by the worker itself from the memory-mapped columnar
+    sidecar (or the CSV), keyed by file signature, so frames are never
+    pickled across the pipe; only the (small) result comes back. Numeric
+    columns the sidecar maps without a copy are shared by all workers, but
+    string columns and anything else ``read_dataset`` copies are held by
+    each worker separately, so a worker keeps at most ``max_datasets``
+    frames (one by default) on top of the API's own cache. Loading
+    the dataset gets ``load_timeout`` seconds and the code then gets
+    ``timeout`` seconds of its own. A task that runs past either or exceeds
+    ``memory_limit`` bytes kills its worker, which is replaced with a fresh
+    one.
+
+    With ``size=0`` code runs inline in the calling thread instead, against
+    the frame returned by ``loader``.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        timeout: float = 30.0,
+        load_timeout: float = 120.0,
+        memory_limit: Optional[int] = None,
+        max_datasets: int = 1,
+        loader: Callable[[str], pd.DataFrame] = read_dataset,
+    ):
+        self.size = size
+        self.loader = loader
+        self.timeout = timeout
+        self.load_timeout = load_timeout
+        self.memory_limit = memory_limit
+        self.max_datasets = max_datasets
+        self._cubes: "OrderedDict[Tuple, AggregateCube]" = OrderedDict()
+        self._cube_lock = threading.Lock()
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._started = False
+        # run() is called from many threads; guards the counters below
+        self._stats_lock = threading.Lock()
+        self.tasks = 0
+        self.timeouts = 0
+        self.memory_kills = 0
+        self.crashes = 0
+
+    def start(self) -> None:
+        """Spawn the workers if they are not running yet"""
+        with self._start_lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+            self._started = True
+
+    def shutdown(self) -> None:
+        with self._start_lock:
+            while True:
+                try:
+                    self._idle.get_nowait().kill()
+                except queue.Empty:
+                    break
+            self._started = False
+
+    def run(
+        self,
+        path: str,
+        signature: Tuple,
+        code: str,
+        columns: Optional[List[str]] = None,
+        load_schema: Optional[Dict[str, str]] = None,
+        cube_path: Optional[str] = None,
+    ):
+        """Run code against the dataset stored at path, blocking until done.
+
+        With ``columns``, only those columns are loaded (and visible to the
+        code). Workers cast what they read to ``load_schema``, so the code
+        sees the same dtypes as frames from ``loader``, except that
+        ``category`` columns are handed over as plain strings in both modes.
+        ``cube_path`` is the aggregate cube of code whose group-bys were
+        rewritten to lookups.
+
+        Returns the DataFrame/Series bound to ``result``. Raises
+        SandboxError (or a subclass) when the code fails, and ValueError
+        when it does not produce a usable ``result``.
+        """
+        self._count("tasks")
+        if self.size <= 0:
+            return _check_result(*self._run_inline(path, code, columns, cube_path))
+
+        self.start()
+        worker = self._idle.get()
+        try:
+            try:
+                worker.conn.send(
+                    {
+                        "path": path,
+                        "signature": signature,
+                        "code": code,
+                        "columns": columns,
+                        "load_schema": load_schema,
+                        "cube_path": cube_path,
+                    }
+                )
+            except (OSError, EOFError):
+                # The worker died while idle
+                self._count("crashes")
+                worker = self._replace(worker)
+                raise SandboxError("AI code worker crashed")
+            status = None
+            for stage, timeout in (
+                ("Loading the dataset", self.load_timeout),
+                ("AI code", self.timeout),
+            ):
+                if not worker.conn.poll(timeout):
+                    self._count("timeouts")
+                    worker = self._replace(worker)
+                    raise SandboxTimeout(
+                        f"{stage} exceeded the time limit of {timeout:g}s"
+                    )
+                try:
+                    status, payload = worker.conn.recv()
+                except EOFError:
+                    self._count("crashes")
+                    worker = self._replace(worker)
+                    raise SandboxError("AI code worker crashed")
+                if status != "loaded":
+                    break
+
+            if status in ("memory", "load_memory"):
+                self._count("memory_kills")
+                worker = self._replace(worker)
+                if status == "load_memory":
+                    raise SandboxMemoryError(
+                        "Loading the dataset exceeded the sandbox memory limit"
+                    )
+                raise SandboxMemoryError("AI code exceeded the memory limit")
+            return _check_result(status, payload)
+        finally:
+            if not worker.process.is_alive():
+                worker = self._replace(worker)
+            self._idle.put(worker)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "workers": self.size,
+                "idle": self._idle.qsize(),
+                "tasks": self.tasks,
+                "timeouts": self.timeouts,
+                "memory_kills": self.memory_kills,
+                "crashes": self.crashes,
+            }
+
+    def _count(self, counter: str) -> None:
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._context, self.memory_limit, self.max_datasets)
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        return self._spawn()
+
+    def _run_inline(
+        self,
+        path: str,
+        code: str,
+        columns: Optional[List[str]],
+        cube_path: Optional[str],
+    ) -> Tuple[str, object]:
+        try:
+            df = self.loader(path)
+            with self._cube_lock:
+                cube = _load_cube(self._cubes, self.max_datasets, cube_path)
+            df = without_categories(df if columns is None else df[columns])
+            result = run_code(code, df, cube)
+        except Exception as e:
+            return "error", str(e)
+        if result is None:
+            return "missing", None
+        if not isinstance(result, (pd.DataFrame, pd.Series)):
+            return "unsupported", None
+        return "ok", result
+
+
+def _check_result(status: str, payload):
+    if status == "ok":
+        return payload
+    if status == "missing":
+        raise ValueError("No variable 'result' found in AI code output")
+    if status == "unsupported":
+        raise ValueError("Unsupported result format for charting")
+    raise SandboxError(payload)
+
+
+def default_pool_size() -> int:
+    return min(4, os.cpu_count() or 1)
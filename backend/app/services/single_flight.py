@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Coalesces concurrent identical requests into one computation.
+
+    ``run(endpoint, key, compute)`` starts ``compute()`` unless a call with
+    the same endpoint and key is already in flight, in which case it waits
+    for that call and shares its result (or exception). The computation
+    runs as its own task, so a caller that disconnects does not cancel it
+    for the others. Nothing is kept once the call finishes; this is not a
+    cache.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    async def run(
+        self, endpoint: str, key: Hashable, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        stats = self._stats.setdefault(
+            endpoint, {"requests": 0, "executions": 0, "coalesced": 0}
+        )
+        stats["requests"] += 1
+        flight_key = (endpoint, key)
+        call = self._calls.get(flight_key)
+        if call is not None:
+            stats["coalesced"] += 1
+        else:
+            stats["executions"] += 1
+            call = asyncio.ensure_future(compute())
+            self._calls[flight_key] = call
+            call.add_done_callback(lambda done: self._land(flight_key, done))
+        return await asyncio.shield(call)
+
+    def _land(self, flight_key: Tuple[str, Hashable], call: asyncio.Future) -> None:
+        if self._calls.get(flight_key) is call:
+            del self._calls[flight_key]
+        if not call.cancelled():
+            call.exception()  # Retrieved here so an unawaited failure is not logged
+
+    def stats(self) -> Dict:
+        endpoints = {}
+        for endpoint, counts in self._stats.items():
+            in_flight = sum(1 for name, _ in self._calls if name == endpoint)
+            endpoints[endpoint] = dict(
+                counts,
+                in_flight=in_flight,
+                coalesced_ratio=(
+                    round(counts["coalesced"] / counts["requests"], 3)
+                    if counts["requests"]
+                    else 0
+                ),
+            )
+        return {
+            "coalesced": sum(counts["coalesced"] for counts in self._stats.values()),
+            "endpoints": endpoints,
+        }
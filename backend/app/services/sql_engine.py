@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from app.services.columnar import has_fresh_sidecar, sidecar_path
+
+try:
+    import duckdb
+except ImportError:  # pragma: no cover - duckdb is optional
+    duckdb = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    feather = None
+
+
+# Generated queries read the dataset under this table name
+SQL_TABLE = "data"
+_BATCH_ROWS = 100_000
+
+
+class SQLError(Exception):
+    """Raised when a generated query is rejected or fails"""
+
+
+class SQLTimeout(SQLError):
+    pass
+
+
+def sql_available() -> bool:
+    return duckdb is not None
+
+
+class SQLEngine:
+    """Runs generated SQL on an embedded DuckDB over a stored dataset.
+
+    Each query gets its own cursor on a shared in-memory database, where
+    ``data`` is the dataset's memory-mapped Feather sidecar; without a
+    fresh sidecar it gets a connection of its own where ``data`` is a view
+    over the CSV itself. DuckDB scans it on ``threads`` cores,
+    pushes projections and filters into the scan, and spills to
+    ``spill_dir`` past ``memory_limit``. External access is switched off
+    before the query runs (only the dataset file stays readable), and only
+    a single SELECT statement is accepted. A query still setting up
+    ``data`` or running after ``timeout`` seconds is interrupted.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 30.0,
+        threads: Optional[int] = None,
+        memory_limit: Optional[str] = None,
+        spill_dir: Optional[str] = None,
+        max_result_rows: int = 1_000_000,
+    ):
+        self.timeout = timeout
+        self.threads = threads
+        self.memory_limit = memory_limit
+        self.spill_dir = spill_dir
+        self.max_result_rows = max_result_rows
+        self._lock = threading.Lock()
+        self._database = None
+        self.queries = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.sidecar_scans = 0
+        self.csv_scans = 0
+        self.total_ms = 0.0
+
+    def run(self, csv_path: str, sql: str) -> pd.DataFrame:
+        """Run sql against the dataset stored at csv_path.
+
+        Raises SQLError when the query is not a single SELECT, fails, or
+        returns more than ``max_result_rows`` rows, and SQLTimeout when it
+        is interrupted.
+        """
+        if duckdb is None:
+            raise SQLError("The SQL engine needs duckdb, which is not installed")
+
+        started = time.perf_counter()
+        con, sidecar = self._open(csv_path)
+        # The limit covers setting up ``data`` too: binding a view over a
+        # large CSV sniffs it, which can take as long as a query
+        timer = threading.Timer(self.timeout, con.interrupt)
+        timer.start()
+        try:
+            self._attach(con, csv_path, sidecar)
+            query = self._check(con, sql)
+            result = self._fetch(con.execute(query))
+        except duckdb.InterruptException:
+            self._count("timeouts")
+            raise SQLTimeout(f"SQL query exceeded the time limit of {self.timeout:g}s")
+        except duckdb.Error as e:
+            self._count("errors")
+            raise SQLError(str(e))
+        finally:
+            timer.cancel()
+            con.close()
+        with self._lock:
+            self.queries += 1
+            self.total_ms += (time.perf_counter() - started) * 1000
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            if self._database is not None:
+                self._database.close()
+                self._database = None
+
+    def _config(self) -> Dict:
+        config = {}
+        if self.threads:
+            config["threads"] = self.threads
+        if self.memory_limit:
+            config["memory_limit"] = self.memory_limit
+        if self.spill_dir:
+            config["temp_directory"] = self.spill_dir
+        return config
+
+    def _open(self, csv_path: str) -> Tuple[object, bool]:
+        """Return a connection for csv_path and whether it reads the sidecar"""
+        if has_fresh_sidecar(csv_path):
+            self._count("sidecar_scans")
+            with self._lock:
+                if self._database is None:
+                    self._database = duckdb.connect(config=self._config())
+                    self._database.execute("SET enable_external_access = false")
+                # Opening a connection costs more than most queries; cursors
+                # are cheap and each has its own registered tables
+                return self._database.cursor(), True
+
+        self._count("csv_scans")
+        return duckdb.connect(config=self._config()), False
+
+    def _attach(self, con, csv_path: str, sidecar: bool) -> None:
+        """Make the dataset readable on con as ``data``"""
+        if sidecar:
+            con.register(
+                SQL_TABLE, feather.read_table(sidecar_path(csv_path), memory_map=True)
+            )
+            return
+        # Only the CSV stays readable, and once external access is off it
+        # cannot be switched back on
+        path = os.path.abspath(csv_path)
+        con.execute("SET allowed_paths = ?", [[path]])
+        literal = path.replace("'", "''")
+        con.execute(
+            f"CREATE VIEW {SQL_TABLE} AS SELECT * FROM read_csv_auto('{literal}')"
+        )
+        con.execute("SET enable_external_access = false")
+
+    def _check(self, con, sql: str) -> str:
+        try:
+            statements = con.extract_statements(sql)
+        except duckdb.Error as e:
+            self._count("rejected")
+            raise SQLError(f"Invalid SQL: {e}")
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            self._count("rejected")
+            raise SQLError("Only a single SELECT statement is allowed")
+        return statements[0].query
+
+    def _fetch(self, cursor) -> pd.DataFrame:
+        # to_arrow_reader replaced fetch_record_batch, which newer duckdb
+        # releases deprecate
+        to_reader = getattr(cursor, "to_arrow_reader", cursor.fetch_record_batch)
+        reader = to_reader(_BATCH_ROWS)
+        batches, rows = [], 0
+        for batch in reader:
+            rows += batch.num_rows
+            if rows > self.max_result_rows:
+                raise SQLError(
+                    f"SQL query returned more than {self.max_result_rows} rows"
+                )
+            batches.append(batch)
+        return pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "available": sql_available(),
+                "queries": self.queries,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "sidecar_scans": self.sidecar_scans,
+                "csv_scans": self.csv_scans,
+                "avg_ms": (
+                    round(self.total_ms / self.queries, 1) if self.queries else 0
+                ),
+            }
@@ -0,0 +1,518 @@
+import os
+import tempfile
+import uuid
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.util import hash_pandas_object
+
+from app.services.cleaning_plan import (
+    FILL_METHODS,
+    NUMERIC_DTYPES,
+    CleaningStrategy,
+    standardized_names,
+)
+from app.services.ingest import INGEST_CHUNK_ROWS, merge_dtypes
+
+# Pinned on read so every chunk gets the whole-file dtype from scan_csv
+_PINNED_DTYPES = {"int64", "float64", "bool", "object", "str"}
+
+DEDUP_PARTITION_BITS = 6
+# A second, independent row hash makes the dedup key 128 bits wide
+_SECOND_HASH_KEY = "dedup-hash-key-2"
+_HASH_RECORD = np.dtype([("h1", "<u8"), ("h2", "<u8"), ("row", "<i8")])
+
+# Median selection reads spilled values in blocks and loads them once the
+# candidates for the middle rank fit in MEDIAN_MEMORY_VALUES (8 bytes each)
+MEDIAN_BLOCK_VALUES = 1 << 20
+MEDIAN_MEMORY_VALUES = 1 << 22
+MEDIAN_BINS = 1024
+# Mode fills count at most this many distinct values per column
+MODE_MAX_VALUES = 100_000
+
+
+class StreamingCleaner:
+    """Out-of-core counterpart of DataCleaner for CSVs larger than memory.
+
+    Operations are recorded first and then executed by ``run`` over
+    ``chunksize``-row chunks of the CSV, writing the cleaned file one chunk
+    at a time. An operation that needs to see the whole column (a
+    mean/median/mode fill, backward fill or duplicate removal) is resolved
+    by one extra streaming pass over the input with the preceding
+    operations applied:
+
+    - mean is a running sum/count; median is selected exactly from the
+      column's values spilled to disk, narrowing a value range pass by pass
+      until its candidates fit in memory; mode merges per-chunk value
+      counts, exact up to MODE_MAX_VALUES distinct values and a Misra-Gries
+      heavy-hitter summary beyond;
+    - backward fill records the first valid value of every chunk;
+    - duplicates are found by spilling 128-bit row hashes into
+      hash-partitioned files and sorting one partition at a time.
+
+    The cleaning log is accumulated chunk by chunk in the final pass, so
+    its counts are exact.
+    """
+
+    def __init__(
+        self,
+        csv_path: str,
+        dtypes: Dict[str, str],
+        chunksize: int = INGEST_CHUNK_ROWS,
+        spill_dir: Optional[str] = None,
+    ):
+        self.csv_path = csv_path
+        self.chunksize = chunksize
+        self.spill_dir = spill_dir
+        self.columns: List[Hashable] = list(dtypes)
+        self.original_columns = len(self.columns)
+        self.original_rows = 0
+        self.cleaned_rows = 0
+        self.cleaned_columns = len(self.columns)
+        self.cleaned_dtypes: Dict[Hashable, str] = {}
+        self.sample_data = pd.DataFrame(columns=self.columns)
+        self.cleaning_log: List[Dict] = []
+        self._read_dtypes = {
+            col: dtype for col, dtype in dtypes.items() if dtype in _PINNED_DTYPES
+        }
+        self._ops: List[Dict] = []
+        self._progress: Optional[Callable[[float], None]] = None
+        self._rows_to_read = 0
+        self._rows_read = 0
+
+    def handle_missing_values(
+        self, strategy: CleaningStrategy, columns: Optional[List[str]] = None
+    ) -> "StreamingCleaner":
+        if columns is None:
+            columns = list(self.columns)
+        missing = [col for col in columns if col not in self.columns]
+        if missing:
+            raise KeyError(f"{missing} not in index")
+
+        method = "drop" if strategy == CleaningStrategy.DROP else FILL_METHODS[strategy]
+        self._ops.append(
+            {"kind": method, "strategy": strategy, "columns": list(columns)}
+        )
+        return self
+
+    def remove_duplicates(
+        self, subset: Optional[List[str]] = None, keep: str = "first"
+    ) -> "StreamingCleaner":
+        self._ops.append({"kind": "duplicates", "subset": subset, "keep": keep})
+        return self
+
+    def standardize_columns(self) -> "StreamingCleaner":
+        new_columns = standardized_names(self.columns)
+        self._ops.append(
+            {
+                "kind": "rename",
+                "original_columns": list(self.columns),
+                "new_columns": new_columns,
+            }
+        )
+        self.columns = new_columns
+        return self
+
+    def run(
+        self,
+        output_path: str,
+        progress: Optional[Callable[[float], None]] = None,
+        total_rows: Optional[int] = None,
+    ) -> None:
+        """Execute the recorded operations and write the result to output_path.
+
+        With the file's ``total_rows``, ``progress`` is called after every
+        chunk read with the share (0..1) of all passes done so far, and with
+        1.0 just before the result replaces output_path; an exception it
+        raises aborts the run and leaves output_path as it was.
+        """
+        if progress is not None and total_rows:
+            passes = 1 + sum(
+                op["kind"] in ("mean", "median", "mode", "bfill", "duplicates")
+                for op in self._ops
+            )
+            self._progress = progress
+            self._rows_to_read = passes * total_rows
+        with tempfile.TemporaryDirectory(dir=self.spill_dir) as spill:
+            for index, op in enumerate(self._ops):
+                if op["kind"] in ("mean", "median", "mode"):
+                    op["values"] = self._aggregate(index, spill)
+                elif op["kind"] == "bfill":
+                    op["next_valid"] = self._next_valid(index)
+                elif op["kind"] == "duplicates":
+                    op["dropped"] = self._find_duplicates(index, spill)
+        self._write(output_path)
+
+    # Passes
+
+    def _chunks(self) -> Iterator[Tuple[int, pd.DataFrame]]:
+        with pd.read_csv(
+            self.csv_path, dtype=self._read_dtypes, chunksize=self.chunksize
+        ) as reader:
+            # Chunks keep a running RangeIndex, i.e. the row's position in
+            # the file, which identifies rows across passes
+            for number, chunk in enumerate(reader):
+                if self._progress is not None:
+                    self._rows_read += len(chunk)
+                    self._progress(min(self._rows_read / self._rows_to_read, 1.0))
+                yield number, chunk
+
+    def _prepared(self, upto: int) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """Chunks with the first ``upto`` operations applied"""
+        carry: Dict[int, Dict] = {}
+        for number, chunk in self._chunks():
+            for index, op in enumerate(self._ops[:upto]):
+                chunk = self._apply(op, chunk, number, carry.setdefault(index, {}))
+            yield number, chunk
+
+    def _aggregate(self, index: int, spill: str) -> Dict[Hashable, object]:
+        op = self._ops[index]
+        columns = op["columns"]
+        numeric = {col: True for col in columns}
+        sums = {col: 0.0 for col in columns}
+        counts = {col: 0 for col in columns}
+        value_counts: Dict[Hashable, pd.Series] = {}
+        spill_paths = {
+            col: os.path.join(spill, f"median-{index}-{position}.bin")
+            for position, col in enumerate(columns)
+        }
+
+        for _, chunk in self._prepared(index):
+            for col in columns:
+                series = chunk[col]
+                if str(series.dtype) not in NUMERIC_DTYPES:
+                    numeric[col] = False
+                if op["kind"] == "mode":
+                    counts_here = series.value_counts(dropna=True)
+                    previous = value_counts.get(col)
+                    value_counts[col] = _bounded_counts(
+                        counts_here
+                        if previous is None
+                        else previous.add(counts_here, fill_value=0)
+                    )
+                elif numeric[col]:
+                    values = series.dropna().to_numpy(dtype=np.float64)
+                    if op["kind"] == "mean":
+                        sums[col] += float(values.sum())
+                        counts[col] += len(values)
+                    else:
+                        with open(spill_paths[col], "ab") as spill_file:
+                            values.tofile(spill_file)
+
+        values = {}
+        for col in columns:
+            if op["kind"] == "mode":
+                values[col] = _mode(value_counts.get(col))
+            elif not numeric[col]:
+                continue
+            elif op["kind"] == "mean":
+                values[col] = sums[col] / counts[col] if counts[col] else np.nan
+            else:
+                values[col] = _median_from_spill(spill_paths[col])
+        return {col: value for col, value in values.items() if not pd.isna(value)}
+
+    def _next_valid(self, index: int) -> List[Dict[Hashable, object]]:
+        """For every chunk, the first valid value of each column after it"""
+        columns = self._ops[index]["columns"]
+        firsts = []
+        for _, chunk in self._prepared(index):
+            first = {}
+            for col in columns:
+                position = chunk[col].first_valid_index()
+                if position is not None:
+                    first[col] = chunk[col].loc[position]
+            firsts.append(first)
+
+        next_valid: List[Dict[Hashable, object]] = []
+        after: Dict[Hashable, object] = {}
+        for first in reversed(firsts):
+            next_valid.append(dict(after))
+            after.update(first)
+        next_valid.reverse()
+        return next_valid
+
+    def _find_duplicates(self, index: int, spill: str) -> np.ndarray:
+        """Positions (in the input file) of the rows a dedup removes"""
+        op = self._ops[index]
+        partitions = 1 << DEDUP_PARTITION_BITS
+        paths = [
+            os.path.join(spill, f"dedup-{index}-{p}.bin") for p in range(partitions)
+        ]
+
+        for _, chunk in self._prepared(index):
+            if chunk.empty:
+                continue
+            keyed = chunk if op["subset"] is None else chunk[op["subset"]]
+            records = np.empty(len(chunk), dtype=_HASH_RECORD)
+            records["h1"] = hash_pandas_object(keyed, index=False).to_numpy()
+            records["h2"] = hash_pandas_object(
+                keyed, index=False, hash_key=_SECOND_HASH_KEY
+            ).to_numpy()
+            records["row"] = chunk.index.to_numpy()
+            partition = records["h1"] >> np.uint64(64 - DEDUP_PARTITION_BITS)
+            for p in np.unique(partition):
+                with open(paths[p], "ab") as spill_file:
+                    records[partition == p].tofile(spill_file)
+
+        dropped = []
+        for path in paths:
+            if os.path.exists(path):
+                dropped.append(_partition_duplicates(path, op["keep"]))
+                os.remove(path)
+        if not dropped:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(dropped))
+
+    def _write(self, output_path: str) -> None:
+        tmp_path = f"{output_path}.{uuid.uuid4().hex}.part"
+        carry: Dict[int, Dict] = {}
+        counts = [{"before": 0, "after": 0} for _ in self._ops]
+        samples = []
+        sample_rows = 0
+        header = True
+
+        try:
+            for number, chunk in self._chunks():
+                self.original_rows += len(chunk)
+                for index, op in enumerate(self._ops):
+                    before = self._measure(op, chunk)
+                    chunk = self._apply(op, chunk, number, carry.setdefault(index, {}))
+                    counts[index]["before"] += before
+                    counts[index]["after"] += self._measure(op, chunk)
+
+                chunk.to_csv(
+                    tmp_path, mode="w" if header else "a", header=header, index=False
+                )
+                header = False
+                self.cleaned_rows += len(chunk)
+                self.cleaned_columns = len(chunk.columns)
+                for col, dtype in chunk.dtypes.astype(str).items():
+                    self.cleaned_dtypes[col] = merge_dtypes(
+                        self.cleaned_dtypes.get(col), dtype
+                    )
+                if sample_rows < 5 and len(chunk):
+                    samples.append(chunk.head(5 - sample_rows))
+                    sample_rows += len(samples[-1])
+            if self._progress is not None:
+                self._progress(1.0)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, output_path)
+
+        if samples:
+            self.sample_data = pd.concat(samples).reset_index(drop=True)
+        self.cleaning_log = [
+            self._log_entry(op, count) for op, count in zip(self._ops, counts)
+        ]
+
+    # Operations on a single chunk
+
+    def _apply(
+        self, op: Dict, chunk: pd.DataFrame, number: int, carry: Dict
+    ) -> pd.DataFrame:
+        applied = self._apply_op(op, chunk, number, carry)
+        if op["kind"] in ("rename", "duplicates", "drop"):
+            return applied
+        # pandas downcasts a text column that was all-null in this chunk
+        # once it is filled; keep the whole-file dtype so chunks stay uniform
+        downcast = {
+            col: chunk[col].dtype
+            for col in op["columns"]
+            if pd.api.types.is_string_dtype(chunk[col].dtype)
+            and not pd.api.types.is_string_dtype(applied[col].dtype)
+        }
+        return applied.astype(downcast) if downcast else applied
+
+    def _apply_op(
+        self, op: Dict, chunk: pd.DataFrame, number: int, carry: Dict
+    ) -> pd.DataFrame:
+        kind = op["kind"]
+        if kind == "drop":
+            return chunk.dropna(subset=op["columns"])
+        if kind == "zero":
+            return chunk.fillna({col: 0 for col in op["columns"]})
+        if kind in ("mean", "median", "mode"):
+            return chunk.fillna(op["values"]) if op["values"] else chunk
+        if kind == "ffill":
+            chunk = _assign(chunk, chunk[op["columns"]].ffill())
+            chunk = chunk.fillna(carry) if carry else chunk
+            if len(chunk):
+                last = chunk[op["columns"]].iloc[-1]
+                carry.update(last[last.notna()].to_dict())
+            return chunk
+        if kind == "bfill":
+            chunk = _assign(chunk, chunk[op["columns"]].bfill())
+            following = op["next_valid"][number]
+            return chunk.fillna(following) if following else chunk
+        if kind == "duplicates":
+            rows = chunk.index.to_numpy()
+            dropped = op["dropped"]
+            if len(rows) == 0 or len(dropped) == 0:
+                return chunk
+            window = dropped[
+                np.searchsorted(dropped, rows[0]) : np.searchsorted(
+                    dropped, rows[-1], side="right"
+                )
+            ]
+            return chunk[~np.isin(rows, window)] if len(window) else chunk
+        if kind == "rename":
+            return chunk.set_axis(op["new_columns"], axis=1)
+        raise ValueError(f"Unknown cleaning operation: {kind}")
+
+    @staticmethod
+    def _measure(op: Dict, chunk: pd.DataFrame) -> int:
+        if op["kind"] == "rename":
+            return 0
+        if op["kind"] == "duplicates":
+            return len(chunk)
+        return int(chunk[op["columns"]].isnull().sum().sum())
+
+    @staticmethod
+    def _log_entry(op: Dict, count: Dict) -> Dict:
+        if op["kind"] == "rename":
+            return {
+                "operation": "standardize_columns",
+                "original_columns": op["original_columns"],
+                "new_columns": op["new_columns"],
+            }
+        if op["kind"] == "duplicates":
+            return {
+                "operation": "remove_duplicates",
+                "rows_before": count["before"],
+                "rows_after": count["after"],
+                "removed": count["before"] - count["after"],
+            }
+        return {
+            "operation": "handle_missing_values",
+            "strategy": op["strategy"].value,
+            "columns": op["columns"],
+            "nulls_before": count["before"],
+            "nulls_after": count["after"],
+        }
+
+
+def _assign(chunk: pd.DataFrame, values: pd.DataFrame) -> pd.DataFrame:
+    chunk = chunk.copy(deep=False)
+    for col in values.columns:
+        chunk[col] = values[col]
+    return chunk
+
+
+def _mode(counts: Optional[pd.Series]):
+    """Smallest most frequent value, like ``Series.mode().iloc[0]``"""
+    if counts is None or counts.empty:
+        return "Unknown"
+    modes = counts.index[counts.to_numpy() == counts.max()]
+    try:
+        return sorted(modes)[0]
+    except TypeError:
+        return modes[0]
+
+
+def _bounded_counts(counts: pd.Series) -> pd.Series:
+    """Misra-Gries reduction of value counts to at most MODE_MAX_VALUES values.
+
+    Every count is lowered by the largest count that does not make the
+    cut, and values left without a positive count are dropped. A value
+    more frequent than 1/MODE_MAX_VALUES of the rows always survives.
+    """
+    if len(counts) <= MODE_MAX_VALUES:
+        return counts
+    cut = np.partition(counts.to_numpy(), -(MODE_MAX_VALUES + 1))[
+        -(MODE_MAX_VALUES + 1)
+    ]
+    counts = counts - cut
+    return counts[counts > 0]
+
+
+def _spill_blocks(path: str) -> Iterator[np.ndarray]:
+    with open(path, "rb") as spill_file:
+        while True:
+            block = np.fromfile(spill_file, dtype=np.float64, count=MEDIAN_BLOCK_VALUES)
+            if not len(block):
+                return
+            yield block
+
+
+def _select_from_spill(path: str, rank: int) -> float:
+    """The value at ``rank`` of the sorted spilled values, read in blocks.
+
+    Each pass histograms the candidates (values in [low, high]) into
+    MEDIAN_BINS bins and keeps the bin that holds ``rank``, until the
+    candidates fit in MEDIAN_MEMORY_VALUES and are loaded to select from.
+    """
+    low, high = -np.inf, np.inf
+    while True:
+        count, smallest, largest = 0, np.inf, -np.inf
+        for block in _spill_blocks(path):
+            block = block[(block >= low) & (block <= high)]
+            if len(block):
+                count += len(block)
+                smallest = min(smallest, float(block.min()))
+                largest = max(largest, float(block.max()))
+        if smallest == largest:
+            return smallest
+        if count <= MEDIAN_MEMORY_VALUES:
+            break
+
+        edges = np.linspace(smallest, largest, MEDIAN_BINS + 1)
+        histogram = np.zeros(MEDIAN_BINS, dtype=np.int64)
+        for block in _spill_blocks(path):
+            block = block[(block >= smallest) & (block <= largest)]
+            histogram += np.bincount(_bins(edges, block), minlength=MEDIAN_BINS)
+        chosen = int(np.searchsorted(np.cumsum(histogram), rank, side="right"))
+        if histogram[chosen] == count:
+            break  # Values too close to split further: load them after all
+        rank -= int(histogram[:chosen].sum())
+        low, high = edges[chosen], edges[chosen + 1]
+        if chosen < MEDIAN_BINS - 1:
+            high = np.nextafter(high, -np.inf)  # Only the last bin is closed
+
+    candidates = np.concatenate(
+        [block[(block >= low) & (block <= high)] for block in _spill_blocks(path)]
+    )
+    return float(np.partition(candidates, rank)[rank])
+
+
+def _bins(edges: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """The bin of each value: edges[i] <= value < edges[i + 1], last one closed"""
+    return np.minimum(np.searchsorted(edges, values, side="right") - 1, len(edges) - 2)
+
+
+def _median_from_spill(path: str) -> float:
+    if not os.path.exists(path):
+        return np.nan
+    # At most MEDIAN_MEMORY_VALUES of the column's values are held at once
+    size = os.path.getsize(path) // np.dtype(np.float64).itemsize
+    try:
+        if not size:
+            return np.nan
+        lower = _select_from_spill(path, (size - 1) // 2)
+        if size % 2:
+            return lower
+        upper = _select_from_spill(path, size // 2)
+        return float(np.mean([lower, upper]))
+    finally:
+        os.remove(path)
+
+
+def _partition_duplicates(path: str, keep) -> np.ndarray:
+    records = np.fromfile(path, dtype=_HASH_RECORD)
+    records = records[np.lexsort((records["row"], records["h2"], records["h1"]))]
+    same_as_previous = np.zeros(len(records), dtype=bool)
+    same_as_previous[1:] = (records["h1"][1:] == records["h1"][:-1]) & (
+        records["h2"][1:] == records["h2"][:-1]
+    )
+    same_as_next = np.zeros(len(records), dtype=bool)
+    same_as_next[:-1] = same_as_previous[1:]
+
+    if keep == "first":
+        dropped = same_as_previous
+    elif keep == "last":
+        dropped = same_as_next
+    else:
+        dropped = same_as_previous | same_as_next
+    return records["row"][dropped]
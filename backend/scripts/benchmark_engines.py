@@ -0,0 +1,221 @@
+"""Compare the pandas and SQL /ask engines on the same chart queries.
+
+Usage (from the backend directory):
+
+    python scripts/benchmark_engines.py [data.csv] [--rows N] [--repeat N]
+
+Without a CSV a synthetic sales dataset of --rows rows is generated. Each
+query is timed the way /ask runs it: pandas code, checked and rewritten by
+code analysis, against the frame loaded from the dataset's Feather sidecar
+(load time reported separately, as the server caches frames), and SQL on
+DuckDB over the sidecar and over the raw CSV. The aggregate cube is left
+out so both engines scan rows. Results of both engines are checked to
+match.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.code_analysis import analyze_code  # noqa: E402
+from app.services.columnar import (
+    read_dataset,
+    remove_sidecar,
+    write_sidecar,
+)  # noqa: E402
+from app.services.dtype_optimizer import choose_load_schema  # noqa: E402
+from app.services.sandbox import run_code  # noqa: E402
+from app.services.sql_engine import SQLEngine, sql_available  # noqa: E402
+
+# (name, pandas code, SQL) pairs over the synthetic dataset's columns
+SYNTHETIC_QUERIES = [
+    (
+        "sum by region",
+        "result = df.groupby('Region')['Units'].sum().reset_index()\n"
+        "result.columns = ['category', 'value']",
+        'SELECT "Region" AS category, SUM("Units") AS value FROM data GROUP BY 1',
+    ),
+    (
+        "mean price by product",
+        "result = df.groupby('Product')['Price'].mean().reset_index()\n"
+        "result.columns = ['category', 'value']",
+        'SELECT "Product" AS category, AVG("Price") AS value FROM data GROUP BY 1',
+    ),
+    (
+        "filtered top 10 customers",
+        "shipped = df[df['Status'] == 'shipped']\n"
+        "revenue = shipped['Units'] * shipped['Price']\n"
+        "result = revenue.groupby(shipped['Customer']).sum().nlargest(10)"
+        ".reset_index()\n"
+        "result.columns = ['category', 'value']",
+        'SELECT "Customer" AS category, SUM("Units" * "Price") AS value FROM data '
+        "WHERE \"Status\" = 'shipped' GROUP BY 1 ORDER BY 2 DESC LIMIT 10",
+    ),
+    (
+        "monthly order count",
+        "months = pd.to_datetime(df['Date']).dt.to_period('M').dt.to_timestamp()\n"
+        "result = df.groupby(months).size().reset_index()\n"
+        "result.columns = ['category', 'value']",
+        "SELECT date_trunc('month', CAST(\"Date\" AS TIMESTAMP)) AS category, "
+        "COUNT(*) AS value FROM data GROUP BY 1",
+    ),
+]
+
+
+def generic_queries(df: pd.DataFrame):
+    """Count and sum group-bys over the first text and numeric columns of df"""
+    dimension = next(
+        (
+            col
+            for col in df.columns
+            if df[col].dtype == object and df[col].nunique() <= 1000
+        ),
+        None,
+    )
+    measure = next(
+        (col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])), None
+    )
+    if dimension is None:
+        return []
+    queries = [
+        (
+            f"count by {dimension}",
+            f"result = df.groupby({dimension!r}).size().reset_index()\n"
+            "result.columns = ['category', 'value']",
+            f'SELECT "{dimension}" AS category, COUNT(*) AS value FROM data GROUP BY 1',
+        )
+    ]
+    if measure is not None:
+        queries.append(
+            (
+                f"sum {measure} by {dimension}",
+                f"result = df.groupby({dimension!r})[{measure!r}].sum().reset_index()\n"
+                "result.columns = ['category', 'value']",
+                f'SELECT "{dimension}" AS category, SUM("{measure}") AS value '
+                "FROM data GROUP BY 1",
+            )
+        )
+    return queries
+
+
+def synthetic_csv(path: str, rows: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    pd.DataFrame(
+        {
+            "Region": rng.choice(["US", "EU", "APAC", "LATAM"], rows),
+            "Product": rng.choice([f"Product {i}" for i in range(50)], rows),
+            "Status": rng.choice(["shipped", "pending", "returned"], rows),
+            "Date": pd.Timestamp("2020-01-01")
+            + pd.to_timedelta(rng.integers(0, 1461, rows), unit="D"),
+            "Units": rng.integers(1, 20, rows),
+            "Price": rng.integers(100, 100_000, rows) / 100,
+            "Customer": rng.choice([f"C{i:05d}" for i in range(5000)], rows),
+        }
+    ).to_csv(path, index=False)
+
+
+def timed(func, repeat: int):
+    """Median milliseconds of repeat calls, and the last call's result"""
+    times, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), result
+
+
+def normalized(result) -> pd.DataFrame:
+    frame = result.reset_index() if isinstance(result, pd.Series) else result
+    frame = frame.iloc[:, :2].copy()
+    frame.columns = ["category", "value"]
+    frame = frame.dropna(subset=["category"])
+    frame["category"] = frame["category"].astype(str).str.replace(" 00:00:00", "")
+    frame["value"] = frame["value"].astype(float)
+    return frame.sort_values("category").reset_index(drop=True)
+
+
+def same_result(expected, actual) -> bool:
+    expected, actual = normalized(expected), normalized(actual)
+    return (
+        len(expected) == len(actual)
+        and expected["category"].equals(actual["category"])
+        and np.allclose(expected["value"], actual["value"], equal_nan=True)
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "csv", nargs="?", help="dataset to query (synthetic if omitted)"
+    )
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if not sql_available():
+        print("duckdb is not installed; the SQL engine cannot be benchmarked")
+        return 1
+    if args.csv is not None and not os.path.exists(args.csv):
+        print(f"{args.csv} does not exist")
+        return 1
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.csv is None:
+            csv_path = os.path.join(workdir, "sales.csv")
+            print(f"Generating {args.rows} synthetic rows...")
+            synthetic_csv(csv_path, args.rows)
+        else:
+            # Sidecars are written next to the CSV, so work on a linked copy
+            csv_path = os.path.join(workdir, os.path.basename(args.csv))
+            os.symlink(os.path.abspath(args.csv), csv_path)
+
+        engine = SQLEngine()
+        load_ms, raw = timed(lambda: pd.read_csv(csv_path), 1)
+        queries = SYNTHETIC_QUERIES if args.csv is None else generic_queries(raw)
+        if not queries:
+            print("No text column with at most 1000 values to group by")
+            return 1
+        schema = choose_load_schema(raw)
+        # The server answers from sidecars written with the dataset's load schema
+        remove_sidecar(csv_path)
+        csv_ms = {
+            name: timed(lambda sql=sql: engine.run(csv_path, sql), args.repeat)[0]
+            for name, _, sql in queries
+        }
+        write_sidecar(csv_path, read_dataset(csv_path, load_schema=schema))
+        frame_ms, df = timed(lambda: read_dataset(csv_path, load_schema=schema), 1)
+
+        print(
+            f"\n{len(raw)} rows x {len(raw.columns)} cols; CSV parse "
+            f"{load_ms:.0f} ms, sidecar load {frame_ms:.0f} ms\n"
+        )
+        print(
+            f"{'query':<28}{'pandas ms':>12}{'sql ms':>10}"
+            f"{'sql csv ms':>12}{'speedup':>10}  match"
+        )
+        for name, code, sql in queries:
+            analyzed = analyze_code(code, list(df.columns), len(df), categorical=True)
+            frame = df if analyzed.columns is None else df[analyzed.columns]
+            pandas_ms, expected = timed(
+                lambda: run_code(analyzed.code, frame), args.repeat
+            )
+            sql_ms, actual = timed(lambda: engine.run(csv_path, sql), args.repeat)
+            match = same_result(expected, actual)
+            print(
+                f"{name:<28}{pandas_ms:>12.1f}{sql_ms:>10.1f}"
+                f"{csv_ms[name]:>12.1f}{pandas_ms / sql_ms:>9.1f}x  "
+                f"{'yes' if match else 'NO'}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
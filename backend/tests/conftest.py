@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    """A TestClient for the app, with its storage/ in a temp directory.
+
+    The sandbox runs code inline and the LLM has no key; tests that ask
+    questions replace ``routes.llm_client``.
+    """
+    from fastapi.testclient import TestClient
+
+    workdir = tmp_path_factory.mktemp("api")
+    previous = os.getcwd()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(workdir)
+        patch.setenv("SANDBOX_WORKERS", "0")
+        patch.setenv("GROQ_API_KEY", "test")
+        from app.main import app
+
+        with TestClient(app) as client:
+            yield client
+    os.chdir(previous)
+
+
+@pytest.fixture
+def routes(api):
+    from app.api import routes
+
+    return routes
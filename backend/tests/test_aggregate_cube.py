@@ -0,0 +1,149 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.aggregate_cube import (
+    AggregateCube,
+    build_cube,
+    cube_path,
+    read_manifest,
+    share_cube,
+)
+from app.services.code_analysis import analyze_code
+from app.services.dtype_optimizer import without_categories
+from app.services.sandbox import run_code
+
+LAYOUT = {
+    "dimensions": ["Region", "Status"],
+    "measures": ["Units", "Price"],
+    "groupings": [["Region"], ["Status"], ["Region", "Status"]],
+}
+
+
+def sales_frame(seed, rows=2_000):
+    rng = np.random.default_rng(seed)
+    units = rng.integers(0, 50, rows).astype(float)
+    units[rng.random(rows) < 0.1] = np.nan
+    region = pd.Series(rng.choice(["EU", "US", "APAC", None], rows))
+    return pd.DataFrame(
+        {
+            "Region": region.astype("category"),
+            "Status": rng.choice(["shipped", "pending"], rows),
+            "Units": units,
+            "Price": rng.integers(1, 10_000, rows) / 100,
+        }
+    )
+
+
+@pytest.fixture(params=range(3))
+def dataset(request, tmp_path):
+    path = os.path.join(tmp_path, "sales.csv")
+    df = sales_frame(request.param)
+    df.to_csv(path, index=False)
+    build_cube(path, df, LAYOUT)
+    return path, df
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "result = df.groupby('Region')['Units'].sum()",
+        "result = df.groupby('Region', observed=True)['Units'].mean()",
+        "result = df.groupby('Status')['Price'].agg('max')",
+        "result = df.groupby(['Region', 'Status'])[['Units', 'Price']].sum()",
+        "result = df.groupby(['Status', 'Region'])['Units'].count()",
+        "result = df.groupby('Region').size()",
+        "result = df.groupby(by='Status')['Units'].min()",
+        "label = df['Status'].str.upper().iloc[0]\n"
+        "result = df.groupby('Region')['Units'].sum()",
+    ],
+)
+def test_cube_lookups_match_groupby(dataset, code):
+    path, df = dataset
+    manifest = read_manifest(path)
+    analyzed = analyze_code(code, list(df.columns), len(df), cube=manifest)
+    assert analyzed.cube_lookups == 1
+
+    # What the same code computes from the rows, on the frame the sandbox hands it
+    scanned = analyze_code(code, list(df.columns), len(df))
+    plain = without_categories(df)
+    expected = run_code(scanned.code, plain)
+    actual = run_code(analyzed.code, plain, AggregateCube.load(cube_path(path)))
+    assert index_dtypes(actual) == index_dtypes(expected)
+    if isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(expected, actual, check_dtype=False)
+    else:
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+
+
+def index_dtypes(result):
+    levels = getattr(result.index, "levels", [result.index])
+    return [str(level.dtype) for level in levels]
+
+
+def test_cube_keys_behave_like_scanned_keys(dataset):
+    path, df = dataset
+    code = (
+        "result = df.groupby('Region')['Units'].sum().reset_index()\n"
+        "result.columns = ['category', 'value']\n"
+        "result['category'] = result['category'] + ' region'"
+    )
+    analyzed = analyze_code(code, list(df.columns), len(df), cube=read_manifest(path))
+    assert analyzed.cube_lookups == 1
+
+    plain = without_categories(df)
+    expected = run_code(code, plain)
+    actual = run_code(analyzed.code, plain, AggregateCube.load(cube_path(path)))
+
+    pd.testing.assert_series_equal(expected.dtypes, actual.dtypes)
+    pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+    assert actual["category"].iloc[0].endswith(" region")
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "result = df.groupby('Units')['Price'].sum()",
+        "result = df.groupby('Region')['Units'].median()",
+        "result = df.groupby('Region', dropna=False)['Units'].sum()",
+        "df = df[df['Units'] > 3]\nresult = df.groupby('Region')['Units'].sum()",
+        "df.update(df[['Units']].fillna(0))\n"
+        "result = df.groupby('Region')['Units'].sum()",
+        "df.insert(0, 'Total', df['Units'] * df['Price'])\n"
+        "result = df.groupby('Region')['Units'].sum()",
+        "price = df.pop('Price')\nresult = df.groupby('Region')['Units'].sum()",
+        "deduped = df.drop_duplicates()\ndf = deduped\n"
+        "result = df.groupby('Region')['Units'].sum()",
+        "d = df\nd.loc[d['Units'] > 10, 'Units'] = 0\n"
+        "result = df.groupby('Region')['Units'].sum()",
+        "rows = df.loc\nrows[df['Units'] > 10, 'Units'] = 0\n"
+        "result = df.groupby('Region')['Units'].sum()",
+        "d = df\nd.drop_duplicates(inplace=True)\n"
+        "result = df.groupby('Region')['Units'].sum()",
+    ],
+)
+def test_groupbys_the_cube_cannot_answer_scan_rows(dataset, code):
+    path, df = dataset
+    analyzed = analyze_code(code, list(df.columns), len(df), cube=read_manifest(path))
+    assert analyzed.cube_lookups == 0
+
+
+def test_concurrent_cube_writes_leave_one_whole_cube(tmp_path):
+    source = os.path.join(tmp_path, "sales.csv")
+    dest = os.path.join(tmp_path, "copy.csv")
+    df = sales_frame(0)
+    for path in (source, dest):
+        df.to_csv(path, index=False)
+    build_cube(source, df, LAYOUT)
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(build_cube, dest, df, LAYOUT) for _ in range(4)]
+        futures += [pool.submit(share_cube, source, dest) for _ in range(4)]
+        for future in futures:
+            future.result()
+
+    assert read_manifest(dest)["groups"] == read_manifest(source)["groups"]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
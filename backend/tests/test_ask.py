@@ -0,0 +1,239 @@
+import json
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from app.services.llm_client import LLMError
+
+BY_REGION = "result = df.groupby('region', as_index=False)['units'].sum()"
+
+
+def chart(code=BY_REGION, explanation="Units by region"):
+    return {
+        "pandas_code": code,
+        "recharts_config": {"type": "bar", "xAxisKey": "region", "dataKey": "units"},
+        "explanation": explanation,
+        "insights": ["EU sells more"],
+    }
+
+
+class FakeLLM:
+    """Answers every prompt with one JSON reply, streamed a few characters at a time"""
+
+    def __init__(self, reply, stream_error=None):
+        self.reply = reply
+        self.stream_error = stream_error
+        self.streamed = 0
+        self.completed = 0
+
+    async def stream(self, messages):
+        self.streamed += 1
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        text = json.dumps(self.reply)
+        for start in range(0, len(text), 8):
+            if self.stream_error and start >= len(text) // 2:
+                raise self.stream_error
+            yield text[start : start + 8]
+
+    async def complete_json(self, messages):
+        self.completed += 1
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return self.reply
+
+
+@pytest.fixture
+def use_llm(routes, monkeypatch):
+    def install(reply, **kwargs):
+        llm = FakeLLM(reply, **kwargs)
+        monkeypatch.setattr(routes, "llm_client", llm)
+        return llm
+
+    return install
+
+
+@pytest.fixture
+def dataset(api, request):
+    """A small sales file uploaded under the test's own name"""
+    name = f"{request.node.name.replace('[', '_').replace(']', '')}.csv"
+    return upload(api, name, [5, 3, 2, len(name)])
+
+
+def upload(api, name, units):
+    df = pd.DataFrame({"region": ["EU", "US", "EU", "APAC"], "units": units})
+    response = api.post(
+        "/api/upload",
+        files={"file": (name, df.to_csv(index=False).encode(), "text/csv")},
+    )
+    assert response.status_code == 200
+    return name
+
+
+def ask(api, filename, question):
+    return api.post("/ask", json={"filename": filename, "question": question})
+
+
+def stream(api, filename, question):
+    body = {"filename": filename, "question": question}
+    response = api.post("/ask/stream", json=body)
+    assert response.status_code == 200
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event[len("event: ") :], json.loads(data[len("data: ") :])))
+    return events
+
+
+def test_stream_sends_progress_then_the_ask_body(api, use_llm, dataset):
+    llm = use_llm(chart(explanation='EU "leads" é'))
+
+    events = stream(api, dataset, "units by region, streamed")
+
+    names = [event for event, _ in events]
+    assert names[0] == "start"
+    assert names[-1] == "result"
+    assert names.index("code") < names.index("data") < names.index("result")
+    deltas = [data["text"] for event, data in events if event == "explanation"]
+    assert "".join(deltas) == 'EU "leads" é'
+    assert llm.streamed == 1
+    assert llm.completed == 0
+
+    result = events[-1][1]
+    assert result["analysis"]["explanation"] == 'EU "leads" é'
+    assert result["chart"]["data"][0] == {"region": "APAC", "units": len(dataset)}
+    assert result["metadata"]["source"] == "llm"
+
+
+def test_broken_stream_falls_back_to_a_plain_completion(api, use_llm, dataset):
+    llm = use_llm(chart(), stream_error=LLMError("connection dropped"))
+
+    events = stream(api, dataset, "units by region, interrupted")
+
+    assert events[-1][0] == "result"
+    assert llm.streamed == 1
+    assert llm.completed == 1
+
+
+def test_stream_reports_errors_as_events(api, use_llm, dataset):
+    use_llm(LLMError("LLM unavailable"))
+
+    events = stream(api, "missing.csv", "anything")
+    assert events[-1] == (
+        "error",
+        {"status_code": 404, "detail": "File does not exist"},
+    )
+
+    events = stream(api, dataset, "units by region, failing")
+    assert events[0][0] == "start"
+    assert events[-1] == ("error", {"status_code": 500, "detail": "LLM unavailable"})
+
+
+def test_charts_run_concurrently(api, routes, use_llm, dataset, monkeypatch):
+    use_llm({"charts": [chart(), chart("result = df[['region', 'units']]")]})
+    both_running = threading.Barrier(2, timeout=10)
+    run_chart = routes.run_chart
+
+    def run_together(*args):
+        both_running.wait()
+        return run_chart(*args)
+
+    monkeypatch.setattr(routes, "run_chart", run_together)
+
+    response = ask(api, dataset, "units by region, twice")
+
+    assert response.status_code == 200
+    charts = response.json()["charts"]
+    assert [entry["error"] for entry in charts] == [None, None]
+    assert len(charts[1]["chart"]["data"]) == 4
+
+
+def test_failed_charts_do_not_sink_the_answer(api, use_llm, dataset):
+    use_llm(
+        {
+            "charts": [
+                chart("result = df['missing'].sum()"),
+                chart(explanation="Still here"),
+                {"pandas_code": BY_REGION},
+            ]
+        }
+    )
+
+    body = ask(api, dataset, "units by region, partly broken").json()
+
+    assert body["analysis"]["explanation"] == "Still here"
+    assert body["chart"]["data"] == body["charts"][1]["chart"]["data"]
+    assert body["charts"][0]["error"]["status_code"] == 400
+    assert body["charts"][0]["chart"] is None
+    assert body["charts"][2]["error"]["status_code"] == 422
+
+
+def test_answer_fails_when_every_chart_fails(api, use_llm, dataset):
+    use_llm({"charts": [chart("result = df['missing']"), chart("import os")]})
+
+    response = ask(api, dataset, "units by region, all broken")
+
+    assert response.status_code == 400
+
+
+def test_plans_are_reused_for_files_with_the_same_schema(api, use_llm):
+    first = upload(api, "plan_january.csv", [5, 3, 2, 1])
+    second = upload(api, "plan_february.csv", [50, 30, 20, 10])
+    llm = use_llm(chart())
+
+    assert ask(api, first, "Units by region?").json()["metadata"]["source"] == "llm"
+    body = ask(api, second, "units by region").json()
+
+    assert llm.completed == 1
+    assert body["metadata"]["source"] == "plan_cache"
+    assert body["chart"]["data"] == [
+        {"region": "APAC", "units": 10},
+        {"region": "EU", "units": 70},
+        {"region": "US", "units": 30},
+    ]
+
+
+def test_plans_that_fail_on_another_file_are_dropped(api, routes, use_llm):
+    first = upload(api, "plan_big.csv", [500, 300, 200, 100])
+    second = upload(api, "plan_small.csv", [5, 3, 2, 1])
+    question = "regions selling over 100 units"
+    llm = use_llm(chart("result = df[df['units'] > 100]"))
+    ask(api, first, question)
+
+    llm.reply = chart()
+    body = ask(api, second, question).json()
+
+    assert llm.completed == 2
+    assert body["metadata"]["source"] == "llm"
+    # The plan now cached for the schema is the one that ran on both files
+    plan = routes.plan_cache.get(
+        routes.schema_fingerprint(routes.load_dataframe(routes.get_file_path(first))),
+        question,
+    )
+    assert plan["chart_data"]["pandas_code"] == BY_REGION
+
+
+def test_chart_code_is_analyzed_from_the_catalog(api, routes, dataset, monkeypatch):
+    path = routes.get_file_path(dataset)
+    loads = []
+    load_dataframe = routes.load_dataframe
+
+    def counting_load(path):
+        loads.append(path)
+        return load_dataframe(path)
+
+    monkeypatch.setattr(routes, "load_dataframe", counting_load)
+    config = chart()["recharts_config"]
+
+    records, _, analysis = routes.execute_chart_code(path, BY_REGION, config)
+    assert json.loads(records.data)[0] == {"region": "APAC", "units": len(dataset)}
+    assert analysis["columns"] == ["region", "units"]
+    assert loads == []
+
+    # A file changed behind the catalog's back is loaded to see its columns
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    routes.execute_chart_code(path, BY_REGION, config)
+    assert loads == [path]
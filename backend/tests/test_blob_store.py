@@ -0,0 +1,96 @@
+import hashlib
+import os
+
+import pytest
+
+from app.services.blob_store import BlobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / "blobs"))
+
+
+def put(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path), hashlib.sha256(content).hexdigest()
+
+
+def test_identical_content_is_stored_once(store, tmp_path):
+    first, digest = put(tmp_path, "a.csv", b"a,b\n1,2\n")
+    second, _ = put(tmp_path, "b.csv", b"a,b\n1,2\n")
+
+    assert store.adopt(first, digest) is False
+    assert store.adopt(second, digest) is True
+
+    assert os.path.samefile(first, second)
+    assert store.refcount(digest) == 2
+    assert store.stats()["deduplicated"] == 1
+    assert store.adopt(second, digest) is True  # already linked: a no-op
+    assert store.stats()["deduplicated"] == 1
+
+
+def test_blob_outlives_its_first_name(store, tmp_path):
+    first, digest = put(tmp_path, "a.csv", b"a,b\n1,2\n")
+    second, _ = put(tmp_path, "b.csv", b"a,b\n1,2\n")
+    store.adopt(first, digest)
+    store.adopt(second, digest)
+
+    os.remove(first)
+    assert store.release(digest) is False
+    assert open(second, "rb").read() == b"a,b\n1,2\n"
+
+    os.remove(second)
+    assert store.release(digest) is True
+    assert not store.has(digest)
+    assert store.release(digest) is False
+    assert store.release(None) is False
+
+
+def test_link_replaces_the_destination(store, tmp_path):
+    source, digest = put(tmp_path, "a.csv", b"new\n")
+    dest, _ = put(tmp_path, "b.csv", b"old\n")
+    store.adopt(source, digest)
+
+    store.link(digest, dest)
+
+    assert open(dest, "rb").read() == b"new\n"
+    assert store.refcount(digest) == 2
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".link")]
+
+
+def test_collect_garbage_keeps_referenced_blobs(store, tmp_path):
+    kept, kept_digest = put(tmp_path, "kept.csv", b"kept\n")
+    gone, gone_digest = put(tmp_path, "gone.csv", b"gone\n")
+    store.adopt(kept, kept_digest)
+    store.adopt(gone, gone_digest)
+    os.remove(gone)
+
+    assert store.collect_garbage() == 1
+    assert store.has(kept_digest)
+    assert not store.has(gone_digest)
+    assert store.collect_garbage() == 0
+    assert BlobStore(str(tmp_path / "missing")).collect_garbage() == 0
+
+
+def test_uploads_share_and_release_blobs(api, routes):
+    def upload(name, content):
+        files = {"file": (name, content, "text/csv")}
+        return api.post("/api/upload", files=files).json()
+
+    def stored(name):
+        return os.path.join(routes.BASE_DIR, name)
+
+    content = b"region,units\nEU,1\nUS,2\n"
+    digest = hashlib.sha256(content).hexdigest()
+
+    assert upload("blob_a.csv", content)["deduplicated"] is False
+    assert upload("blob_b.csv", content)["deduplicated"] is True
+    assert os.path.samefile(stored("blob_a.csv"), stored("blob_b.csv"))
+    assert routes.blob_store.refcount(digest) == 2
+
+    upload("blob_a.csv", b"region,units\nEU,3\n")
+    upload("blob_b.csv", b"region,units\nUS,4\n")
+
+    assert not routes.blob_store.has(digest)
@@ -0,0 +1,70 @@
+import os
+
+import pandas as pd
+import pytest
+
+from app.services.catalog import DatasetCatalog, file_sha256
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return DatasetCatalog(str(tmp_path / "cache" / "catalog.sqlite3"))
+
+
+def write_csv(path, rows):
+    pd.DataFrame({"a": range(rows), "b": ["x"] * rows}).to_csv(path, index=False)
+    return str(path)
+
+
+def describe(path):
+    df = pd.read_csv(path)
+    return len(df), df.dtypes.astype(str).to_dict(), {}
+
+
+def test_re_registering_keeps_the_creation_time(catalog, tmp_path):
+    path = write_csv(tmp_path / "data.csv", 3)
+    first = catalog.register(path, 3, {"a": "int64", "b": "object"})
+
+    write_csv(path, 5)
+    second = catalog.register(
+        path, 5, {"a": "int64", "b": "object"}, content_hash=file_sha256(path)
+    )
+
+    entry = catalog.get("data.csv")
+    assert second["created_at"] == entry["created_at"] == first["created_at"]
+    assert entry["rows"] == 5
+    assert entry["size_bytes"] == os.path.getsize(path)
+    assert entry["content_hash"] == file_sha256(path)
+
+
+def test_reconcile_refreshes_changed_files_and_drops_missing_ones(catalog, tmp_path):
+    data_dir = tmp_path / "user_data"
+    data_dir.mkdir()
+    kept = write_csv(data_dir / "kept.csv", 3)
+    gone = write_csv(data_dir / "gone.csv", 2)
+    assert catalog.reconcile(str(data_dir), describe) == {"removed": 0, "refreshed": 2}
+    created_at = catalog.get("kept.csv")["created_at"]
+
+    os.remove(gone)
+    write_csv(kept, 7)
+    stat = os.stat(kept)
+    os.utime(kept, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert catalog.reconcile(str(data_dir), describe) == {"removed": 1, "refreshed": 1}
+    assert catalog.get("gone.csv") is None
+    assert catalog.get("kept.csv")["rows"] == 7
+    assert catalog.get("kept.csv")["created_at"] == created_at
+    assert catalog.reconcile(str(data_dir), describe) == {"removed": 0, "refreshed": 0}
+
+
+def test_page_sorts_by_creation_time(catalog, tmp_path):
+    for name in ("b.csv", "a.csv", "c.csv"):
+        catalog.register(write_csv(tmp_path / name, 1), 1, {"a": "int64"})
+    catalog.register(str(tmp_path / "b.csv"), 1, {"a": "int64"})
+
+    entries, total = catalog.page(sort="created_at")
+
+    assert total == 3
+    assert [entry["filename"] for entry in entries] == ["b.csv", "a.csv", "c.csv"]
+    with pytest.raises(ValueError):
+        catalog.page(sort="modified_ns")
@@ -0,0 +1,125 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.chart_payload import (
+    OTHER_LABEL,
+    ChartPayloadReducer,
+    largest_triangle_three_buckets,
+)
+
+
+def decode(records):
+    return json.loads(records.data)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("threshold", [3, 10, 250])
+def test_lttb_keeps_endpoints_and_returns_threshold_sorted_points(seed, threshold):
+    rng = np.random.default_rng(seed)
+    x = np.sort(rng.random(5_000)) * 100
+    y = rng.normal(size=5_000).cumsum()
+
+    selected = largest_triangle_three_buckets(x, y, threshold)
+
+    assert len(selected) == threshold
+    assert selected[0] == 0 and selected[-1] == len(x) - 1
+    assert np.all(np.diff(selected) > 0)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_lttb_keeps_isolated_spikes(seed):
+    rng = np.random.default_rng(seed)
+    y = rng.normal(scale=0.01, size=10_000)
+    # Far enough apart that no two share one of the 100-point buckets
+    spikes = np.arange(5) * 2_000 + rng.integers(500, 1_500, 5)
+    y[spikes] = 100.0
+
+    selected = largest_triangle_three_buckets(np.arange(10_000.0), y, 100)
+
+    assert set(spikes) <= set(selected)
+
+
+def test_lttb_returns_everything_under_the_threshold():
+    x = np.arange(10.0)
+    assert list(largest_triangle_three_buckets(x, x, 10)) == list(range(10))
+    assert list(largest_triangle_three_buckets(x, x, 2)) == list(range(10))
+
+
+def test_series_charts_are_downsampled_with_lttb():
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(
+        {
+            "date": pd.date_range("2020-01-01", periods=20_000, freq="h"),
+            "value": rng.normal(size=20_000).cumsum(),
+        }
+    )
+    reducer = ChartPayloadReducer(max_points=500)
+
+    records, report = reducer.reduce(
+        frame, {"type": "LineChart", "xAxisKey": "date", "dataKey": "value"}
+    )
+
+    rows = decode(records)
+    assert report["method"] == "lttb"
+    assert report["original_rows"] == 20_000
+    assert len(rows) == report["returned_rows"] == 500
+    assert rows[0]["date"] < rows[-1]["date"]
+    assert max(row["value"] for row in rows) == pytest.approx(
+        frame["value"].max(), rel=1e-5
+    )
+
+
+@pytest.mark.parametrize("duplicate_labels", [False, True])
+def test_category_charts_keep_the_largest_and_fold_the_rest(duplicate_labels):
+    rng = np.random.default_rng(1)
+    frame = pd.DataFrame(
+        {
+            "category": [f"c{i}" for i in range(100)],
+            "value": rng.integers(-1_000, 1_000, 100).astype(float),
+        }
+    )
+    if duplicate_labels:
+        frame.index = np.arange(100) // 10
+    reducer = ChartPayloadReducer(max_categories=10)
+
+    records, report = reducer.reduce(
+        frame, {"type": "BarChart", "xAxisKey": "category", "dataKey": "value"}
+    )
+
+    rows = decode(records)
+    assert report["method"] == "top_n_other"
+    assert len(rows) == 10
+    kept = [row["category"] for row in rows[:-1]]
+    largest = frame.loc[frame["value"].abs().nlargest(9).index.unique(), "category"]
+    if not duplicate_labels:
+        assert set(kept) == set(largest)
+    assert len(set(kept)) == 9
+    assert kept == [c for c in frame["category"] if c in kept]
+    assert rows[-1]["category"] == OTHER_LABEL
+    assert sum(row["value"] for row in rows) == pytest.approx(frame["value"].sum())
+
+
+def test_payloads_are_shrunk_to_the_byte_budget():
+    frame = pd.DataFrame({"x": np.arange(50_000), "y": np.sin(np.arange(50_000))})
+    reducer = ChartPayloadReducer(max_points=10_000, max_bytes=20_000)
+
+    records, report = reducer.reduce(
+        frame, {"type": "LineChart", "xAxisKey": "x", "dataKey": "y"}
+    )
+
+    assert report["bytes"] == len(records) <= 20_000
+    assert len(decode(records)) == report["returned_rows"]
+
+
+def test_floats_are_rounded_to_significant_digits():
+    frame = pd.DataFrame({"x": ["a", "b"], "y": [1234.56789, 0.000123456]})
+    reducer = ChartPayloadReducer(significant_digits=4)
+
+    records, report = reducer.reduce(frame, {"type": "BarChart", "dataKey": "y"})
+
+    assert [row["y"] for row in decode(records)] == [1235.0, 0.0]
+    assert report["rounded_to_significant_digits"] == 4
+    assert report["method"] is None
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.cleaning_plan import (
+    FILL_METHODS,
+    CleaningPlan,
+    CleaningStrategy,
+    standardized_names,
+)
+
+
+def messy_frame(seed, rows=300):
+    rng = np.random.default_rng(seed)
+    units = rng.integers(0, 20, rows).astype(float)
+    units[rng.random(rows) < 0.2] = np.nan
+    price = rng.integers(100, 200, rows) / 4
+    price[rng.random(rows) < 0.1] = np.nan
+    region = pd.Series(rng.choice(["EU", "US", "APAC"], rows), dtype=object)
+    region[rng.random(rows) < 0.15] = np.nan
+    df = pd.DataFrame(
+        {
+            "Region Name": region,
+            "Units": units,
+            "Unit-Price": price,
+            "Order Count": rng.integers(0, 3, rows),
+        }
+    )
+    # Repeat some rows so duplicate removal has work to do
+    return pd.concat([df, df.sample(rows // 5, random_state=seed)], ignore_index=True)
+
+
+def random_operations(seed, columns, count=4):
+    rng = np.random.default_rng(seed)
+    strategies = list(CleaningStrategy)
+    operations = []
+    for _ in range(count):
+        kind = rng.choice(["missing", "missing", "missing", "duplicates", "rename"])
+        if kind == "missing":
+            strategy = strategies[rng.integers(len(strategies))]
+            chosen = [c for c in columns if rng.random() < 0.6] or columns[:1]
+            operations.append(("missing", strategy, chosen))
+        elif kind == "duplicates":
+            operations.append(("duplicates",))
+        else:
+            operations.append(("rename",))
+            columns = standardized_names(columns)
+    return operations
+
+
+def plan_clean(df, operations):
+    plan = CleaningPlan(df)
+    for operation in operations:
+        if operation[0] == "missing":
+            _, strategy, columns = operation
+            if strategy == CleaningStrategy.DROP:
+                plan.drop_missing(columns)
+            else:
+                plan.fill_missing(columns, FILL_METHODS[strategy])
+        elif operation[0] == "duplicates":
+            plan.drop_duplicates()
+        else:
+            plan.rename(standardized_names(plan.columns))
+    return plan.materialize()
+
+
+def eager_clean(df, operations):
+    """The cleaning operations applied one at a time, as before the plan"""
+    df = df.copy()
+    for operation in operations:
+        if operation[0] == "duplicates":
+            df = df.drop_duplicates()
+            continue
+        if operation[0] == "rename":
+            df.columns = standardized_names(df.columns.tolist())
+            continue
+        _, strategy, columns = operation
+        for col in columns:
+            series = df[col]
+            numeric = series.dtype in ("int64", "float64")
+            if strategy == CleaningStrategy.DROP:
+                df = df.dropna(subset=[col])
+            elif strategy == CleaningStrategy.FILL_MEAN and numeric:
+                df[col] = series.fillna(series.mean())
+            elif strategy == CleaningStrategy.FILL_MEDIAN and numeric:
+                df[col] = series.fillna(series.median())
+            elif strategy == CleaningStrategy.FILL_MODE:
+                mode = series.mode()
+                df[col] = series.fillna(mode.iloc[0] if not mode.empty else "Unknown")
+            elif strategy == CleaningStrategy.FILL_FORWARD:
+                df[col] = series.ffill()
+            elif strategy == CleaningStrategy.FILL_BACKWARD:
+                df[col] = series.bfill()
+            elif strategy == CleaningStrategy.FILL_ZERO:
+                df[col] = series.fillna(0)
+    return df
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_plan_matches_eager_cleaning(seed):
+    df = messy_frame(seed)
+    operations = random_operations(seed, df.columns.tolist())
+
+    expected = eager_clean(df, operations)
+    actual = plan_clean(df, operations)
+
+    pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+
+
+def test_plan_counts_nulls_over_surviving_rows():
+    df = pd.DataFrame({"a": [1.0, None, None, 4.0], "b": [None, 2.0, None, 4.0]})
+    plan = CleaningPlan(df)
+
+    plan.drop_missing(["a"])
+    assert plan.row_count == 2
+    assert plan.count_nulls(["b"]) == 1
+
+    plan.fill_missing(["b"], "mean")
+    assert plan.count_nulls(["a", "b"]) == 0
+    assert plan.materialize()["b"].tolist() == [4.0, 4.0]
+
+
+def test_plan_does_not_modify_its_input():
+    df = messy_frame(0)
+    before = df.copy()
+
+    plan_clean(
+        df,
+        [
+            ("missing", CleaningStrategy.FILL_ZERO, ["Units"]),
+            ("missing", CleaningStrategy.DROP, ["Region Name"]),
+            ("duplicates",),
+        ],
+    )
+
+    pd.testing.assert_frame_equal(df, before)
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.code_analysis import CodeRejected, analyze_code
+from app.services.sandbox import run_code
+
+COLUMNS = ["Region", "Month", "Units", "Price"]
+ROWS = 20_000_000
+
+
+def analyze(code, **kwargs):
+    return analyze_code(code, COLUMNS, ROWS, max_seconds=30, **kwargs)
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "parts = []\n"
+        "for m in ['Jan', 'Feb', 'Mar']:\n"
+        "    parts.append(df[df['Month'] == m]['Units'].sum())\n"
+        "result = pd.Series(parts)",
+        "parts = []\n"
+        "for i in range(3):\n"
+        "    parts.append(df['Units'].shift(i).sum())\n"
+        "result = pd.Series(parts)",
+        "months = ['Jan', 'Feb']\n"
+        "totals = {}\n"
+        "for m in months:\n"
+        "    totals[m] = df.loc[df['Month'] == m, 'Units'].sum()\n"
+        "result = pd.Series(totals)",
+        "totals = {}\n"
+        "for col in df.columns:\n"
+        "    totals[col] = df[col].count()\n"
+        "result = pd.Series(totals)",
+    ],
+)
+def test_small_loops_are_not_costed_per_row(code):
+    assert analyze(code).estimated_seconds < 1
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "rows = []\n"
+        "for i in range(len(df)):\n"
+        "    rows.append(df['Units'].iloc[i] * 2)\n"
+        "result = pd.Series(rows)",
+        "rows = []\n"
+        "for _, row in df.iterrows():\n"
+        "    rows.append(row['Units'] * row['Price'])\n"
+        "result = pd.Series(rows)",
+        "units = df['Units']\n"
+        "rows = []\n"
+        "for u in units:\n"
+        "    rows.append(u * 2)\n"
+        "result = pd.Series(rows)",
+        "rows = []\n"
+        "for u, p in zip(df['Units'], df['Price']):\n"
+        "    rows.append(u * p)\n"
+        "result = pd.Series(rows)",
+    ],
+)
+def test_loops_over_rows_are_costed_per_row(code):
+    assert analyze_code(code, COLUMNS, ROWS).estimated_seconds > 10
+
+
+def test_long_vectorized_chains_are_not_rejected():
+    terms = " + ".join(f"df['Units'] * {i}" for i in range(20))
+    code = (
+        f"df['Score'] = {terms}\n"
+        "df = df[(df['Score'] > 10) & (df['Price'] < 100)]\n"
+        "result = df.groupby('Region')['Score'].sum().reset_index()\n"
+        "result.columns = ['category', 'value']"
+    )
+    analyzed = analyze_code(code, COLUMNS, 200_000_000, max_seconds=30)
+    assert analyzed.estimated_seconds < 5
+
+
+def test_iterrows_over_a_large_frame_is_rejected():
+    code = (
+        "rows = []\n"
+        "for _, row in df.iterrows():\n"
+        "    rows.append(row['Units'])\n"
+        "result = pd.Series(rows)"
+    )
+    with pytest.raises(CodeRejected, match="estimated"):
+        analyze(code)
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "np.save('/tmp/out.npy', df['Units'].to_numpy())\nresult = df",
+        "result = pd.DataFrame(np.load('/etc/data.npy'))",
+        "result = pd.Series(np.fromfile('/etc/passwd', dtype=np.uint8))",
+        "df['Units'].to_numpy().tofile('/tmp/out.bin')\nresult = df",
+        "np.savetxt('/tmp/out.txt', df[['Units']].to_numpy())\nresult = df",
+        "result = pd.DataFrame(np.loadtxt('/etc/hosts', dtype=str))",
+        "result = pd.Series(np.memmap('/etc/passwd', dtype=np.uint8))",
+        "result = pd.DataFrame(np.genfromtxt('/etc/hosts'))",
+        "np.savez('/tmp/out', units=df['Units'])\nresult = df",
+        "from numpy import load\nresult = pd.Series(load('/etc/data.npy'))",
+        "from pandas import read_csv\nresult = read_csv('/etc/hosts')",
+        "result = pd.read_csv('/etc/hosts')",
+        "df.to_csv('/tmp/out.csv')\nresult = df",
+    ],
+)
+def test_file_access_is_rejected(code):
+    with pytest.raises(CodeRejected, match="File access"):
+        analyze(code)
+
+
+def sales_frame(seed, rows=500):
+    rng = np.random.default_rng(seed)
+    units = rng.integers(-5, 50, rows).astype(float)
+    units[rng.random(rows) < 0.1] = np.nan
+    return pd.DataFrame(
+        {
+            "Region": rng.choice(["EU", "US", "APAC"], rows),
+            "Month": rng.choice(["Jan", "Feb", "Mar", "Apr"], rows),
+            "Units": units,
+            "Price": rng.integers(1, 10_000, rows) / 100,
+        }
+    )
+
+
+def run_both(code, df, columns=COLUMNS, **kwargs):
+    analyzed = analyze_code(code, columns, len(df), **kwargs)
+    return run_code(code, df), run_code(analyzed.code, df), analyzed
+
+
+def assert_same(expected, actual):
+    if isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(
+            expected, actual, check_names=False, check_dtype=False
+        )
+    else:
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize(
+    "code",
+    [
+        "result = df['Units'].apply(lambda x: x * 2 + 1)",
+        "result = df['Price'].map(lambda p: -p / 3)",
+        "result = df['Units'].apply(lambda x: x > 10)",
+        "result = df['Units'].apply(lambda x: x % 7 - x // 2)",
+        "result = df['Region'].apply(lambda r: r == 'EU')",
+        "result = df.apply(lambda r: r['Units'] * r['Price'], axis=1)",
+        "result = df.apply(lambda r: r.Units - r.Price * 2, axis=1)",
+        "positive = df[df['Units'] > 0]\n"
+        "result = positive.apply(lambda r: r['Price'] / r['Units'], axis='columns')",
+    ],
+)
+def test_vectorized_lambdas_match_apply(code, seed):
+    expected, actual, analyzed = run_both(code, sales_frame(seed))
+    assert any(rewrite.startswith("vectorized") for rewrite in analyzed.rewrites)
+    assert_same(expected, actual)
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "result = df['Units'].apply(lambda x: '%d items' % x)",
+        "result = df['Region'].map(lambda x: 'Region ' + x)",
+        "result = df.apply(lambda r: r.name * 2, axis=1)",
+        "result = df.apply(lambda r: len(r.values), axis=1)",
+        "result = df['Units'].apply(lambda x: round(x))",
+    ],
+)
+def test_lambdas_that_cannot_be_vectorized_are_left_alone(code):
+    df = sales_frame(0).fillna(0)
+    expected, actual, analyzed = run_both(code, df)
+    assert not any(rewrite.startswith("vectorized") for rewrite in analyzed.rewrites)
+    assert_same(expected, actual)
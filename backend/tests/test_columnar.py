@@ -0,0 +1,108 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.columnar import (
+    has_fresh_sidecar,
+    read_dataset,
+    share_sidecar,
+    sidecar_batches,
+    sidecar_path,
+    write_sidecar,
+    write_sidecar_from_csv,
+)
+from app.services.ingest import scan_csv
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    rng = np.random.default_rng(0)
+    path = str(tmp_path / "data.csv")
+    pd.DataFrame(
+        {
+            "region": rng.choice(["EU", "US"], 500),
+            "units": rng.integers(0, 50, 500),
+            "price": rng.random(500),
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+def touch_later(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_sidecar_is_fresh_until_the_csv_changes(dataset):
+    assert not has_fresh_sidecar(dataset)
+
+    write_sidecar(dataset, pd.read_csv(dataset))
+    assert has_fresh_sidecar(dataset)
+
+    touch_later(dataset)
+    assert not has_fresh_sidecar(dataset)
+
+
+def test_read_dataset_matches_the_csv(dataset):
+    expected = pd.read_csv(dataset)
+    pd.testing.assert_frame_equal(read_dataset(dataset), expected)
+
+    write_sidecar(dataset, expected)
+    pd.testing.assert_frame_equal(read_dataset(dataset), expected)
+    pd.testing.assert_frame_equal(
+        read_dataset(dataset, columns=["units"]), expected[["units"]]
+    )
+
+
+def test_streamed_sidecar_matches_the_csv(dataset):
+    info = scan_csv(dataset, chunksize=100)
+
+    write_sidecar_from_csv(
+        dataset,
+        info["dtypes"],
+        chunksize=100,
+        load_schema=info["load_schema"],
+        categories=info["categories"],
+    )
+
+    assert sidecar_batches(dataset) == 5
+    pd.testing.assert_frame_equal(
+        read_dataset(dataset, load_schema={}).astype({"region": str}),
+        pd.read_csv(dataset).astype({"region": str}),
+    )
+
+
+def test_concurrent_writers_leave_one_whole_sidecar(dataset):
+    df = pd.read_csv(dataset)
+    info = scan_csv(dataset, chunksize=100)
+    writers = [lambda: write_sidecar(dataset, df)] * 4 + [
+        lambda: write_sidecar_from_csv(dataset, info["dtypes"], chunksize=100)
+    ] * 4
+
+    with ThreadPoolExecutor(len(writers)) as pool:
+        for future in [pool.submit(writer) for writer in writers]:
+            future.result()
+
+    pd.testing.assert_frame_equal(read_dataset(dataset), df)
+    assert sorted(os.listdir(os.path.dirname(dataset))) == [
+        "data.csv",
+        "data.csv.feather",
+    ]
+
+
+def test_share_sidecar(dataset, tmp_path):
+    copy = str(tmp_path / "copy.csv")
+    with open(dataset, "rb") as source, open(copy, "wb") as dest:
+        dest.write(source.read())
+
+    assert not share_sidecar(dataset, copy)
+
+    write_sidecar(dataset, pd.read_csv(dataset))
+    assert share_sidecar(dataset, copy)
+    assert share_sidecar(dataset, copy)
+    assert os.path.samefile(sidecar_path(dataset), sidecar_path(copy))
+    pd.testing.assert_frame_equal(read_dataset(copy), pd.read_csv(dataset))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
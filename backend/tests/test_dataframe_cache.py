@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.dataframe_cache import DataFrameCache, enable_copy_on_write
+from app.services.sandbox import run_code
+
+
+class CountingLoader:
+    def __init__(self):
+        self.loads = 0
+
+    def __call__(self, path):
+        self.loads += 1
+        return pd.read_csv(path)
+
+
+def write_csv(path, rows):
+    pd.DataFrame({"a": range(rows), "b": ["x"] * rows}).to_csv(path, index=False)
+    return str(path)
+
+
+def frame_bytes(path):
+    return int(pd.read_csv(path).memory_usage(deep=True).sum())
+
+
+@pytest.fixture
+def loader():
+    return CountingLoader()
+
+
+def test_repeated_reads_share_one_frame(tmp_path, loader):
+    path = write_csv(tmp_path / "data.csv", 10)
+    cache = DataFrameCache(max_bytes=10**9)
+
+    first = cache.get(path, loader)
+    assert cache.get(path, loader) is first
+    assert loader.loads == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_rewritten_file_is_reloaded(tmp_path, loader):
+    path = write_csv(tmp_path / "data.csv", 10)
+    cache = DataFrameCache(max_bytes=10**9)
+    cache.get(path, loader)
+
+    write_csv(path, 20)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert len(cache.get(path, loader)) == 20
+    assert loader.loads == 2
+    assert cache.stats()["entries"] == 1
+
+
+def test_invalidate_drops_the_entry(tmp_path, loader):
+    path = write_csv(tmp_path / "data.csv", 10)
+    cache = DataFrameCache(max_bytes=10**9)
+    cache.get(path, loader)
+
+    cache.invalidate(path)
+    cache.invalidate(path)
+
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["bytes"] == 0
+    cache.get(path, loader)
+    assert loader.loads == 2
+
+
+def test_least_recently_used_frames_are_evicted(tmp_path, loader):
+    paths = [write_csv(tmp_path / f"{name}.csv", 100) for name in "abc"]
+    cache = DataFrameCache(max_bytes=2 * frame_bytes(paths[0]))
+
+    cache.get(paths[0], loader)
+    cache.get(paths[1], loader)
+    cache.get(paths[0], loader)
+    cache.get(paths[2], loader)
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= cache.max_bytes
+    cache.get(paths[0], loader)
+    assert loader.loads == 3  # paths[1] was the one evicted
+
+
+def test_frames_larger_than_the_cache_are_not_kept(tmp_path, loader):
+    path = write_csv(tmp_path / "data.csv", 100)
+    cache = DataFrameCache(max_bytes=frame_bytes(path) - 1)
+
+    cache.get(path, loader)
+    cache.get(path, loader)
+
+    assert loader.loads == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_loader_errors_are_not_cached(tmp_path):
+    path = write_csv(tmp_path / "data.csv", 10)
+    cache = DataFrameCache(max_bytes=10**9)
+
+    def failing(_):
+        raise pd.errors.ParserError("bad file")
+
+    with pytest.raises(pd.errors.ParserError):
+        cache.get(path, failing)
+    assert cache.stats()["entries"] == 0
+    with pytest.raises(FileNotFoundError):
+        cache.get(str(tmp_path / "missing.csv"), pd.read_csv)
+
+
+@pytest.fixture
+def cached(tmp_path):
+    enable_copy_on_write()
+    path = str(tmp_path / "data.csv")
+    pd.DataFrame({"a": range(5), "b": [0.5] * 5, "c": list("vwxyz")}).to_csv(
+        path, index=False
+    )
+    cache = DataFrameCache(max_bytes=10**9)
+    return cache, lambda: cache.get(path, pd.read_csv)
+
+
+def test_shallow_copies_share_the_cached_buffers(cached):
+    _, get = cached
+    frame = get()
+    view = frame.copy(deep=False)
+
+    for column in ["a", "b"]:
+        assert np.shares_memory(view[column].to_numpy(), frame[column].to_numpy())
+
+
+def test_caller_writes_do_not_reach_the_cache(cached):
+    _, get = cached
+    view = get().copy(deep=False)
+
+    view["a"] = 0
+    view.loc[0, "b"] = 9.0
+    view["c"] = view["c"].str.upper()
+    view.drop(columns="c", inplace=True)
+
+    frame = get()
+    assert frame["a"].tolist() == [0, 1, 2, 3, 4]
+    assert frame["b"].tolist() == [0.5] * 5
+    assert frame["c"].tolist() == list("vwxyz")
+    assert not np.shares_memory(view["b"].to_numpy(), frame["b"].to_numpy())
+
+
+def test_generated_code_cannot_modify_the_cached_frame(cached):
+    cache, get = cached
+    frame = get()
+    code = (
+        "df['a'] = df['a'] * 100\n"
+        "df.loc[df['b'] > 0, 'b'] = -1.0\n"
+        "df.iloc[0, 2] = 'changed'\n"
+        "result = df"
+    )
+
+    result = run_code(code, frame)
+
+    assert result["a"].tolist() == [0, 100, 200, 300, 400]
+    assert get() is frame
+    assert frame["a"].tolist() == [0, 1, 2, 3, 4]
+    assert frame["b"].tolist() == [0.5] * 5
+    assert frame["c"].tolist() == list("vwxyz")
+    assert cache.stats()["misses"] == 1
+
+    untouched = run_code("result = df[['a', 'b']]", frame)
+    assert np.shares_memory(untouched["a"].to_numpy(), frame["a"].to_numpy())
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.services.dtype_optimizer import (
+    apply_load_schema,
+    choose_load_schema,
+    without_categories,
+)
+from app.services.ingest import scan_csv
+
+
+def read_back(df, tmp_path):
+    """df as pd.read_csv parses it, with the dtypes of the running pandas"""
+    path = os.path.join(tmp_path, "data.csv")
+    df.to_csv(path, index=False)
+    return path, pd.read_csv(path)
+
+
+def sales(rows=1_000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "region": rng.choice(["EU", "US", "APAC"], rows),
+            "d": pd.date_range("2024-01-01", periods=rows, freq="h").astype(str),
+            "note": [f"order {i}" for i in range(rows)],
+            "units": rng.integers(0, 50, rows),
+            "price": rng.random(rows),
+        }
+    )
+
+
+def test_schema_picks_categories_and_dates(tmp_path):
+    path, df = read_back(sales(), tmp_path)
+
+    expected = {"region": "category", "d": "datetime64[ns]"}
+    assert choose_load_schema(df) == expected
+    assert scan_csv(path, chunksize=100)["load_schema"] == expected
+
+
+def test_schema_skips_columns_that_do_not_fit(tmp_path):
+    df = sales()
+    df.loc[3, "d"] = "not a date"
+    df["region"] = df["note"]
+    _, df = read_back(df, tmp_path)
+
+    # Too many distinct values to be categories, and not every value a date
+    assert choose_load_schema(df) == {}
+
+
+def test_apply_and_undo_round_trip(tmp_path):
+    _, df = read_back(sales(), tmp_path)
+
+    optimized = apply_load_schema(df, choose_load_schema(df))
+
+    assert isinstance(optimized["region"].dtype, pd.CategoricalDtype)
+    assert str(optimized["d"].dtype) == "datetime64[ns]"
+    assert optimized["units"].dtype == "int64"
+    pd.testing.assert_series_equal(without_categories(optimized)["region"], df["region"])
+
+
+def test_schema_never_fails_a_load(tmp_path):
+    _, df = read_back(sales(), tmp_path)
+
+    optimized = apply_load_schema(
+        df,
+        {"region": "category", "note": "datetime64[ns]", "gone": "category"},
+        categories={"region": ["EU"]},
+    )
+
+    # Values outside the pinned categories and unparseable dates keep the text
+    pd.testing.assert_frame_equal(optimized, df)
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from app.services.history_store import HistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"), batch_size=4)
+    yield store
+    store.close()
+
+
+def answer(n):
+    return {"pandas_code": f"result = {n}", "explanation": f"answer {n}"}
+
+
+def test_pages_walk_newest_first(store):
+    for n in range(10):
+        store.append("sales.csv", f"question {n}", answer(n))
+    store.append("other.csv", "question 99", answer(99))
+
+    pages, before = [], None
+    while True:
+        page = store.page("sales.csv", limit=4, before=before)
+        if not page:
+            break
+        pages.append([entry["question"] for entry in page])
+        before = page[-1]["id"]
+
+    assert pages == [
+        ["question 9", "question 8", "question 7", "question 6"],
+        ["question 5", "question 4", "question 3", "question 2"],
+        ["question 1", "question 0"],
+    ]
+    assert store.stats()["writes"] == 11
+    assert store.stats()["batches"] < 11
+
+
+def test_entries_round_trip(store):
+    store.append("sales.csv", "total?", {**answer(1), "sql_query": "SELECT 1"})
+
+    [entry] = store.page("sales.csv")
+
+    assert entry["pandas_code"] == "result = 1"
+    assert entry["sql_query"] == "SELECT 1"
+    assert entry["recharts_config"] is None
+    assert "created_at" in entry
+
+
+@pytest.mark.parametrize("full_text", [True, False])
+def test_search_matches_questions(store, full_text):
+    if full_text and not store.full_text:
+        pytest.skip("SQLite built without FTS5")
+    store.full_text = full_text
+    for question in ("revenue by region", "units per month", 'odd "quote" 100%'):
+        store.append("sales.csv", question, answer(0))
+
+    def search(text):
+        return [entry["question"] for entry in store.page("sales.csv", search=text)]
+
+    assert search("revenue") == ["revenue by region"]
+    assert search("regi") == ["revenue by region"]
+    assert search('"quote"') == ['odd "quote" 100%']
+    assert search("100%") == ['odd "quote" 100%']
+    assert search("missing") == []
+
+
+def test_close_writes_everything_queued(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    store = HistoryStore(path)
+    for n in range(100):
+        store.append("sales.csv", f"question {n}", answer(n))
+    store.close()
+
+    reopened = HistoryStore(path)
+    assert len(reopened.page("sales.csv", limit=1000)) == 100
+    reopened.close()
+
+
+def test_import_jsonl_skips_bad_lines(store, tmp_path):
+    legacy = tmp_path / "sales.csv.json"
+    lines = [
+        json.dumps({"question": "first", **answer(1)}),
+        "not json",
+        json.dumps({"explanation": "no question"}),
+        json.dumps({"question": "second", **answer(2)}),
+    ]
+    legacy.write_text("\n".join(lines) + "\n")
+
+    assert store.import_jsonl("sales.csv", str(legacy)) == 2
+    assert [entry["question"] for entry in store.page("sales.csv")] == [
+        "second",
+        "first",
+    ]
+
+
+def test_history_route_returns_a_cursor(api, routes):
+    for n in range(3):
+        routes.history_store.append("paged.csv", f"question {n}", answer(n))
+
+    first = api.get("/history/paged.csv", params={"limit": 2}).json()
+    rest = api.get(
+        "/history/paged.csv", params={"limit": 2, "cursor": first["next_cursor"]}
+    ).json()
+
+    assert [entry["question"] for entry in first["history"]] == [
+        "question 2",
+        "question 1",
+    ]
+    assert [entry["question"] for entry in rest["history"]] == ["question 0"]
+    assert rest["next_cursor"] is None
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from app.services.job_queue import JobCancelled, JobQueue
+
+
+def test_workers_run_jobs_in_submission_order():
+    async def scenario():
+        queue, started, running = JobQueue(max_workers=2), [], []
+
+        async def work(job):
+            started.append(job.key)
+            running.append(sum(1 for other in jobs if other.status == "running"))
+            await asyncio.sleep(0.01)
+            return job.key * 10
+
+        jobs = [queue.submit("clean", key, work)[0] for key in range(5)]
+        await asyncio.gather(*(job._task for job in jobs))
+        return queue, jobs, started, running
+
+    queue, jobs, started, running = asyncio.run(scenario())
+    assert started == list(range(5))
+    assert max(running) == 2
+    assert [job.result for job in jobs] == [0, 10, 20, 30, 40]
+    assert all(job.progress == 1.0 for job in jobs)
+    assert queue.stats()["succeeded"] == 5
+
+
+def test_failures_keep_the_http_status():
+    async def scenario():
+        queue = JobQueue()
+
+        async def work(job):
+            raise HTTPException(status_code=404, detail="File does not exist")
+
+        async def crash(job):
+            raise RuntimeError("boom")
+
+        failed, _ = queue.submit("ask", "missing", work)
+        crashed, _ = queue.submit("ask", "crash", crash)
+        await asyncio.gather(failed._task, crashed._task)
+        return queue, failed, crashed
+
+    queue, failed, crashed = asyncio.run(scenario())
+    assert failed.status == "failed"
+    assert failed.error == {"status_code": 404, "detail": "File does not exist"}
+    assert crashed.error == {"status_code": 500, "detail": "boom"}
+    assert queue.stats()["failed"] == 2
+
+
+def test_queued_jobs_are_cancelled_before_they_start():
+    async def scenario():
+        queue, ran = JobQueue(max_workers=1), []
+
+        async def work(job):
+            ran.append(job.key)
+            await asyncio.sleep(0.05)
+
+        first, _ = queue.submit("clean", "first", work)
+        second, _ = queue.submit("clean", "second", work)
+        await asyncio.sleep(0)
+        queue.cancel(second.id)
+        await asyncio.gather(first._task, second._task, return_exceptions=True)
+        return queue, first, second, ran
+
+    queue, first, second, ran = asyncio.run(scenario())
+    assert ran == ["first"]
+    assert first.status == "succeeded"
+    assert second.status == "cancelled"
+    assert queue.stats()["cancelled"] == 1
+    assert queue.stats()["queued"] == queue.stats()["running"] == 0
+
+
+def test_threaded_work_stops_at_its_next_report():
+    async def scenario():
+        queue, reports = JobQueue(), []
+        started = threading.Event()
+
+        def slow(job):
+            started.set()
+            for step in range(200):
+                job.report(step / 200, f"step {step}")
+                reports.append(step)
+                time.sleep(0.005)
+
+        async def work(job):
+            return await run_in_threadpool(slow, job)
+
+        job, _ = queue.submit("clean", "slow", work)
+        await run_in_threadpool(started.wait)
+        queue.cancel(job.id)
+        await asyncio.gather(job._task, return_exceptions=True)
+        # The thread outlives the task; it raises at its next report
+        await asyncio.sleep(0.05)
+        return job, len(reports)
+
+    job, reported = asyncio.run(scenario())
+    assert job.status == "cancelled"
+    assert reported < 200
+
+
+def test_finished_jobs_are_evicted_by_count_and_age():
+    async def scenario():
+        queue = JobQueue(max_finished=2, finished_ttl=60)
+
+        async def work(job):
+            return job.key
+
+        jobs = []
+        for key in range(4):
+            job, _ = queue.submit("clean", key, work)
+            await job._task
+            jobs.append(job)
+        return queue, jobs
+
+    queue, jobs = asyncio.run(scenario())
+    assert queue.get(jobs[0].id) is None
+    assert queue.get(jobs[2].id) is jobs[2]
+    assert queue.stats()["retained"] == 2
+
+    queue.finished_ttl = 0
+    jobs[3].finished_at -= 1
+    assert queue.get(jobs[3].id) is None
+    assert queue.stats()["retained"] == 0
+
+
+def test_background_tasks_run_after_success():
+    async def scenario():
+        queue, calls = JobQueue(), []
+
+        async def work(job):
+            job.background.add_task(lambda: calls.append(job.status))
+            return "done"
+
+        job, _ = queue.submit("clean", "key", work)
+        await job._task
+        return calls
+
+    assert asyncio.run(scenario()) == ["succeeded"]
+
+
+def test_unknown_jobs_are_not_found(api):
+    assert api.get("/jobs/missing").status_code == 404
+    assert api.delete("/jobs/missing").status_code == 404
+
+
+def cancelled_at(threshold, reported):
+    """A job's report callback that was cancelled once work reaches threshold"""
+
+    def report(fraction):
+        reported.append(fraction)
+        if fraction >= threshold:
+            raise JobCancelled("cancelled")
+
+    return report
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize("threshold", [0.6, 0.8, 0.95])
+def test_cancelled_cleaning_leaves_no_cleaned_file(api, routes, streaming, threshold):
+    name = f"cancel_{int(streaming)}_{threshold}.csv"
+    df = pd.DataFrame({"region": ["EU", "EU", "US"], "units": [1, 1, 2]})
+    api.post(
+        "/api/upload",
+        files={"file": (name, df.to_csv(index=False).encode(), "text/csv")},
+    )
+    path = routes.get_file_path(name)
+    cleaned_path = os.path.join(routes.BASE_DIR, f"cleaned_{name}")
+    clean = routes.clean_streaming if streaming else routes.clean_in_memory
+    operations = [{"type": "duplicates"}]
+
+    reported = []
+    with pytest.raises(JobCancelled):
+        clean(path, cleaned_path, operations, cancelled_at(threshold, reported))
+
+    assert max(reported) >= threshold
+    assert not os.path.exists(cleaned_path)
+    assert routes.catalog.get(os.path.basename(cleaned_path)) is None
+    assert not [entry for entry in os.listdir(routes.BASE_DIR) if ".part" in entry]
+
+    # Past the last report the file is written and registered
+    reported = []
+    clean(path, cleaned_path, operations, reported.append)
+    assert max(reported) >= 0.95
+    assert len(pd.read_csv(cleaned_path)) == 2
+    assert routes.catalog.get(os.path.basename(cleaned_path))["rows"] == 2
@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import json_encoding
+from app.services.json_encoding import RawJSON, dumps, records_json, sse_event
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(json_encoding, "_ORJSON", False)
+    elif not json_encoding._ORJSON:
+        pytest.skip("orjson with Fragment support is not installed")
+    return request.param
+
+
+def test_records_match_to_dict():
+    df = pd.DataFrame(
+        {
+            "region": ["EU", None, "US"],
+            "units": [1, 2, 3],
+            "price": [0.1, np.nan, 12.3456789012],  # beyond to_json's default 10 digits
+            "day": pd.to_datetime(["2024-01-01", None, "2024-01-03"]),
+        }
+    )
+
+    rows = json.loads(records_json(df).data)
+
+    assert rows == [
+        {"region": "EU", "units": 1, "price": 0.1, "day": "2024-01-01T00:00:00.000"},
+        {"region": None, "units": 2, "price": None, "day": None},
+        {
+            "region": "US",
+            "units": 3,
+            "price": 12.3456789012,
+            "day": "2024-01-03T00:00:00.000",
+        },
+    ]
+
+
+@pytest.mark.filterwarnings("ignore:DataFrame columns are not unique")
+def test_duplicate_columns_fall_back_to_dicts():
+    df = pd.DataFrame([[1, 2]], columns=["a", "a"])
+
+    assert json.loads(records_json(df).data) == [{"a": 2}]
+
+
+def test_dumps_handles_numpy_and_pandas_values(encoder):
+    content = {
+        "count": np.int64(3),
+        "mean": np.float64("nan"),
+        "ratio": float("inf"),
+        "values": np.array([1.5, 2.5]),
+        "when": pd.Timestamp("2024-01-01"),
+        "missing": pd.NaT,
+        1: "non-string key",
+    }
+
+    assert json.loads(dumps(content)) == {
+        "count": 3,
+        "mean": None,
+        "ratio": None,
+        "values": [1.5, 2.5],
+        "when": "2024-01-01T00:00:00",
+        "missing": None,
+        "1": "non-string key",
+    }
+
+
+def test_raw_json_is_spliced_in_unchanged(encoder):
+    raw = RawJSON(b'[{"a":1},{"a":"__raw_json__"}]')
+
+    encoded = dumps({"rows": raw, "more": [raw], "label": "héllo"})
+
+    assert json.loads(encoded) == {
+        "rows": [{"a": 1}, {"a": "__raw_json__"}],
+        "more": [[{"a": 1}, {"a": "__raw_json__"}]],
+        "label": "héllo",
+    }
+
+
+def test_sse_event_frames_json_data():
+    assert sse_event("delta", {"text": "hi"}) == b'event: delta\ndata: {"text":"hi"}\n\n'
+    assert sse_event("done", b"{}") == b"event: done\ndata: {}\n\n"
@@ -0,0 +1,122 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.llm_client import (
+    LLMClient,
+    LLMError,
+    StreamedStringField,
+    parse_json_content,
+)
+
+
+class FakeCompletions:
+    """Stands in for ``AsyncGroq.chat.completions``, replying from a script"""
+
+    def __init__(self, replies, delay=0.0):
+        self.replies = list(replies)
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    async def create(self, messages, temperature, model, stream=False):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+            if isinstance(reply, Exception):
+                raise reply
+        finally:
+            self.active -= 1
+        if stream:
+            return _stream(reply)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=reply))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+        )
+
+
+async def _stream(text):
+    for start in range(0, len(text), 4):
+        delta = SimpleNamespace(content=text[start : start + 4])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+def client_with(completions, **kwargs):
+    client = LLMClient(api_key="test", model="test", backoff_base=0, **kwargs)
+    client._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return client
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_parse_json_content_strips_code_fences():
+    assert parse_json_content('```json\n{"a": 1}\n```') == {"a": 1}
+    assert parse_json_content('{"a": 1}') == {"a": 1}
+    with pytest.raises(ValueError):
+        parse_json_content("  ")
+
+
+def test_concurrent_calls_are_capped():
+    completions = FakeCompletions(['{"ok": true}'], delay=0.02)
+    client = client_with(completions, max_concurrency=3)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(client.complete_json(MESSAGES) for _ in range(10))
+        )
+
+    assert asyncio.run(scenario()) == [{"ok": True}] * 10
+    assert completions.peak == 3
+    assert client.stats()["in_flight"] == 0
+    assert client.stats()["prompt_tokens"] == 100
+
+
+def test_failed_attempts_are_retried(capsys):
+    completions = FakeCompletions(
+        [ConnectionError("reset"), "not json", '{"answer": 42}']
+    )
+    client = client_with(completions, max_retries=3)
+
+    assert asyncio.run(client.complete_json(MESSAGES)) == {"answer": 42}
+    assert client.stats()["retries"] == 2
+    assert client.stats()["failures"] == 0
+    assert capsys.readouterr().out == ""
+
+
+def test_exhausted_retries_raise():
+    client = client_with(FakeCompletions(["not json"]), max_retries=2)
+
+    with pytest.raises(LLMError, match="Invalid JSON"):
+        asyncio.run(client.complete_json(MESSAGES))
+    assert client.stats()["failures"] == 1
+
+
+def test_slow_calls_time_out():
+    client = client_with(FakeCompletions(["{}"], delay=1), timeout=0.05, max_retries=1)
+
+    with pytest.raises(LLMError, match="timed out"):
+        asyncio.run(client.complete_json(MESSAGES))
+    assert client.stats()["in_flight"] == 0
+
+
+def test_stream_yields_the_completion():
+    client = client_with(FakeCompletions(['{"explanation": "done"}']))
+
+    async def collect():
+        return "".join([delta async for delta in client.stream(MESSAGES)])
+
+    assert asyncio.run(collect()) == '{"explanation": "done"}'
+
+
+def test_streamed_field_decodes_escapes_split_across_pieces():
+    field = StreamedStringField("explanation")
+    text = '{"charts": [], "explanation": "Sales \\u00e9t\\u00e9 \\"up\\"\\n", "x": 1}'
+
+    decoded = "".join(field.feed(text[i : i + 3]) for i in range(0, len(text), 3))
+
+    assert decoded == 'Sales été "up"\n'
+    assert field.done
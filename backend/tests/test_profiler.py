@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.util import hash_pandas_object
+
+from app.services.profiler import (
+    ProfileCache,
+    _duplicate_rows,
+    approx_distinct,
+    count_distinct,
+    count_duplicates,
+    profile_dataframe,
+)
+
+
+def hashes(values):
+    return hash_pandas_object(pd.Series(values), index=False).to_numpy()
+
+
+def test_count_distinct_is_exact():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 5_000, 100_000)
+
+    assert count_distinct(hashes(values)) == len(np.unique(values))
+    assert count_distinct(hashes([])) == 0
+
+
+@pytest.mark.parametrize("distinct", [10, 3_000, 200_000, 1_500_000])
+def test_approx_distinct_is_close(distinct):
+    rng = np.random.default_rng(distinct)
+    values = rng.permutation(np.arange(distinct).repeat(2))
+
+    estimate = approx_distinct(hashes(values))
+
+    assert abs(estimate - distinct) <= 0.05 * distinct
+
+
+def test_approx_distinct_counts_small_columns_exactly():
+    assert approx_distinct(hashes(["a", "b", "a", "c"] * 1000)) == 3
+
+
+def test_profile_matches_pandas():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame(
+        {
+            "region": rng.choice(["EU", "US", None], 5_000),
+            "units": rng.integers(0, 50, 5_000).astype(float),
+            "day": pd.Timestamp("2024-01-01")
+            + pd.to_timedelta(rng.integers(0, 30, 5_000), unit="D"),
+        }
+    )
+    df.loc[::7, "units"] = np.nan
+
+    profile = profile_dataframe(df, approximate=False)
+
+    assert profile["rows"] == len(df)
+    assert profile["duplicates"] == int(df.duplicated().sum())
+    for col in df.columns:
+        stats = profile["columns"][col]
+        assert stats["nulls"] == int(df[col].isna().sum())
+        assert stats["distinct"] == df[col].nunique()
+    assert profile["columns"]["units"]["min"] == df["units"].min()
+    assert profile["columns"]["units"]["max"] == df["units"].max()
+    assert profile["columns"]["day"]["min"] == str(df["day"].min())
+    assert profile["memory_usage"] == int(df.memory_usage(deep=True).sum())
+
+
+def test_key_column_rules_out_duplicates():
+    df = pd.DataFrame({"id": range(100), "value": [1] * 100})
+
+    assert profile_dataframe(df)["duplicates"] == 0
+    assert count_duplicates(hashes([1, 1, 2])) == 1
+
+
+def test_colliding_row_hashes_are_not_duplicates():
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame(
+        {"region": rng.choice(["EU", "US"], 1_000), "units": rng.integers(0, 20, 1_000)}
+    )
+
+    # Every row hash colliding: only the second hash tells the rows apart
+    colliding = np.zeros(len(df), dtype=np.uint64)
+    assert _duplicate_rows(df, colliding) == int(df.duplicated().sum())
+    assert _duplicate_rows(df, np.arange(len(df), dtype=np.uint64)) == 0
+
+
+def test_profile_cache_reuses_profiles_per_version():
+    cache = ProfileCache(max_entries=1)
+    df = pd.DataFrame({"a": [1, 2, 2]})
+
+    first = cache.get(("a.csv", 1), df)
+    assert cache.get(("a.csv", 1), df.iloc[:1]) is first
+    cache.get(("a.csv", 2), df)
+    assert cache.get(("a.csv", 1), df.iloc[:1])["rows"] == 1
@@ -0,0 +1,99 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.profiler import profile_dataframe
+from app.services.prompt_builder import PromptBuilder, estimate_tokens
+
+
+def wide_frame(columns=400, rows=20):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({f"metric_{i:03d}": rng.random(rows) for i in range(columns)})
+    df["Revenue"] = rng.integers(0, 1000, rows)
+    return df
+
+
+def build(builder, df, question="What is the total revenue?"):
+    return builder.build(df, profile_dataframe(df), question)
+
+
+def schema_lines(prompt):
+    schema = prompt.split("COLUMNS")[1].split("SAMPLE DATA")[0]
+    return [line for line in schema.splitlines() if line.startswith("- ")]
+
+
+@pytest.mark.parametrize("budget", [2000, 3000, 6000])
+def test_prompts_fit_the_budget(budget):
+    prompt, report = build(PromptBuilder(token_budget=budget), wide_frame())
+
+    assert report["prompt_tokens"] == estimate_tokens(prompt) <= budget
+    assert report["over_budget"] is False
+    assert report["described_columns"] > 0
+
+
+def test_budgets_below_the_template_are_reported():
+    builder = PromptBuilder(token_budget=500)
+
+    prompt, report = build(builder, wide_frame())
+
+    assert report["over_budget"] is True
+    assert report["prompt_tokens"] > 500
+    assert report["described_columns"] == report["named_columns"] == 0
+    assert report["omitted_columns"] == 401
+    assert "(+401 more columns not shown)" in prompt
+    assert builder.stats()["over_budget_requests"] == 1
+
+
+def test_columns_the_question_names_are_described_first():
+    df = wide_frame(columns=20)
+    df["Region Name"] = ["EU", "US"] * 10
+
+    prompt, _ = build(PromptBuilder(), df, "revenue by region")
+
+    names = [line[2:].split(":")[0] for line in schema_lines(prompt)]
+    assert names[:2] == ["Revenue", "Region Name"]
+    assert names[2:] == [f"metric_{i:03d}" for i in range(20)]
+
+
+def test_columns_that_do_not_fit_are_named_then_omitted():
+    builder = PromptBuilder(token_budget=2000)
+
+    prompt, report = build(builder, wide_frame(columns=1000))
+
+    assert schema_lines(prompt)[0].startswith("- Revenue:")
+    assert report["columns"] == 1001
+    assert (
+        report["described_columns"]
+        + report["named_columns"]
+        + report["omitted_columns"]
+        == 1001
+    )
+    assert report["named_columns"] > 0
+    assert report["omitted_columns"] > 0
+    assert f"(+{report['omitted_columns']} more columns not shown)" in prompt
+    assert builder.stats()["pruned_requests"] == 1
+
+
+def test_narrow_frames_are_described_in_full():
+    df = pd.DataFrame({"region": ["EU", "US", "EU"], "units": [1, 2, 3]})
+
+    prompt, report = build(PromptBuilder(), df, "units per region")
+
+    assert len(schema_lines(prompt)) == 2
+    assert report["named_columns"] == report["omitted_columns"] == 0
+    assert report["sample_rows"] == 3
+    assert "Other columns" not in prompt
+
+
+def test_long_values_are_truncated():
+    note = "x" * 500
+    df = pd.DataFrame({"note": [note, note + "y"], "units": [1, 2]})
+
+    prompt, _ = build(PromptBuilder(max_cell_chars=10), df, "notes")
+
+    assert note[:20] not in prompt
+    assert "'xxxxxxxxx…'" in schema_lines(prompt)[0]
+    sample = json.loads(prompt.split("SAMPLE DATA: ")[1].split("\n")[0])
+    assert [row["note"] for row in sample] == ["xxxxxxxxx…", "xxxxxxxxx…"]
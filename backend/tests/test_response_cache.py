@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from app.services.response_cache import ResponseCache, normalize_question
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(os.path.join(tmp_path, "cache", "responses.sqlite3"))
+
+
+def test_normalize_question_ignores_case_spacing_and_trailing_punctuation():
+    assert normalize_question("  Sales  by\tRegion? ") == normalize_question(
+        "sales by region"
+    )
+    assert normalize_question("Sales by region!!") == "sales by region"
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("orders with amount > 100", "orders with amount < 100"),
+        ("orders with amount >= 100", "orders with amount = 100"),
+        ("regions with growth of -5%", "regions with growth of 5%"),
+        ("regions with growth of 5%", "regions with growth of 5"),
+        ("plot a/b by month", "plot a*b by month"),
+        ("plot a+b by month", "plot a-b by month"),
+    ],
+)
+def test_questions_differing_by_an_operator_do_not_share_a_key(first, second):
+    assert normalize_question(first) != normalize_question(second)
+
+
+def test_exact_hit_does_not_answer_a_question_with_another_operator(cache):
+    cache.put("fp", "Orders with amount > 100?", {"code": "a"}, b'{"a": 1}')
+
+    hit = cache.get("fp", "orders with amount > 100")
+    assert hit is not None and hit["response"] == b'{"a": 1}'
+    assert cache.get("fp", "orders with amount < 100") is None
+
+
+def test_fuzzy_hit_never_replays_the_response(tmp_path):
+    cache = ResponseCache(
+        os.path.join(tmp_path, "cache", "responses.sqlite3"), similarity_threshold=0.5
+    )
+    cache.put("fp", "total sales by region", {"code": "a"}, b'{"a": 1}')
+
+    hit = cache.get("fp", "show total sales by region please now")
+    assert hit is not None and hit["fuzzy"]
+    assert hit["chart_data"] == {"code": "a"}
+    assert hit["response"] is None
+
+
+def test_fuzzy_matching_is_off_by_default(cache):
+    cache.put("fp", "total sales by region", {"code": "a"})
+    assert cache.get("fp", "total sales per region") is None
+
+
+def test_expired_entries_are_skipped_on_read_and_purged_on_write(tmp_path):
+    cache = ResponseCache(
+        os.path.join(tmp_path, "cache", "responses.sqlite3"), ttl_seconds=60
+    )
+    cache.put("fp", "total sales by region", {"code": "a"})
+    cache._conn.execute("UPDATE responses SET created_at = created_at - 120")
+
+    assert cache.get("fp", "total sales by region") is None
+    assert cache.stats()["entries"] == 1
+
+    cache.put("fp", "units by month", {"code": "b"})
+    assert cache.stats()["entries"] == 1
+    assert cache.get("fp", "units by month")["chart_data"] == {"code": "b"}
@@ -0,0 +1,121 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from app.services.columnar import read_dataset, write_sidecar
+from app.services.sandbox import SandboxError, SandboxPool, _load, run_code
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = os.path.join(tmp_path, "data.csv")
+    pd.DataFrame({"a": range(10), "b": list("xyxyxyxyxy")}).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(size=1, timeout=10)
+    yield pool
+    pool.shutdown()
+
+
+def test_worker_that_died_while_idle_is_replaced(pool, dataset):
+    assert len(pool.run(dataset, ("v1",), "result = df.head(2)")) == 2
+
+    worker = pool._idle.get()
+    worker.process.kill()
+    worker.process.join()
+    pool._idle.put(worker)
+
+    # The dead worker fails at most the request that finds it, not later ones
+    for _ in range(3):
+        try:
+            result = pool.run(dataset, ("v1",), "result = df.tail(3)")
+        except SandboxError:
+            continue
+        assert len(result) == 3
+        break
+    else:
+        pytest.fail("the pool kept handing out the dead worker")
+    assert pool._idle.qsize() == 1
+    assert len(pool.run(dataset, ("v1",), "result = df.tail(3)")) == 3
+
+
+def test_code_errors_keep_the_worker(pool, dataset):
+    with pytest.raises(SandboxError):
+        pool.run(dataset, ("v1",), "result = df['missing']")
+    assert (
+        pool.run(dataset, ("v1",), "result = df['a'].sum() + df[['a']]")["a"].iloc[0]
+        == 45
+    )
+    assert pool.stats()["crashes"] == 0
+
+
+def test_concurrent_runs_are_all_counted(dataset):
+    frame = pd.read_csv(dataset)
+    inline = SandboxPool(size=0, loader=lambda _: frame)
+
+    with ThreadPoolExecutor(8) as threads:
+        list(
+            threads.map(
+                lambda _: inline.run(dataset, ("v1",), "result = df.head(1)"),
+                range(400),
+            )
+        )
+
+    assert inline.stats()["tasks"] == 400
+
+
+CATEGORY_CODE = [
+    "result = (df['b'] + ' ' + df['c']).to_frame('label')",
+    "result = df['c'].fillna('none').value_counts()",
+    "df.loc[df['b'] == 'x', 'c'] = 'other'\nresult = df[['c']]",
+]
+
+
+@pytest.fixture
+def categorical_dataset(tmp_path):
+    path = os.path.join(tmp_path, "labels.csv")
+    df = pd.DataFrame(
+        {"a": range(10), "b": list("xyxyxyxyxy"), "c": ["p", "q", None, "p", "q"] * 2}
+    )
+    df.to_csv(path, index=False)
+    write_sidecar(path, df.astype({"b": "category", "c": "category"}))
+    return path
+
+
+@pytest.mark.parametrize("code", CATEGORY_CODE)
+def test_category_columns_reach_code_as_strings(pool, categorical_dataset, code):
+    path = categorical_dataset
+    schema = {"b": "category", "c": "category"}
+
+    # What the code computes on the CSV's own dtypes
+    expected = run_code(code, pd.read_csv(path))
+    inline = SandboxPool(
+        size=0, loader=lambda _: read_dataset(path, load_schema=schema)
+    ).run(path, ("v1",), code, load_schema=schema)
+    pooled = pool.run(path, ("v1",), code, load_schema=schema)
+
+    for actual in (inline, pooled):
+        if isinstance(expected, pd.Series):
+            pd.testing.assert_series_equal(expected, actual)
+        else:
+            pd.testing.assert_frame_equal(expected, actual)
+
+
+def test_workers_cache_datasets_with_their_categories(categorical_dataset):
+    schema = {"b": "category", "c": "category"}
+    datasets = OrderedDict()
+    task = {"path": categorical_dataset, "signature": ("v1",), "load_schema": schema}
+
+    full = _load(datasets, 2, task)
+    used = _load(datasets, 2, dict(task, columns=["c"]))
+
+    assert isinstance(full["b"].dtype, pd.CategoricalDtype)
+    assert list(used.columns) == ["c"]
+    assert isinstance(used["c"].dtype, pd.CategoricalDtype)
+    assert len(datasets) == 1
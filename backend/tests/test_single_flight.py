@@ -0,0 +1,69 @@
+import asyncio
+
+from app.services.job_queue import JobQueue
+from app.services.response_cache import normalize_question
+from app.services.single_flight import SingleFlight
+
+
+def ask_key(question):
+    # The shape of the /ask request keys: file, question, engine
+    return ("sales.csv", normalize_question(question), "pandas")
+
+
+def test_identical_questions_share_one_computation():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        results = await asyncio.gather(
+            flight.run("ask", ask_key("Sales by region?"), compute),
+            flight.run("ask", ask_key("sales  by region"), compute),
+        )
+        return results, flight.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [1, 1]
+    assert stats["endpoints"]["ask"]["coalesced"] == 1
+
+
+def test_questions_differing_by_an_operator_are_computed_separately():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def answer(question):
+            await asyncio.sleep(0.01)
+            return question
+
+        return await asyncio.gather(
+            *(
+                flight.run("ask", ask_key(q), lambda q=q: answer(q))
+                for q in ("orders with amount > 100", "orders with amount < 100")
+            )
+        )
+
+    assert asyncio.run(scenario()) == [
+        "orders with amount > 100",
+        "orders with amount < 100",
+    ]
+
+
+def test_job_queue_deduplicates_only_identical_questions():
+    async def scenario():
+        queue = JobQueue(max_workers=1)
+
+        async def work(job):
+            await asyncio.sleep(0.01)
+
+        first, _ = queue.submit("ask", ask_key("amount > 100"), work)
+        same, same_deduplicated = queue.submit("ask", ask_key("Amount > 100?"), work)
+        other, other_deduplicated = queue.submit("ask", ask_key("amount < 100"), work)
+        await asyncio.gather(first._task, other._task)
+        return first, same, same_deduplicated, other, other_deduplicated
+
+    first, same, same_deduplicated, other, other_deduplicated = asyncio.run(scenario())
+    assert same is first and same_deduplicated
+    assert other is not first and not other_deduplicated
@@ -0,0 +1,109 @@
+import warnings
+
+import pandas as pd
+import pytest
+
+from app.services.columnar import write_sidecar
+from app.services.sql_engine import SQLEngine, SQLError, SQLTimeout
+
+pytest.importorskip("duckdb")
+
+
+@pytest.fixture(params=["csv", "sidecar"])
+def dataset(request, tmp_path):
+    path = str(tmp_path / "sales.csv")
+    df = pd.DataFrame({"region": ["EU", "US", "EU"], "units": [5, 3, 2]})
+    df.to_csv(path, index=False)
+    if request.param == "sidecar":
+        pytest.importorskip("pyarrow")
+        write_sidecar(path, df)
+    return path
+
+
+@pytest.fixture
+def engine():
+    engine = SQLEngine(timeout=5)
+    yield engine
+    engine.close()
+
+
+def test_select_reads_the_dataset(engine, dataset):
+    result = engine.run(
+        dataset, "SELECT region, SUM(units) AS units FROM data GROUP BY 1 ORDER BY 1"
+    )
+
+    assert result.to_dict(orient="records") == [
+        {"region": "EU", "units": 7},
+        {"region": "US", "units": 3},
+    ]
+    assert engine.stats()["queries"] == 1
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT 1; SELECT 2",
+        "DELETE FROM data",
+        "COPY data TO 'out.csv'",
+        "ATTACH 'other.db'",
+        "SET enable_external_access = true",
+        "SELEC region FROM data",
+    ],
+)
+def test_only_a_single_select_is_accepted(engine, dataset, sql):
+    with pytest.raises(SQLError):
+        engine.run(dataset, sql)
+    assert engine.stats()["rejected"] == 1
+
+
+def test_other_files_cannot_be_read(engine, dataset, tmp_path):
+    other = tmp_path / "secret.csv"
+    other.write_text("token\nabc\n")
+
+    with pytest.raises(SQLError):
+        engine.run(dataset, f"SELECT * FROM read_csv_auto('{other}')")
+    with pytest.raises(SQLError):
+        engine.run(dataset, f"SELECT * FROM '{other}'")
+    assert engine.stats()["errors"] == 2
+
+
+def test_slow_queries_are_interrupted(dataset):
+    engine = SQLEngine(timeout=0.2)
+    slow = "SELECT SUM(a.range * b.range) FROM range(1000000) a, range(1000000) b"
+
+    with pytest.raises(SQLTimeout):
+        engine.run(dataset, slow)
+    assert engine.stats()["timeouts"] == 1
+    assert len(engine.run(dataset, "SELECT * FROM data")) == 3
+    engine.close()
+
+
+def test_large_results_are_refused(dataset):
+    engine = SQLEngine(max_result_rows=2)
+
+    with pytest.raises(SQLError, match="more than 2 rows"):
+        engine.run(dataset, "SELECT * FROM data")
+    engine.close()
+
+
+def test_slow_setup_counts_toward_the_time_limit(dataset, monkeypatch):
+    engine = SQLEngine(timeout=0.2)
+    attach = engine._attach
+
+    def slow_attach(con, *args):
+        # A few seconds of work, standing in for sniffing a large CSV
+        con.execute("SELECT SUM(a.range * b.range) FROM range(100000) a, range(3000) b")
+        attach(con, *args)
+
+    monkeypatch.setattr(engine, "_attach", slow_attach)
+
+    with pytest.raises(SQLTimeout):
+        engine.run(dataset, "SELECT * FROM data")
+    assert engine.stats()["timeouts"] == 1
+    engine.close()
+
+
+def test_results_are_fetched_without_deprecated_calls(engine, dataset):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        assert len(engine.run(dataset, "SELECT * FROM data")) == 3
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import streaming_cleaner
+from app.services.cleaning_plan import CleaningStrategy
+from app.services.ingest import scan_csv
+from app.services.streaming_cleaner import StreamingCleaner
+from test_cleaning_plan import messy_frame, plan_clean, random_operations
+
+CHUNK_ROWS = 37
+
+
+def stream_clean(csv_path, operations, output_path, spill_dir):
+    cleaner = StreamingCleaner(
+        csv_path,
+        scan_csv(csv_path, CHUNK_ROWS)["dtypes"],
+        chunksize=CHUNK_ROWS,
+        spill_dir=spill_dir,
+    )
+    for operation in operations:
+        if operation[0] == "missing":
+            cleaner.handle_missing_values(operation[1], operation[2])
+        elif operation[0] == "duplicates":
+            cleaner.remove_duplicates()
+        else:
+            cleaner.standardize_columns()
+    cleaner.run(output_path)
+    return cleaner
+
+
+def in_memory_clean(csv_path, operations, output_path):
+    plan_clean(pd.read_csv(csv_path), operations).to_csv(output_path, index=False)
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_streaming_matches_in_memory_cleaning(tmp_path, seed):
+    source = tmp_path / "source.csv"
+    messy_frame(seed).to_csv(source, index=False)
+    operations = random_operations(seed, pd.read_csv(source, nrows=0).columns.tolist())
+
+    stream_clean(str(source), operations, str(tmp_path / "streamed.csv"), tmp_path)
+    in_memory_clean(str(source), operations, str(tmp_path / "memory.csv"))
+
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "memory.csv"),
+        pd.read_csv(tmp_path / "streamed.csv"),
+        check_exact=False,
+        rtol=1e-9,
+    )
+
+
+def test_streaming_log_counts_rows(tmp_path):
+    source = tmp_path / "source.csv"
+    df = messy_frame(3)
+    df.to_csv(source, index=False)
+    operations = [
+        ("missing", CleaningStrategy.DROP, ["Region Name"]),
+        ("duplicates",),
+    ]
+
+    cleaner = stream_clean(str(source), operations, str(tmp_path / "out.csv"), tmp_path)
+
+    expected = df.dropna(subset=["Region Name"]).drop_duplicates()
+    assert cleaner.original_rows == len(df)
+    assert cleaner.cleaned_rows == len(expected)
+
+
+@pytest.mark.parametrize("rows", [20_001, 20_000])
+def test_median_is_exact_with_little_memory(tmp_path, monkeypatch, rows):
+    monkeypatch.setattr(streaming_cleaner, "MEDIAN_BLOCK_VALUES", 700)
+    monkeypatch.setattr(streaming_cleaner, "MEDIAN_MEMORY_VALUES", 500)
+    rng = np.random.default_rng(rows)
+    values = np.concatenate([rng.lognormal(size=rows - 2_000), np.zeros(2_000)])
+    spill = tmp_path / "median.bin"
+    values.tofile(spill)
+
+    assert streaming_cleaner._median_from_spill(str(spill)) == np.median(values)
+    assert not spill.exists()
+
+
+def test_mode_counts_stay_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming_cleaner, "MODE_MAX_VALUES", 50)
+    source = tmp_path / "source.csv"
+    labels = [f"id-{i}" for i in range(2_000)] + ["common"] * 300 + [None] * 10
+    pd.DataFrame({"label": labels}).sample(frac=1, random_state=0).to_csv(
+        source, index=False
+    )
+    operations = [("missing", CleaningStrategy.FILL_MODE, ["label"])]
+
+    stream_clean(str(source), operations, str(tmp_path / "out.csv"), tmp_path)
+
+    cleaned = pd.read_csv(tmp_path / "out.csv")
+    assert cleaned["label"].isna().sum() == 0
+    assert (cleaned["label"] == "common").sum() == 310
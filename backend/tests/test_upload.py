@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.ingest import merge_dtypes, scan_csv
+
+
+def csv_bytes(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def sales(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "region": rng.choice(["EU", "US"], rows),
+            "units": rng.integers(0, 50, rows),
+            "price": rng.random(rows),
+        }
+    )
+
+
+def upload(api, name, content):
+    return api.post("/api/upload", files={"file": (name, content, "text/csv")})
+
+
+def test_scan_matches_a_whole_file_read(tmp_path):
+    path = tmp_path / "data.csv"
+    df = sales(1_000)
+    df.loc[700:, "units"] = np.nan  # ints in early chunks, floats later
+    df.to_csv(path, index=False)
+
+    info = scan_csv(str(path), chunksize=100)
+
+    whole = pd.read_csv(path)
+    assert info["rows"] == len(whole)
+    assert info["columns"] == whole.columns.tolist()
+    assert info["dtypes"] == whole.dtypes.astype(str).to_dict()
+
+
+def test_merge_dtypes_widens_like_read_csv():
+    assert merge_dtypes(None, "int64") == "int64"
+    assert merge_dtypes("int64", "float64") == "float64"
+    assert merge_dtypes("float64", "int64") == "float64"
+    assert merge_dtypes("int64", "bool") == "object"
+
+
+@pytest.mark.parametrize("content", [b"", b"\n\n"])
+def test_scan_rejects_empty_files(tmp_path, content):
+    path = tmp_path / "empty.csv"
+    path.write_bytes(content)
+
+    with pytest.raises(pd.errors.EmptyDataError):
+        scan_csv(str(path))
+
+
+def test_upload_streams_a_file_in_chunks(api, routes, monkeypatch):
+    monkeypatch.setattr(routes, "UPLOAD_CHUNK_SIZE", 1024)
+    df = sales(5_000)
+
+    response = upload(api, "sales.csv", csv_bytes(df))
+
+    assert response.status_code == 200
+    assert response.json()["rows"] == len(df)
+    assert response.json()["columns"] == df.columns.tolist()
+    stored = os.path.join(routes.BASE_DIR, "sales.csv")
+    pd.testing.assert_frame_equal(pd.read_csv(stored), df)
+    assert routes.catalog.get("sales.csv")["rows"] == len(df)
+    assert not [name for name in os.listdir(routes.BASE_DIR) if name.endswith(".part")]
+
+
+def test_upload_over_the_size_limit_is_rejected(api, routes, monkeypatch):
+    monkeypatch.setattr(routes, "UPLOAD_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(routes, "MAX_FILE_SIZE", 10 * 1024)
+
+    response = upload(api, "huge.csv", csv_bytes(sales(5_000)))
+
+    assert response.status_code == 413
+    assert not os.path.exists(os.path.join(routes.BASE_DIR, "huge.csv"))
+    assert not [name for name in os.listdir(routes.BASE_DIR) if name.endswith(".part")]
+
+
+@pytest.mark.parametrize(
+    "name, content, detail",
+    [
+        ("notes.txt", b"a,b\n1,2\n", "wrong file type"),
+        ("blank.csv", b"", "empty"),
+        ("commas.csv", b",,\n1,2\n", "empty"),
+        ("latin1.csv", "region\nZürich\n".encode("latin-1"), "UTF-8"),
+        ("header.csv", b"a,b\n", "empty"),
+    ],
+)
+def test_bad_uploads_are_rejected(api, name, content, detail):
+    response = upload(api, name, content)
+
+    assert response.status_code == 400
+    assert detail in response.json()["detail"]